@@ -1,6 +1,7 @@
 import argparse
 import os
 import sys
+import multiprocessing
 from tasks_v2 import Supervisor, Task
 import functions_general as fg
 import functions_assembler as fa
@@ -36,11 +37,10 @@ def gen_unpaired_trimmomatic_supervisor(opc, out_dir, fq1, fq2, unpaired, depend
     # fq2 needed for unpaired trimmomatic
     tasks = []
     count = len(fq1)
-#    cpu_mod = min(len(fq1),cpu_cap)
-    cpu_mod = int(round(float(cpu_cap) / len(unpaired)))
+    # trimmomatic tasks are elastic, the Supervisor splits cpu_cap between them
     for i in unpaired:
         trim_task = fa.trimmomatic_unpaired_task(
-            opc, out_dir, i, cpu_mod, 'trimmomatic_output_' + str(count), dependency_set)
+            opc, out_dir, i, cpu_cap, 'trimmomatic_output_' + str(count), dependency_set)
         count += 1
         tasks.append(trim_task)
     return Supervisor(tasks=tasks)
@@ -49,38 +49,76 @@ def gen_unpaired_trimmomatic_supervisor(opc, out_dir, fq1, fq2, unpaired, depend
 def gen_paired_trimmomatic_supervisor(opc, out_dir, fq1, fq2, unpaired, dependency_set, cpu_cap):
     tasks = []
     count = 0
-    # cpu_mod = min(len(fq1),cpu_cap) 
-    cpu_mod = int(round(float(cpu_cap)/len(fq1)))
+    # trimmomatic tasks are elastic, the Supervisor splits cpu_cap between them
     for i1, i2 in zip(fq1, fq2):
         trim_task = fa.trimmomatic_task(
-            opc, out_dir, i1, i2, cpu_mod, 'trimmomatic_output_' + str(count), dependency_set)
+            opc, out_dir, i1, i2, cpu_cap, 'trimmomatic_output_' + str(count), dependency_set)
         count += 1
         tasks.append(trim_task)
     return Supervisor(tasks=tasks)
 
-def gen_trimming_supervisor(opc, out_dir, fq1,fq2,unpaired,no_trim,trimmomatic_flag,rmdup,subset_size,subset_seed,truncate_opt,dependency_set,cpu_cap):
+def native_trim_cpu(cpu_cap, count):
+    ''' Returns the cpus each of count native trim tasks gets from cpu_cap.
+        python tasks can't be resized once started, so each gets its share
+        up front. An uncapped run (--cpu 0) shares the cores of the machine.
+    '''
+    if(cpu_cap == float('inf')):
+        cpu_cap = multiprocessing.cpu_count()
+    return max(1, int(cpu_cap) // max(1, count))
+
+
+def gen_unpaired_native_trim_supervisor(opc, out_dir, fq1, fq2, unpaired, dependency_set, cpu_cap):
+    tasks = []
+    count = len(fq1)
+    cpu = native_trim_cpu(cpu_cap, len(unpaired))
+    for i in unpaired:
+        trim_task = fa.native_trim_unpaired_task(
+            opc, out_dir, i, cpu, 'native_trim_output_' + str(count), dependency_set)
+        count += 1
+        tasks.append(trim_task)
+    return Supervisor(tasks=tasks)
+
+
+def gen_paired_native_trim_supervisor(opc, out_dir, fq1, fq2, unpaired, dependency_set, cpu_cap):
+    tasks = []
+    count = 0
+    cpu = native_trim_cpu(cpu_cap, len(fq1))
+    for i1, i2 in zip(fq1, fq2):
+        trim_task = fa.native_trim_task(
+            opc, out_dir, i1, i2, cpu, 'native_trim_output_' + str(count), dependency_set)
+        count += 1
+        tasks.append(trim_task)
+    return Supervisor(tasks=tasks)
+
+def gen_trimming_supervisor(opc, out_dir, fq1,fq2,unpaired,no_trim,trimmomatic_flag,rmdup,subset_size,subset_seed,truncate_opt,dependency_set,cpu_cap,subset_per_library=False):
     tasks = []
     deps = []
     if (not no_trim):
         tasks.append(fa.fastqc_task(opc, opc.path_assembly_files,fq1+fq2+unpaired,'pre_trimming',min(cpu_cap,len(fq1+fq2+unpaired)), []))
+        # trimmomatic_flag is True for trimmomatic, False for prinseq, or
+        # 'native' for util/trim_reads.py
         if(fq1 != []):
-            if(trimmomatic_flag):
+            if(trimmomatic_flag == 'native'):
+                paired_sup = gen_paired_native_trim_supervisor(opc, out_dir, fq1, fq2, unpaired, dependency_set, cpu_cap)
+            elif(trimmomatic_flag):
                 paired_sup = gen_paired_trimmomatic_supervisor(opc, out_dir,fq1, fq2, unpaired, dependency_set, cpu_cap)
             else:
                 paired_sup = gen_paired_prinseq_supervisor(opc, out_dir,fq1, fq2, unpaired,  dependency_set, rmdup)
             fq1 = [paired_sup.targets[x] for x in range(0, len(paired_sup.targets), 2)]
             fq2 = [paired_sup.targets[x] for x in range(1, len(paired_sup.targets), 2)]
             tasks.append(paired_sup)
-            tasks.append(fa.fastqc_task(opc, opc.path_assembly_files, fq1+fq2, 'post_trimming_paired',int(round(float(cpu_cap)/2)),[paired_sup]))
+            tasks.append(fa.fastqc_task(opc, opc.path_assembly_files, fq1+fq2, 'post_trimming_paired',cpu_cap,[paired_sup]))
             deps.append(paired_sup)
         if(unpaired != []):
-            if(trimmomatic_flag):
+            if(trimmomatic_flag == 'native'):
+                unpaired_sup = gen_unpaired_native_trim_supervisor(opc, out_dir, fq1, fq2, unpaired, dependency_set, cpu_cap)
+            elif(trimmomatic_flag):
                 unpaired_sup = gen_unpaired_trimmomatic_supervisor(opc,out_dir,fq1,fq2, unpaired, dependency_set, cpu_cap)
             else:
                 unpaired_sup = gen_unpaired_prinseq_supervisor(opc,out_dir,fq1,fq2,unpaired,dependency_set,rmdup)
             unpaired = unpaired_sup.targets
             tasks.append(unpaired_sup)
-            tasks.append(fa.fastqc_task(opc, opc.path_assembly_files, unpaired, 'post_trimming_unpaired',int(round(float(cpu_cap)/2)),[unpaired_sup]))
+            tasks.append(fa.fastqc_task(opc, opc.path_assembly_files, unpaired, 'post_trimming_unpaired',cpu_cap,[unpaired_sup]))
             deps.append(unpaired_sup)
     # need to add support for unp here
     #if len(fq2) <1:
@@ -88,25 +126,23 @@ def gen_trimming_supervisor(opc, out_dir, fq1,fq2,unpaired,no_trim,trimmomatic_f
     #unpaired = [subset.targets[0]]
     #else:
     if fq1 != []:
-        subset = fa.subset_task(opc, out_dir, fq1, fq2,'final_reads', subset_size, subset_seed, deps)
+        # truncating is done by the subset task, as it writes the reads it keeps
+        out_base = 'truncated' if(truncate_opt >= 0) else 'final_reads'
+        subset = fa.subset_task(opc, out_dir, fq1, fq2, out_base, subset_size, subset_seed, deps, cpu_cap, subset_per_library, truncate_opt)
         fq1 = [subset.targets[0]]
         fq2 = [subset.targets[1]]
         tasks.append(subset)
         if(truncate_opt >= 0):
-            truncate = fa.truncate_task(out_dir, fastq1[0], fastq2[0], truncate_opt, [subset])
-            fq1 = [truncate.targets[0]]
-            fq2 = [truncate.targets[1]]
-            deps.append(truncate)
-            tasks.append(truncate)
+            deps.append(subset)
     late_fastqc = fa.fastqc_task(opc,out_dir,fq1+fq2+unpaired, 'final_reads_paired',cpu_cap,deps)
     tasks.append(late_fastqc)
     return (Supervisor(tasks=tasks, dependencies=dependency_set),fq1,fq2,unpaired)
 
-def gen_assembly_supervisor(opc, dbs, fastq1, fastq2, unpaired, dependency_set, no_trim=False, rnaSPAdes=False, rmdup=False, subset_size=50000000, cpu=12, subset_seed='I am a seed value', normalize_flag=False, truncate_opt=-1, trimmomatic_flag=True, trinity_memory=100):
+def gen_assembly_supervisor(opc, dbs, fastq1, fastq2, unpaired, dependency_set, no_trim=False, rnaSPAdes=False, rmdup=False, subset_size=50000000, cpu=12, subset_seed='I am a seed value', normalize_flag=False, truncate_opt=-1, trimmomatic_flag=True, trinity_memory=100, subset_per_library=False):
     out_dir = opc.path_assembly_files
     path_assembly = opc.path_assembly
     tasks = []
-    trim_reads,fastq1,fastq2,unpaired=gen_trimming_supervisor(opc, out_dir, fastq1,fastq2,unpaired,no_trim,trimmomatic_flag,rmdup,subset_size,subset_seed, truncate_opt,[],cpu)
+    trim_reads,fastq1,fastq2,unpaired=gen_trimming_supervisor(opc, out_dir, fastq1,fastq2,unpaired,no_trim,trimmomatic_flag,rmdup,subset_size,subset_seed, truncate_opt,[],cpu,subset_per_library)
     tasks.append(trim_reads)
     if(rnaSPAdes):
         rnaspades = fa.rnaspades_task(path_assembly, out_dir, fastq1, fastq2, unpaired, cpu, [trim_reads])
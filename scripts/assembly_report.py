@@ -109,12 +109,25 @@ def create_truncated_csv(dataD):
 #    s3  = pd.Series({'fastqc_final_'+ x: y for (x,y) in dataD['fastqc_final'].items()}, name='fastqc_final')
 
 
-def create_report(assembly_dir, json_target=None, csv_target=None, human_target=None):
+def create_usage_csv(dataD):
+    ''' one row per task with its wall time and resource usage from history.json
+    '''
+    rows = {}
+    for t in dataD['task_info']:
+        row = {'wall_time': dataD['task_info'][t]['wall_time']}
+        row.update(dataD['task_info'][t]['usage'])
+        rows[t] = row
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def create_report(assembly_dir, json_target=None, csv_target=None, human_target=None, usage_target=None):
     data = get_data(assembly_dir)
     if(json_target is None):
         json_target = os.path.join(assembly_dir, 'log_files', 'report.json')
     if(csv_target is None):
         csv_target = os.path.join(assembly_dir, 'log_files', 'report.csv')
+    if(usage_target is None):
+        usage_target = os.path.join(assembly_dir, 'log_files', 'task_usage.csv')
     f = open(json_target, 'w')
     json.dump(data, f, sort_keys=True, indent=4)
     f.close()
@@ -122,6 +135,7 @@ def create_report(assembly_dir, json_target=None, csv_target=None, human_target=
     dataF = create_truncated_csv(data)
     dataF.to_csv(csv_target, sep=',')
     f.close()
+    create_usage_csv(data).to_csv(usage_target, sep=',')
 
 
 if(__name__ == '__main__'):
@@ -134,6 +148,8 @@ if(__name__ == '__main__'):
         'The location that the json encoded version of the report will be printed.'))
     parser.add_argument('-c', '--csv', help=(
         'The location that the csv encoded version of the report will be printed.'))
+    parser.add_argument('-u', '--usage', help=(
+        'The location that the csv of per task resource usage will be printed.'))
     parser.add_argument('-q', '--qualityDir', default='quality_files', help=(
         'optional: alternative name for quality directory'))
     parser.add_argument('-t', '--transrateDir', default='transrate', help=(
@@ -143,4 +159,4 @@ if(__name__ == '__main__'):
     parser.add_argument('--assembly_filesDir', default='assembly_files', help=(
         'optional: alternative name for transrate directory'))
     args = parser.parse_args()
-    create_report(args.assembly_dir, args.json, args.csv, args.out)
+    create_report(args.assembly_dir, args.json, args.csv, args.out, args.usage)
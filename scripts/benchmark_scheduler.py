@@ -0,0 +1,304 @@
+'''
+benchmark_scheduler.py measures what the tasks_v2 scheduler itself costs,
+on synthetic graphs of tasks that do nothing (or sleep), so changes to the
+Supervisor can be compared run against run. Every run appends one json line
+to --out with its configuration and:
+    supervisor_cpu -
+        user + sys seconds used by this process during Supervisor.run(),
+        the commands themselves excluded.
+    setup -
+        seconds spent building the Supervisor (add_task, flattening nested
+        supervisors) and, at the start of run(), the graph and priorities.
+    dependency_check -
+        seconds spent resolving dependencies: TaskGraph.complete and
+        TaskGraph.dependenciesMet.
+    schedule_pass -
+        seconds spent walking the ready queue (Supervisor.__startReady__),
+        launches included.
+    queue_wait -
+        per task, seconds between becoming ready and being started.
+    time_to_start -
+        per task with dependencies, seconds between the Supervisor seeing
+        its last dependency finish and starting it.
+    detect_latency -
+        per sleep task, seconds between the end of the sleep and the
+        Supervisor seeing it exit.
+Per task figures are summarized as mean, p50, p95 and max. With the noop
+executor commands are never run, the handle of every task reports exit code
+0 at once, and the Supervisor polls without sleeping, so wall time is all
+scheduling. With the local executor every task really runs `true` or
+`sleep`.
+Shapes:
+    chain - each task depends on the one before it
+    fanout - one task, every other task depends on it
+    fanin - one task depends on every other task
+    fan - one task fans out to the others, which all fan in to a last one
+    layered - layers of --width tasks, each depending on --degree random
+              tasks of the layer before
+    nested - --stages supervisors of layered tasks, each depending on the
+             one before, added to a top supervisor the way mmt does
+Usage:
+    python benchmark_scheduler.py --shape layered --tasks 10000 --out bench.jsonl
+    python benchmark_scheduler.py --shape nested --tasks 500 --executor local --sleep 0.1
+'''
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import platform
+import subprocess
+
+from tasks_v2 import Task, Supervisor, TaskGraph, Barrier
+from task_executors import Executor
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+SHAPES = ['chain', 'fanout', 'fanin', 'fan', 'layered', 'nested']
+
+
+class NoopJob:
+    ''' Handle of a task that was never run, it has already exited with 0.
+    '''
+
+    def __init__(self):
+        self.returncode = 0
+        self.pid = None
+        self.usage = {}
+
+    def poll(self):
+        return self.returncode
+
+    def kill(self):
+        pass
+
+
+class NoopExecutor(Executor):
+    def submit(self, task):
+        return NoopJob()
+
+
+def layered(prefix, count, width, degree, rand, command, dependencies=[]):
+    ''' Returns count tasks in layers of width, every task depending on
+        degree random tasks of the layer before. The first layer depends on
+        dependencies.
+    '''
+    tasks = []
+    previous = []
+    while(len(tasks) < count):
+        layer = []
+        for i in range(min(width, count - len(tasks))):
+            deps = rand.sample(previous, min(degree, len(previous))) if(previous) else dependencies
+            layer.append(Task(command, dependencies=deps, name='{0!s}_{1!s}'.format(prefix, len(tasks) + i)))
+        tasks.extend(layer)
+        previous = layer
+    return tasks
+
+
+def build(args, command):
+    ''' Returns the list of tasks and supervisors to hand to the top level
+        Supervisor, for args.shape.
+    '''
+    rand = random.Random(args.seed)
+    n = args.tasks
+    name = lambda i: 'task_{0!s}'.format(i)
+    if(args.shape == 'chain'):
+        tasks = []
+        for i in range(n):
+            tasks.append(Task(command, dependencies=tasks[-1:], name=name(i)))
+        return tasks
+    if(args.shape == 'fanout'):
+        root = Task(command, name=name(0))
+        return [root] + [Task(command, dependencies=[root], name=name(i)) for i in range(1, n)]
+    if(args.shape == 'fanin'):
+        sources = [Task(command, name=name(i)) for i in range(n - 1)]
+        return sources + [Task(command, dependencies=sources, name=name(n - 1))]
+    if(args.shape == 'fan'):
+        root = Task(command, name=name(0))
+        middle = [Task(command, dependencies=[root], name=name(i)) for i in range(1, n - 1)]
+        return [root] + middle + [Task(command, dependencies=middle, name=name(n - 1))]
+    if(args.shape == 'layered'):
+        return layered('task', n, args.width, args.degree, rand, command)
+    supers = []
+    for s in range(args.stages):
+        count = n // args.stages + (1 if(s < n % args.stages) else 0)
+        tasks = layered('stage{0!s}'.format(s), count, args.width, args.degree, rand, command)
+        supers.append(Supervisor(tasks=tasks, dependencies=supers[-1:], name='stage{0!s}'.format(s)))
+    return supers
+
+
+def summarize(values):
+    ''' Returns the count, mean, p50, p95 and max of a list of numbers.
+    '''
+    if(values == []):
+        return {'count': 0}
+    values = sorted(values)
+    pick = lambda p: values[int(round(p * (len(values) - 1)))]
+    return {'count': len(values), 'mean': sum(values) / len(values), 'p50': pick(0.5),
+            'p95': pick(0.95), 'max': values[-1]}
+
+
+def timed(owner, attr, totals, key):
+    ''' Replaces the method attr of owner with one that adds the seconds
+        spent in it to totals[key]. Returns the original, for restore().
+    '''
+    original = owner.__dict__[attr]
+
+    def wrapper(*args, **kwargs):
+        start = time.time()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            totals[key] += time.time() - start
+    setattr(owner, attr, wrapper)
+    return (owner, attr, original)
+
+
+def stamped(owner, attr, stamps):
+    ''' Replaces the method attr of owner, whose first argument after self
+        is a task, with one that records when it returned for each task.
+    '''
+    original = owner.__dict__[attr]
+
+    def wrapper(self, task, *args, **kwargs):
+        result = original(self, task, *args, **kwargs)
+        stamps[task] = time.time()
+        return result
+    setattr(owner, attr, wrapper)
+    return (owner, attr, original)
+
+
+def restore(patches):
+    for owner, attr, original in patches:
+        setattr(owner, attr, original)
+
+
+def rusage_cpu():
+    if(resource is None):
+        return time.process_time() if(hasattr(time, 'process_time')) else time.clock()
+    ru = resource.getrusage(resource.RUSAGE_SELF)
+    return ru.ru_utime + ru.ru_stime
+
+
+def run_benchmark(args, log):
+    ''' Builds and runs one graph, returns the result record.
+    '''
+    command = 'sleep {0!s}'.format(args.sleep) if(args.sleep > 0) else 'true'
+    totals = {'setup': 0.0, 'dependency_check': 0.0, 'schedule_pass': 0.0}
+    launched = {}
+    seen_done = {}
+    patches = [timed(TaskGraph, '__init__', totals, 'setup'),
+               timed(Supervisor, '__prioritize__', totals, 'setup'),
+               timed(TaskGraph, 'complete', totals, 'dependency_check'),
+               timed(TaskGraph, 'dependenciesMet', totals, 'dependency_check'),
+               timed(Supervisor, '__startReady__', totals, 'schedule_pass'),
+               stamped(Supervisor, '__launch__', launched),
+               stamped(Supervisor, '__taskFinished__', seen_done)]
+    noop = args.executor == 'noop'
+    stdout = sys.stdout
+    try:
+        start = time.time()
+        supers = build(args, command)
+        top = Supervisor(tasks=supers, cpu=args.cpu, log=log, executor=NoopExecutor() if(noop) else None,
+                         event_driven=not noop, delay=0 if(noop) else 1)
+        totals['setup'] += time.time() - start
+        # the supervisor echoes its log to a terminal, which isn't what is measured
+        sys.stdout = open(os.devnull, 'w')
+        cpu = rusage_cpu()
+        start = time.time()
+        top.run()
+        wall = time.time() - start
+        cpu = rusage_cpu() - cpu
+    finally:
+        if(sys.stdout is not stdout):
+            sys.stdout.close()
+            sys.stdout = stdout
+        restore(patches)
+    graph = top.graph
+    waits = []
+    to_start = []
+    detect = []
+    barrier_done = {}
+
+    def done(p):
+        # a barrier is seen done when the last of its members is
+        if(not isinstance(p, Barrier)):
+            return seen_done[p]
+        if(p not in barrier_done):
+            barrier_done[p] = max(seen_done[m] for m in p.members)
+        return barrier_done[p]
+    for t in top.task_order:
+        temp = top.task_status[t]
+        if(temp['wait'] is not None):
+            waits.append(temp['wait'])
+        preds = graph.predecessors[t]
+        if(preds and t in launched):
+            to_start.append(launched[t] - max(done(p) for p in preds))
+        if(args.sleep > 0 and t in seen_done):
+            detect.append(seen_done[t] - t.start_time - args.sleep)
+    # barriers included, see tasks_v2.Barrier
+    edges = sum(len(p) for p in graph.predecessors.values())
+    return {'time': time.time(), 'host': socket.gethostname(), 'python': platform.python_version(),
+            'commit': git_commit(), 'label': args.label, 'shape': args.shape, 'tasks': len(top.task_order),
+            'edges': edges, 'executor': args.executor, 'sleep': args.sleep, 'cpu_cap': args.cpu,
+            'watcher': top.watcher.mode, 'wall': wall, 'supervisor_cpu': cpu,
+            'supervisor_cpu_per_task_ms': 1000 * cpu / max(len(top.task_order), 1),
+            'setup': totals['setup'], 'dependency_check': totals['dependency_check'],
+            'schedule_pass': totals['schedule_pass'], 'queue_wait': summarize(waits),
+            'time_to_start': summarize(to_start), 'detect_latency': summarize(detect)}
+
+
+def git_commit():
+    try:
+        with open(os.devnull, 'w') as null:
+            out = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=null,
+                                          cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description='Measures the overhead of the tasks_v2 scheduler on synthetic task graphs.')
+    parser.add_argument('--shape', choices=SHAPES, default='layered', help='The shape of the graph. Default = layered')
+    parser.add_argument('--tasks', type=int, default=1000, help='The number of tasks. Default = 1000')
+    parser.add_argument('--width', type=int, default=100, help='Tasks per layer, for layered and nested. Default = 100')
+    parser.add_argument('--degree', type=int, default=3, help='Dependencies per task, for layered and nested. Default = 3')
+    parser.add_argument('--stages', type=int, default=5, help='Supervisors, for nested. Default = 5')
+    parser.add_argument('--executor', choices=['noop', 'local'], default='noop', help='noop never runs the commands, local runs them. Default = noop')
+    parser.add_argument('--sleep', type=float, default=0, help='Seconds every task sleeps, with the local executor. Default = 0 (tasks run true)')
+    parser.add_argument('--cpu', type=float, default=float('inf'), help='The cpu cap, every task uses 1. Default = no cap')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs of the same configuration. Default = 1')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random dependencies. Default = 0')
+    parser.add_argument('--label', default=None, help='A label stored with the results, to tell configurations apart.')
+    parser.add_argument('--out', default='scheduler_benchmark.jsonl', help='The json lines file results are appended to. Default = scheduler_benchmark.jsonl')
+    parser.add_argument('--log', default=os.devnull, help='The run log of the benchmarked supervisor. Default = discarded')
+    return parser
+
+
+def main(args=None):
+    args = arg_parser().parse_args(args)
+    if(args.sleep > 0 and args.executor == 'noop'):
+        sys.exit('--sleep needs --executor local')
+    if(args.tasks < 2):
+        sys.exit('--tasks must be at least 2')
+    for i in range(args.repeat):
+        record = run_benchmark(args, args.log)
+        with open(args.out, 'a') as f:
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+        print('{0!s} x{1!s} ({2!s} edges): wall {3:.2f}s, supervisor cpu {4:.2f}s ({5:.3f}ms/task), '
+              'setup {6:.2f}s, dependency checks {7:.2f}s, schedule passes {8:.2f}s, '
+              'time to start p50 {9!s}'.format(
+              record['shape'], record['tasks'], record['edges'], record['wall'], record['supervisor_cpu'],
+              record['supervisor_cpu_per_task_ms'], record['setup'], record['dependency_check'],
+              record['schedule_pass'], '{0:.4f}s'.format(record['time_to_start']['p50'])
+              if(record['time_to_start']['count'] > 0) else '-'))
+
+
+if(__name__ == '__main__'):
+    main()
@@ -16,7 +16,7 @@ def gen_salmon_supervisor(opc, fastq1,fastq2,paired_names,unpaired,unpaired_name
     salmon_tasks = []
     salmon_dir = fg.make_dir_task(os.path.join(out_dir,'salmon'))
     out_dir = salmon_dir.targets[0]
-    build_salmon = fex.build_salmon_task(opc, assembly_path, assembly_name, out_dir,fg.round_div(cpu_cap, 2),[salmon_dir])
+    build_salmon = fex.build_salmon_task(opc, assembly_path, assembly_name, out_dir,cpu_cap,[salmon_dir])
     deps = deps + [build_salmon] #, salmon_gene_map]
     salmon_trans_gene_map = ''
     if len(gene_trans_map) > 0:
@@ -26,12 +26,12 @@ def gen_salmon_supervisor(opc, fastq1,fastq2,paired_names,unpaired,unpaired_name
     for i in range(len(fastq1)):
         #filename = '_'.join([paired_names[i],salmon_naming,assembly_name]) 
         filename = paired_names[i] #,salmon_naming,assembly_name]) 
-        salmon = fex.salmon_task(opc, build_salmon.targets[0],fastq1[i],fastq2[i],filename, salmon_trans_gene_map,out_dir,fg.round_div(cpu_cap,2),deps)
+        salmon = fex.salmon_task(opc, build_salmon.targets[0],fastq1[i],fastq2[i],filename, salmon_trans_gene_map,out_dir,cpu_cap,deps)
         salmon_tasks.append(salmon)
     for i in range(len(unpaired)):
         #filename = '_'.join([unpaired_names[i],salmon_naming,assembly_name]) 
         filename = unpaired_names[i] #,salmon_naming,assembly_name]) 
-        salmon = fex.salmon_unpaired_task(opc, build_salmon.targets[0],unpaired[i],filename,salmon_trans_gene_map,out_dir,fg.round_div(cpu_cap,2),deps)
+        salmon = fex.salmon_unpaired_task(opc, build_salmon.targets[0],unpaired[i],filename,salmon_trans_gene_map,out_dir,cpu_cap,deps)
         salmon_tasks.append(salmon)
     transcriptName = assembly_name  #'_'.join([assembly_name,salmon_naming])
     geneName = assembly_name + '_gene' #'_'.join([assembly_name,salmon_naming,'gene'])
@@ -41,22 +41,25 @@ def gen_salmon_supervisor(opc, fastq1,fastq2,paired_names,unpaired,unpaired_name
     salmon_tasks = [salmon_dir,build_salmon,salmon_gene_map,counts_to_table_salmon, deseq2_salmon, deseq2_salmon_gene]+salmon_tasks
     return Supervisor(tasks = salmon_tasks)
 
-def gen_express_supervisor(opc,fastq1,fastq2,paired_names,unpaired,unpaired_names,assembly_path,assembly_name,bowtie2_index,gene_trans_map,sample_info,model,out_dir,cpu_cap,deps):
+def gen_express_supervisor(opc,fastq1,fastq2,paired_names,unpaired,unpaired_names,assembly_path,assembly_name,bowtie2_index,gene_trans_map,sample_info,model,out_dir,cpu_cap,deps,stream=False):
+    ''' With stream=True the alignments are piped from bowtie2 into express
+        rather than written to disk, and aren't kept.
+    '''
     express_tasks,bowtie_e_tasks = [],[]
     express_dir = fg.make_dir_task(os.path.join(out_dir,'express'))
     out_dir = express_dir.targets[0]
     for i in range(len(fastq1)):
         filename = paired_names[i] #'_'.join([paired_names[i],express_naming,assembly_name]) 
         #filename = '_'.join([paired_names[i],express_naming,assembly_name]) 
-	bowtie_e = fex.bowtie2_task(opc, bowtie2_index,out_dir,fastq1[i],fastq2[i],filename,0,fg.round_div(cpu_cap,2),deps)
-        express = fex.express_task(opc, bowtie2_index,assembly_path,out_dir,paired_names[i],bowtie_e.targets[0],[bowtie_e])
+	bowtie_e = fex.bowtie2_task(opc, bowtie2_index,out_dir,fastq1[i],fastq2[i],filename,0,cpu_cap,deps,stream)
+        express = fex.express_task(opc, bowtie2_index,assembly_path,out_dir,paired_names[i],bowtie_e.targets[0],[bowtie_e],stream)
         bowtie_e_tasks.append(bowtie_e)
         express_tasks.append(express)
     for i in range(len(unpaired)):
         filename = unpaired_names[i] #'_'.join([unpaired_names[i],express_naming,assembly_name])
-        bowtie_e = fex.bowtie2_unpaired_task(opc, bowtie2_index,out_dir,unpaired[i],filename,0,fg.round_div(cpu_cap,2),deps)
+        bowtie_e = fex.bowtie2_unpaired_task(opc, bowtie2_index,out_dir,unpaired[i],filename,0,cpu_cap,deps,stream)
         bowtie_e_tasks.append(bowtie_e)
-        express = fex.express_task(opc, bowtie2_index,assembly_path,out_dir,unpaired_names[i],bowtie_e.targets[0],[bowtie_e])
+        express = fex.express_task(opc, bowtie2_index,assembly_path,out_dir,unpaired_names[i],bowtie_e.targets[0],[bowtie_e],stream)
         express_tasks.append(express)
     transcriptName = assembly_name #'_'.join([assembly_name,express_naming])
     geneName = assembly_name + '_gene' #'_'.join([assembly_name,express_naming,'gene'])
@@ -73,13 +76,13 @@ def gen_rapclust_supervisor(opc,fastq1,fastq2,paired_names,unpaired,unpaired_nam
     for i in range(len(fastq1)):
         filename = paired_names[i] #'_'.join([paired_names[i],express_naming,assembly_name]) 
         #filename = '_'.join([paired_names[i],express_naming,assembly_name]) 
-	bowtie_rc = fex.bowtie2_task(opc, bowtie2_index,out_dir,fastq1[i],fastq2[i],filename,2,fg.round_div(cpu_cap,2),deps)
+	bowtie_rc = fex.bowtie2_task(opc, bowtie2_index,out_dir,fastq1[i],fastq2[i],filename,2,cpu_cap,deps)
 #        express = fex.express_task(opc, bowtie2_index,assembly_path,out_dir,paired_names[i],bowtie_e.targets[0],[bowtie_e])
         bowtie_rc_tasks.append(bowtie_rc)
 #        express_tasks.append(express)
     for i in range(len(unpaired)):
         filename = unpaired_names[i] #'_'.join([unpaired_names[i],express_naming,assembly_name])
-        bowtie_rcU = fex.bowtie2_unpaired_task(opc, bowtie2_index,out_dir,unpaired[i],filename,2,fg.round_div(cpu_cap,2),deps)
+        bowtie_rcU = fex.bowtie2_unpaired_task(opc, bowtie2_index,out_dir,unpaired[i],filename,2,cpu_cap,deps)
         bowtie_rc_tasks.append(bowtie_rcU)
  #       express = fex.express_task(opc, bowtie2_index,assembly_path,out_dir,unpaired_names[i],bowtie_e.targets[0],[bowtie_e])
   #      express_tasks.append(express)
@@ -100,7 +103,7 @@ def gen_intersect_supervisor(opc,fq1,fq2,paired_names,unpaired,unpaired_names,as
     for i in range(len(fq1)):
         filename = paired_names[i] #'_'.join([paired_names[i],intersect_naming,assembly_name]) 
         #filename = '_'.join([paired_names[i],intersect_naming,assembly_name]) 
-        bowtie_i = fex.bowtie2_task(opc, bowtie2_index,out_dir,fq1[i],fq2[i],filename,1,fg.round_div(cpu_cap,2),deps)
+        bowtie_i = fex.bowtie2_task(opc, bowtie2_index,out_dir,fq1[i],fq2[i],filename,1,cpu_cap,deps)
 	sorted_name = filename + '_sorted'
         sam_sort = fex.sam_sort_task(opc, out_dir,bowtie_i.targets[0],sorted_name,[bowtie_i])
         intersect_bed = fex.intersect_bed_task(opc, out_dir,sam_sort.targets[0],fasta_to_bed.targets[0],paired_names[i],[sam_sort,fasta_to_bed])
@@ -109,7 +112,7 @@ def gen_intersect_supervisor(opc,fq1,fq2,paired_names,unpaired,unpaired_names,as
         intersect_tasks.append(intersect_bed)
     for i in range(len(unpaired)):
         filename = unpaired_names[i] #'_'.join([unpaired_names[i],intersect_naming,assembly_name])
-        bowtie_i = fex.bowtie2_unpaired_task(opc, bowtie2_index,out_dir,unpaired[i],filename,1,fg.round_div(cpu_cap,2),deps)
+        bowtie_i = fex.bowtie2_unpaired_task(opc, bowtie2_index,out_dir,unpaired[i],filename,1,cpu_cap,deps)
         bowtie_i_tasks.append(bowtie_i)
 	sorted_name = filename + '_sorted'
         sam_sort = fex.sam_sort_task(opc, out_dir,bowtie_i.targets[0],sorted_name,[bowtie_i])
@@ -124,14 +127,14 @@ def gen_intersect_supervisor(opc,fq1,fq2,paired_names,unpaired,unpaired_names,as
     i_tasks = [intersect_dir,fasta_to_bed,counts_to_table_intersect,deseq2_intersect, deseq2_intersect_gene]+bowtie_i_tasks+sam_sort_tasks+intersect_tasks
     return Supervisor(tasks=i_tasks)
 
-def gen_expression_supervisor(opc, dbs, fastq1,fastq2,paired_names,unpaired,unpaired_names,cpu,sample_info,model,gene_trans_map,dependency_set,assembly_name, assembly_path, out_dir,run_salmon=True,run_express=False,run_intersectbed=False,run_rapclust=False):
+def gen_expression_supervisor(opc, dbs, fastq1,fastq2,paired_names,unpaired,unpaired_names,cpu,sample_info,model,gene_trans_map,dependency_set,assembly_name, assembly_path, out_dir,run_salmon=True,run_express=False,run_intersectbed=False,run_rapclust=False,stream=False):
     all_tasks = []
     deps = []
     trim_reads = False
     if trim_reads:
         trimmomatic_flag = True
 	rmdup = False
-	truncate_opt = False
+	truncate_opt = -1
 	trim_tasks,fastq1,fastq2,unpaired=assemb.gen_trimming_supervisor(opc,out_dir,fastq1,fastq2,unpaired,False,trimmomatic_flag,rmdup,10**15,0,truncate_opt,[],cpu) 
 	all_tasks.append(trim_tasks)
 	deps.append(trim_tasks)
@@ -143,7 +146,7 @@ def gen_expression_supervisor(opc, dbs, fastq1,fastq2,paired_names,unpaired,unpa
         bowtie2_index = join(dirname(build_bowtie.targets[0]),basename(build_bowtie.targets[0]).split('.')[0])
 	all_tasks.append(build_bowtie)
 	if run_express:
-	    express_tasks = gen_express_supervisor(opc,fastq1,fastq2,paired_names,unpaired,unpaired_names,assembly_path,assembly_name,bowtie2_index,gene_trans_map,sample_info,model,out_dir,cpu, [build_bowtie])
+	    express_tasks = gen_express_supervisor(opc,fastq1,fastq2,paired_names,unpaired,unpaired_names,assembly_path,assembly_name,bowtie2_index,gene_trans_map,sample_info,model,out_dir,cpu, [build_bowtie],stream)
             all_tasks.append(express_tasks)
 	if run_rapclust:
 	    rc_tsks = gen_rapclust_supervisor(opc,fastq1,fastq2,paired_names,unpaired,unpaired_names,assembly_path,assembly_name,bowtie2_index,gene_trans_map,sample_info,model,out_dir,cpu, [build_bowtie])
@@ -1,5 +1,5 @@
 import os
-from tasks_v2 import Task
+from tasks_v2 import Task, PythonTask
 import mmt_defaults as statics
 from external_tools import TOOLS_DICT
 from functions_general import gen_logs, tool_path_check
@@ -23,7 +23,7 @@ def gene_trans_map_task(opc, path_assembly, out_dir, tasks):
           path_assembly, trgs[0])
     name = 'gene_trans_map_' + assembly_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=1)
 
 
 def blast_task(opc, blast_type, out_dir, path_query, path_db, cpu_cap, tasks):
@@ -39,10 +39,10 @@ def blast_task(opc, blast_type, out_dir, path_query, path_db, cpu_cap, tasks):
            '-outfmt "6 qseqid sseqid pident length mismatch gapopen qstart qend sstart '
            'send evalue bitscore stitle slen" -evalue 0.0001 > {4!s}'
            ).format(tool_path_check(TOOLS_DICT['blast'].full_exe[exe_index]),
-                    path_query, path_db, cpu_cap, trgs[0])
+                    path_query, path_db, Task.THREADS, trgs[0])
     name = '{0!s}_{1!s}_{2!s}'.format(assembly_name, blast_type, db_name)
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, cpu=cpu_cap, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, cpu=cpu_cap, min_cpu=1, stdout=out, stderr=err, mem=2)
 
 
 def diamond_task(opc, blast_type, out_dir, path_query, ref, cpu_cap, tasks):
@@ -50,15 +50,16 @@ def diamond_task(opc, blast_type, out_dir, path_query, ref, cpu_cap, tasks):
     base_ref = os.path.basename(ref)
     query_name = os.path.basename(path_query).split('.')[0]
     trgs = ['{0!s}/{1!s}_{2!s}.diamond_{3!s}'.format(out_dir, query_name, base_ref, blast_type)]
-    pseudo_trgs = ['{0!s}/diamond_{1!s}_{2!s}'.format(out_dir, base_ref, blast_type)]
+    pseudo_trgs = ['{0!s}/diamond_{1!s}_{2!s}'.format(Task.WORK_DIR, base_ref, blast_type)]
     cmd = ('{0!s} {1!s} --db {2!s} --query {3!s} --daa {4!s} --tmpdir {5!s} '
            '--max-target-seqs 20 --sensitive --threads {6!s} --evalue 0.001; {0!s} view '
            '--daa {4!s}.daa --out {7!s};').format(
            tool_path_check(TOOLS_DICT['diamond'].full_exe[0]), blast_type, ref, path_query,
-           pseudo_trgs[0], out_dir, cpu_cap, trgs[0])
+           pseudo_trgs[0], Task.WORK_DIR, Task.THREADS, trgs[0])
     name = 'diamond_{0!s}_{1!s}_{2!s}'.format(blast_type, base_ref, query_name)
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, cpu=cpu_cap, targets=trgs, name=name, stdout=out, stderr=err)
+    # diamond needs roughly 6x its block size (-b, default 2.0) in GB
+    return Task(command=cmd, dependencies=tasks, cpu=cpu_cap, min_cpu=1, targets=trgs, name=name, stdout=out, stderr=err, mem=12, resources={statics.RESOURCE_IO: 1}, inputs=[path_query], work_dir=out_dir, scratch=20, stage_inputs=True)
 
 
 def blast_augment_task(opc, db, blast, tasks):
@@ -68,7 +69,7 @@ def blast_augment_task(opc, db, blast, tasks):
            statics.PATH_UTIL, id2name, blast, trgs[0])
     name = 'Blast_Augmentation_'+os.path.basename(blast)
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=4)
 
 
 def rnammer_task(opc, path_assembly, out_dir, tasks):
@@ -81,7 +82,7 @@ def rnammer_task(opc, path_assembly, out_dir, tasks):
            path_assembly, path_to_rnammer)
     name = 'rnammer_' + assembly_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=2)
 
 
 def transdecoder_longorfs_task(opc, path_assembly, path_transdecoder_output, cpu_cap, tasks):
@@ -91,10 +92,10 @@ def transdecoder_longorfs_task(opc, path_assembly, path_transdecoder_output, cpu
             '{0!s}/longest_orfs.gff3'.format(longorf_outbase),
             '{0!s}/longest_orfs.cds'.format(longorf_outbase)]
     cmd = ("mkdir -p {0!s}; cd {0!s}; {1!s} -t {2!s}").format(path_transdecoder_output,
-            tool_path_check(TOOLS_DICT['transdecoder'].full_exe[0]), path_assembly, cpu_cap)
+            tool_path_check(TOOLS_DICT['transdecoder'].full_exe[0]), path_assembly)
     name = 'TransDecoder_LongORFs_' + assembly_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap) 
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=2) 
 
 
 def transdecoder_predict_orfs_task(opc, path_assembly, path_transdecoder_output, tasks, pfam_input='', blastp_input=''):
@@ -117,7 +118,7 @@ def transdecoder_predict_orfs_task(opc, path_assembly, path_transdecoder_output,
           path_assembly, pfam, blastp)
     name = 'TransDecoder_Predict_' + assembly_name + retain_pfam + retain_blastp
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=4)
 
 
 def signalp_task(opc, path_orfs, out_dir, tasks):
@@ -126,7 +127,7 @@ def signalp_task(opc, path_orfs, out_dir, tasks):
     cmd = '{0!s} -f short -n {1!s} {2!s}'.format(tool_path_check(TOOLS_DICT['signalp'].full_exe[0]), trgs[-1], path_orfs)
     name = 'signalp_' + out_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=1)
 
 
 def tmhmm_task(opc, path_orfs, out_dir, tasks):
@@ -137,29 +138,29 @@ def tmhmm_task(opc, path_orfs, out_dir, tasks):
           path_orfs, trgs[0])
     name = 'tmhmm_' + out_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=1)
 
 
 def pfam_task(opc, dbs, path_orfs, out_dir, cpu_cap, tasks):
     out_name = os.path.basename(path_orfs).split('.')[0]
     trgs = ['{0!s}/{1!s}.pfam'.format(out_dir, out_name)]
     cmd = '{0!s} --cpu {1!s} --domtblout {2!s} {3!s} {4!s}'.format(
-          tool_path_check(TOOLS_DICT['hmmer'].full_exe[2]), cpu_cap,
+          tool_path_check(TOOLS_DICT['hmmer'].full_exe[2]), Task.THREADS,
           trgs[0], dbs['pfam'].call_path, path_orfs)
     name = 'pfam_' + out_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap, min_cpu=1, mem=2)
 
 
 def pfam_seq_task(opc, dbs, path_orfs, out_dir, cpu_cap, tasks):
     out_name = os.path.basename(path_orfs).split('.')[0]
     trgs = ['{0!s}/{1!s}.pfam_tblout'.format(out_dir, out_name)]
     cmd = '{0!s} --cpu {1!s} --tblout {2!s} {3!s} {4!s}'.format(
-          tool_path_check(TOOLS_DICT['hmmer'].full_exe[0]), cpu_cap,
+          tool_path_check(TOOLS_DICT['hmmer'].full_exe[0]), Task.THREADS,
           trgs[0], dbs['pfam'].call_path, path_orfs)
     name = 'pfam_tblout_' + out_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap, min_cpu=1, mem=2)
 
 
 def annot_table_task(opc, dbs, path_assembly, out_dir, opts, tasks):
@@ -168,53 +169,43 @@ def annot_table_task(opc, dbs, path_assembly, out_dir, opts, tasks):
     base_out_name = '{0!s}/{1!s}'.format(os.path.dirname(path_assembly), out_name)
     trgs = ['{0!s}_{1!s}'.format(base_out_name, sufx) for sufx in suffixes]
     grab_db = lambda s: dbs[s].call_path
-    cmd = (
-        'python {0!s}/annot_table_pandas.py --fasta {1!s} --outfile {2!s} '
-        '--ko2path {14!s} --sp2enzyme {3!s} '
-        '--enzyme2path {4!s} --pfam2enzyme {5!s} --go2path {6!s} '
-        '--nog2function {7!s} --go2slim {8!s} --sp2ko {9!s} --sp2nog {10!s}'
-        ' --sp2ortho {11!s} --sp2bioc {12!s} --sp2goentrez {13!s} ').format(
-        statics.PATH_UTIL, path_assembly, base_out_name, grab_db('swiss_enzyme'),
-        grab_db('enzyme_pathway'), grab_db('pfam_enzyme'), grab_db('go_pathway'),
-        grab_db('nog_functions'), grab_db('goslim_generic'), grab_db('id_mapping_ko'),
-        grab_db('id_mapping_eggnog'), grab_db('id_mapping_orthodb'),
-        grab_db('id_mapping_biocyc'), grab_db('id_mapping_selected'), grab_db('orthology_pathway'))
-    cmd += ' '.join(['--'+k+' '+opts[k] for k in opts])
+    options = {'fasta': path_assembly, 'outfile': base_out_name,
+               'ko2path': grab_db('orthology_pathway'), 'sp2enzyme': grab_db('swiss_enzyme'),
+               'enzyme2path': grab_db('enzyme_pathway'), 'pfam2enzyme': grab_db('pfam_enzyme'),
+               'go2path': grab_db('go_pathway'), 'nog2function': grab_db('nog_functions'),
+               'go2slim': grab_db('goslim_generic'), 'sp2ko': grab_db('id_mapping_ko'),
+               'sp2nog': grab_db('id_mapping_eggnog'), 'sp2ortho': grab_db('id_mapping_orthodb'),
+               'sp2bioc': grab_db('id_mapping_biocyc'), 'sp2goentrez': grab_db('id_mapping_selected')}
+    options.update(opts)
     name = 'build_annotation_table_' + out_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return PythonTask('{0!s}/annot_table_pandas.py'.format(statics.PATH_UTIL), kwargs=options, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=8, priority=Task.PRIORITY_BACKGROUND)
 
 
 def gff3_task(opc, path_assembly, out_path, opts, tasks):
     trgs = [out_path]
-    cmd = ('python {0!s}/annot_table_gff3.py --fasta {1!s} --outfile {2!s} '
-           ).format(statics.PATH_UTIL, path_assembly, out_path)
-    cmd += ' '.join(['--'+k+' '+opts[k] for k in opts])
+    options = {'fasta': path_assembly, 'outfile': out_path}
+    options.update(opts)
     name = 'build_gff3_' + os.path.basename(out_path)
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return PythonTask('{0!s}/annot_table_gff3.py'.format(statics.PATH_UTIL), kwargs=options, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=2, priority=Task.PRIORITY_BACKGROUND)
 
 
 def kegg_task(opc, annotation_table, out_dir, tasks, kegg_map_id='ko01100'):
     kegg_dir = '{0!s}/kegg_maps'.format(out_dir)
     trgs = ['{0!s}/{1!s}.pdf'.format(kegg_dir, kegg_map_id),
             '{0!s}/{1!s}_KO.txt'.format(kegg_dir, kegg_map_id)]
-    cmd = ('mkdir -p {3!s} ; cd {3!s} ; python {0!s}/color_pathways2.py --path {1!s} '
-           ' --transcriptomeKO {2!s} --output {3!s}').format(
-           statics.PATH_UTIL, kegg_map_id, annotation_table, kegg_dir)
     name = 'draw_kegg_map_{0!s}_{1!s}'.format(os.path.basename(annotation_table), kegg_map_id)
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return PythonTask('{0!s}/color_pathways2.py'.format(statics.PATH_UTIL), args=(kegg_map_id, kegg_dir, annotation_table), cwd=kegg_dir, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=1, priority=Task.PRIORITY_BACKGROUND)
 
 
 def pipeplot_task(opc, dbs, annotation_table, out_dir, tasks):
     trgs = ['{0!s}/plots/cogMultiple.png'.format(out_dir)]
     # pipeplot no targets
-    cmd = 'mkdir -p {0!s}/plots ; cd {0!s}/plots ; python {1!s}/pipePlot.py -i {2!s} --nog_categories {3!s};'.format(
-            out_dir, statics.PATH_UTIL, annotation_table, dbs['nog_categories'].call_path)
     name = 'pipeplot'
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return PythonTask('{0!s}/pipePlot.py'.format(statics.PATH_UTIL), args=(annotation_table, dbs['nog_categories'].call_path), cwd='{0!s}/plots'.format(out_dir), dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=1, priority=Task.PRIORITY_BACKGROUND)
 
 
 def assembly_to_bed_task(opc, path_assembly, out_dir, tasks):
@@ -224,4 +215,4 @@ def assembly_to_bed_task(opc, path_assembly, out_dir, tasks):
             statics.PATH_UTIL, path_assembly, trgs[0])
     name = 'fasta_to_bed_' + assembly_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=1)
@@ -1,6 +1,6 @@
 '''
 '''
-from tasks_v2 import Task
+from tasks_v2 import Task, PythonTask
 import os
 from external_tools import TOOLS_DICT
 from functions_general import gen_logs, tool_path_check
@@ -19,10 +19,11 @@ def fastqc_task(opc, out_dir, fq_files, output_name, cpu_cap, tasks):
     outDir = '{0!s}/fastqc_{1!s}'.format(out_dir, output_name)
     trgs = [os.path.join(outDir, os.path.basename(x).rsplit('.f')[0] + '_fastqc.zip') for x in fq_files]
     cmd = 'mkdir {2!s}; {0!s} --extract --outdir {2!s} --threads {3!s} {1!s}'.format(
-           TOOLS_DICT['fastqc'].full_exe[0],' '.join(fq_files), outDir, cpu_param)
+           TOOLS_DICT['fastqc'].full_exe[0],' '.join(fq_files), outDir, Task.THREADS)
     name = 'fastqc_'+output_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    # fastqc allocates 250MB per thread
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_param, min_cpu=1, mem=0.25*cpu_param, resources={statics.RESOURCE_IO: 1}, inputs=fq_files, priority=Task.PRIORITY_BACKGROUND)
 
 
 def prinseq_unpaired_task(opc, out_dir, input1, basename, opts, tasks):
@@ -34,7 +35,7 @@ def prinseq_unpaired_task(opc, out_dir, input1, basename, opts, tasks):
                     basename, opts, trgs[0])
     name = basename
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command = cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs)
+    return Task(command = cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs, mem=2, resources={statics.RESOURCE_IO: 1}, inputs=[input1])
 
 
 def prinseq_task(opc, out_dir, input_1, input_2, basename, opts, tasks):
@@ -56,7 +57,7 @@ def prinseq_task(opc, out_dir, input_1, input_2, basename, opts, tasks):
            input_2, out_dir, basename, opts, pseudo_trgs[0], trgs[0], pseudo_trgs[1], trgs[1])
     name = basename
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs)
+    return Task(command=cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs, mem=4, resources={statics.RESOURCE_IO: 1}, inputs=[input_1, input_2])
 
 
 def trimmomatic_unpaired_task(opc, out_dir,input1, cpu_cap, basename, tasks):
@@ -64,10 +65,10 @@ def trimmomatic_unpaired_task(opc, out_dir,input1, cpu_cap, basename, tasks):
     cmd = ('java -jar {0!s} SE -threads {3!s} {1!s} {2!s} ILLUMINACLIP:'
            '{4!s}:2:30:10 LEADING:3 TRAILING:3 SLIDINGWINDOW:4:15 MINLEN:35'
            ).format(tool_path_check(TOOLS_DICT['trimmomatic'].full_exe[0]),
-           input1, trgs[0],cpu_cap, TOOLS_DICT['trimmomatic'].full_exe[2])  # PATH_TRIMMOMATIC_ADAPTERS_SINGLE)
+           input1, trgs[0], Task.THREADS, TOOLS_DICT['trimmomatic'].full_exe[2])  # PATH_TRIMMOMATIC_ADAPTERS_SINGLE)
     name = basename
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs, cpu=cpu_cap) 
+    return Task(command=cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs, cpu=cpu_cap, min_cpu=1, mem=2, resources={statics.RESOURCE_IO: 1}, inputs=[input1]) 
 
 
 def trimmomatic_task(opc, out_dir, left, right, cpu_cap, basename, tasks):
@@ -80,21 +81,46 @@ def trimmomatic_task(opc, out_dir, left, right, cpu_cap, basename, tasks):
            '{6!s} ILLUMINACLIP:{8!s}:2:30:10 LEADING:3 TRAILING:3 '
            'SLIDINGWINDOW:4:15 MINLEN:35').format(
            tool_path_check(TOOLS_DICT['trimmomatic'].full_exe[0]), left, right,
-           cpu_cap, orphans[0], trgs[0], orphans[1], trgs[1],
+           Task.THREADS, orphans[0], trgs[0], orphans[1], trgs[1],
            TOOLS_DICT['trimmomatic'].full_exe[1])
     name = basename
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs, cpu=cpu_cap) 
+    return Task(command=cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs, cpu=cpu_cap, min_cpu=1, mem=2, resources={statics.RESOURCE_IO: 1}, inputs=[left, right]) 
+
+
+def native_trim_unpaired_task(opc, out_dir, input1, cpu, basename, tasks):
+    ''' Defines the unpaired trimming task run by util/trim_reads.py rather
+        than Trimmomatic, with the same steps and output name.
+    '''
+    trgs = ['{0!s}/{1!s}_{2!s}'.format(out_dir, basename, os.path.basename(input1))]
+    name = basename
+    out, err = gen_logs(opc.path_logs, name)
+    return PythonTask('{0!s}/trim_reads.py'.format(statics.PATH_UTIL), args=(input1, trgs[0]), kwargs={'adapters': TOOLS_DICT['trimmomatic'].full_exe[2], 'cpu': cpu}, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs, cpu=cpu, mem=1, resources={statics.RESOURCE_IO: 1}, inputs=[input1])
+
+
+def native_trim_task(opc, out_dir, left, right, cpu, basename, tasks):
+    ''' Defines the paired trimming task run by util/trim_reads.py rather
+        than Trimmomatic, with the same steps and the same paired and orphan
+        outputs.
+    '''
+    base_str = '{0!s}/{1!s}'.format(out_dir, basename)
+    trgs = [base_str+'_1_' + os.path.basename(left),
+            base_str+'_2_' + os.path.basename(right)]
+    orphans = [base_str+'_1s_' + os.path.basename(left),
+               base_str+'_2s_' + os.path.basename(right)]
+    name = basename
+    out, err = gen_logs(opc.path_logs, name)
+    return PythonTask('{0!s}/trim_reads.py'.format(statics.PATH_UTIL), args=(left, trgs[0], right, trgs[1], orphans[0], orphans[1]), kwargs={'adapters': TOOLS_DICT['trimmomatic'].full_exe[1], 'cpu': cpu}, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs, cpu=cpu, mem=1, resources={statics.RESOURCE_IO: 1}, inputs=[left, right])
 
 
 def rcorrector_task(opc, out_dir, left, right, cpu_cap, basename, tasks):
     trgs = ['{0!s}/{1!s}.cor.fq'.format(out_dir, os.path.basename(left)),
             '{0!s}/{1!s}.corr.fq'.format(out_dir, os.path.basename(right))]
     cmd = 'perl {0!s} -1 {1!s} -2 {2!s} -t {3!s}'.format(
-          tool_path_check(TOOLS_DICT['rcorrector'].full_exe[0]), left, right, cpu_cap)
+          tool_path_check(TOOLS_DICT['rcorrector'].full_exe[0]), left, right, Task.THREADS)
     name = 'Rcorrector_' + basename
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs, cpu=cpu_cap)
+    return Task(command=cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs, cpu=cpu_cap, min_cpu=1, mem=8, inputs=[left, right])
 
 
 def remove_dups_task(opc, out_dir, left, right, out_base, tasks):
@@ -112,7 +138,7 @@ def remove_dups_task(opc, out_dir, left, right, out_base, tasks):
            statics.PATH_UTIL, ','.join(left), ','.join(right), trgs[0], trgs[1])
     name = 'remove_dups'
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs)
+    return Task(command=cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs, mem=4, resources={statics.RESOURCE_IO: 1}, inputs=left+right)
 
 
 def cat_task(opc, out_dir, left, right, basename, tasks):
@@ -122,19 +148,23 @@ def cat_task(opc, out_dir, left, right, basename, tasks):
           ' '.join(left), trgs[0], ' '.join(right), trgs[1])
     name = 'cat_basename'
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs)
+    return Task(command=cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs, resources={statics.RESOURCE_IO: 1}, inputs=left+right)
 
 
-def subset_task(opc, out_dir, fastq1, fastq2, out_base, num, seed, tasks):
+def subset_task(opc, out_dir, fastq1, fastq2, out_base, num, seed, tasks, cpu=1, per_library=False, truncate=-1):
+    ''' Defines the subset task. The libraries are sampled in chunks by cpu
+        processes, and with per_library each library gets an even share of
+        the reads. If truncate is 0 or more, the sampled reads are also cut
+        down to that length, in the same pass.
+    '''
+    # reading is disk bound well before every library is split between
+    # more than a few processes
+    cpu_param = int(min(cpu, 4 * len(fastq1)))
     trgs = ['{0!s}/{1!s}_1.fastq'.format(out_dir, out_base),
             '{0!s}/{1!s}_2.fastq'.format(out_dir, out_base)]
-    cmd = 'python {0!s}/random_subset.py -1 {1!s} -2 {2!s} -n 100 -s {3!s} -t1 {4!s} -t2 {5!s}'.format(
-            statics.PATH_UTIL, ','.join(fastq1), ','.join(fastq2), num, trgs[0], trgs[1])
-    if(seed is not None):
-        cmd += ' --seed '+seed
     name = 'subset_reads'
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs)
+    return PythonTask('{0!s}/random_subset.py'.format(statics.PATH_UTIL), args=(fastq1, fastq2, num, trgs[0], trgs[1]), kwargs={'seed': seed, 'cpu': cpu_param, 'per_library': per_library, 'truncate': truncate}, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs, cpu=cpu_param, mem=1, resources={statics.RESOURCE_IO: 1}, inputs=fastq1+fastq2)
 
 #def seqtk_subset_task(out_dir,left, right, num_seqs, seed,tasks):#out_dir, fastq1, fastq2, out_base, num, seed, tasks):
 #     form = lambda s, i : s.format(out_dir, os.path.basename(i), num_seqs)
@@ -151,17 +181,6 @@ def subset_task(opc, out_dir, fastq1, fastq2, out_base, num, seed, tasks):
 #    return Task(command=cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs, cpu=cpu_cap)
 
 
-def truncate_task(opc, out_dir,left, right, length, tasks):
-    trgs = ['{0!s}/truncated_1.fastq'.format(out_dir, left),
-            '{0!s}/truncated_2.fastq'.format(out_dir, right)]
-    cmd = ('python {0!s}/truncate_fastq.py {1!s} --length {2!s} --target {3!s}; '
-           'python {0!s}/truncate_fastq.py {4!s} --length {2!s} --target {5!s};').format(
-           statics.PATH_UTIL, left, length, trgs[0], right, trgs[1])
-    name = 'truncate_reads'
-    out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, name=name, stdout=out, stderr=err, targets=trgs)
-
-
 def trinity_task(opc, path_assembly, out_dir, fastq, fastq2, unpaired, cpu_cap_trin, cpu_cap_bfly, mem_trin, mem_bfly, normalize_flag, tasks):
     '''    Defines the trinity task. Uses GEN_PATH_DIR(), PATH_TRINITY, NAME_ASSEMBLY
         Params :
@@ -181,11 +200,12 @@ def trinity_task(opc, path_assembly, out_dir, fastq, fastq2, unpaired, cpu_cap_t
     cmd = ('{0!s} --seqType fq {1!s} --CPU {2!s} --max_memory {3!s}G --bflyCalculateCPU {4!s} '
            '--output {6!s}/trinity; cp {6!s}/trinity/Trinity.fasta {7!s};'
            ).format(tool_path_check(TOOLS_DICT['trinity'].full_exe[0]), input_str, cpu_cap_trin,
-                    mem_trin, normalize_flag, mem_bfly, out_dir, trgs[0])
+                    mem_trin, normalize_flag, mem_bfly, Task.WORK_DIR, trgs[0])
     name = 'trinity_assembly'
     out, err = gen_logs(opc.path_logs, name)
     cpu_cap = max(cpu_cap_trin, cpu_cap_bfly)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, cpu=cpu_cap, stdout=out, stderr=err)
+    # trinity skips the stages already checkpointed in its output directory
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, cpu=cpu_cap, stdout=out, stderr=err, mem=mem_trin, resources={statics.RESOURCE_IO: 1}, inputs=fastq+fastq2+unpaired, resume_command=cmd, work_dir=out_dir, scratch=50)
 
 
 def rnaspades_task(opc, path_assembly, out_dir, left, right, unpaired, cpu_cap, tasks):
@@ -200,6 +220,9 @@ def rnaspades_task(opc, path_assembly, out_dir, left, right, unpaired, cpu_cap,
     cmd = '{0!s} {1!s} --threads {2!s} -o {3!s}; cp {3!s}/contigs.fasta {4!s};'.format(
             tool_path_check(TOOLS_DICT['rnaspades'].full_exe[0]), ' '.join(input_strings),
             cpu_cap, virtual_target, trgs[0])
+    # spades restarts from its last checkpoint with --continue, which only takes -o
+    resume = '{0!s} --continue -o {1!s}; cp {1!s}/contigs.fasta {2!s};'.format(
+            tool_path_check(TOOLS_DICT['rnaspades'].full_exe[0]), virtual_target, trgs[0])
     name = 'rnaSPAdes_assembly'
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap, mem=16, resources={statics.RESOURCE_IO: 1}, inputs=left+right+unpaired, resume_command=resume)
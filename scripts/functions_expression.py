@@ -1,4 +1,4 @@
-from tasks_v2 import Task
+from tasks_v2 import Task, PythonTask
 import os
 from functions_general import tool_path_check, gen_logs
 from external_tools import TOOLS_DICT
@@ -15,59 +15,73 @@ def build_bowtie_task(opc, path_assembly, assembly_name, out_dir, tasks):
           out_dir, assembly_name)
     name = 'build_bowtie_' + assembly_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=4)
 
 
-def bowtie2_unpaired_task(opc, bowtie2_index, out_dir, fastq, out_name, opt, cpu_cap, tasks):
+def bowtie2_unpaired_task(opc, bowtie2_index, out_dir, fastq, out_name, opt, cpu_cap, tasks, stream=False):
+    ''' Defines the unpaired bowtie2 task. With stream=True the alignments
+        are written as sam, for a task streaming them (see express_task),
+        rather than compressed to bam.
+    '''
     opts = ['-a -t --end-to-end', '-t --local', '-k 200 --end-to-end']
-    trgs = ['{0!s}/{1!s}.bam'.format(out_dir, out_name)]
+    trgs = ['{0!s}/{1!s}.{2!s}'.format(out_dir, out_name, 'sam' if(stream) else 'bam')]
+    to_bam = '' if(stream) else '| samtools view -Sb - '
     cmd = ('{0!s} {1!s} -L {2!s} -N 1 --threads {3!s} -x {4!s} -U '
-           '{5!s} | samtools view -Sb - > {6!s} ').format(
+           '{5!s} {7!s}> {6!s} ').format(
            tool_path_check(TOOLS_DICT['bowtie2'].full_exe[1]),
-           opts[opt], 22, cpu_cap, bowtie2_index, fastq, trgs[0])
+           opts[opt], 22, Task.THREADS, bowtie2_index, fastq, trgs[0], to_bam)
     name = 'bowtie2_' + os.path.basename(bowtie2_index) + '_' + out_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap, min_cpu=1, mem=2)
 
 
-def bowtie2_task(opc, bowtie2_index, out_dir, fastq1, fastq2, out_name, opt, cpu_cap, tasks):
+def bowtie2_task(opc, bowtie2_index, out_dir, fastq1, fastq2, out_name, opt, cpu_cap, tasks, stream=False):
+    ''' Defines the paired bowtie2 task. With stream=True the alignments are
+        written as sam, for a task streaming them (see express_task), rather
+        than compressed to bam.
+    '''
     opts = ['-a -t --end-to-end', '-t --local','-k 200 -t --no-discordant --end-to-end' ]
     opts_name = ['express', 'intersectBed', 'rapclust']
-    trgs = ['{0!s}/{1!s}.bam'.format(out_dir, out_name)]
+    trgs = ['{0!s}/{1!s}.{2!s}'.format(out_dir, out_name, 'sam' if(stream) else 'bam')]
+    to_bam = '' if(stream) else '| samtools view -Sb - '
     cmd = ('{0!s} {1!s} -L {2!s} -N 1 --maxins 800 --threads {3!s} -x {4!s} -1 '
-           '{5!s} -2 {6!s} | samtools view -Sb - > {7!s} ').format(
+           '{5!s} -2 {6!s} {8!s}> {7!s} ').format(
            tool_path_check(TOOLS_DICT['bowtie2'].full_exe[1]),
-           opts[opt], 22, cpu_cap, bowtie2_index, fastq1, fastq2, trgs[0])
+           opts[opt], 22, Task.THREADS, bowtie2_index, fastq1, fastq2, trgs[0], to_bam)
     name = 'bowtie2_' + os.path.basename(bowtie2_index) + '_' + out_name + '_' + opts_name[opt]
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap, min_cpu=1, mem=2)
 
 
-def express_task(opc, bowtie2_index, assembly_path, out_dir, out_name, bam_input, tasks):
+def express_task(opc, bowtie2_index, assembly_path, out_dir, out_name, bam_input, tasks, stream=False):
+    ''' Defines the express task. With stream=True, bam_input is read from a
+        named pipe written by the bowtie2 task producing it, so the
+        alignments never reach the disk. It is then fed to express on stdin,
+        opened once.
+    '''
     trgs = ['{0!s}/{1!s}.xprs'.format(out_dir, out_name)]
-    cmd = ('mkdir {1!s}/{2!s}; {0!s} --output-dir {1!s}/{2!s} {3!s} {4!s}; mv '
+    cmd = ('mkdir {1!s}/{2!s}; {0!s} --output-dir {1!s}/{2!s} {3!s} {6!s}{4!s}; mv '
            '{1!s}/{2!s}/results.xprs {5!s}; rm -rf {1!s}/{2!s};').format(
            tool_path_check(TOOLS_DICT['express'].full_exe[0]), out_dir,
-           out_name, assembly_path, bam_input, trgs[0])
+           out_name, assembly_path, bam_input, trgs[0], '< ' if(stream) else '')
     name = 'express_' + os.path.basename(bowtie2_index) + '_' + out_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    streams = [bam_input] if(stream) else []
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=4, streams=streams)
 
 
 def counts_to_table_task(opc, assembly_name, gene_trans_map, out_dir, count_files, out_name, flag, tasks):
     trgs = ['{0!s}/{1!s}.countsTable'.format(out_dir, out_name),
             '{0!s}/{1!s}_gene.countsTable'.format(out_dir, out_name)]
-    count_str = ' '.join(['--counts {0!s}'.format(f) for f in count_files])
-    cmd = ('python {0!s}/counts_to_table2.py --out {1!s} --inDir {2!s} '
-           '--outDir {2!s} {3!s} {4!s} --geneTransMap {5!s}').format(
-           statics.PATH_UTIL, out_name, out_dir, flag, count_str, gene_trans_map)
+    kwargs = {'inDir': out_dir, 'outDir': out_dir}
     if len(flag) > 1:
+        kwargs[flag.split('--')[1]] = True
         name = '_' + flag.split('--')[1]
     else:
         name = '_intersectBed'
     name = 'counts_to_table_' + assembly_name + name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return PythonTask('{0!s}/counts_to_table2.py'.format(statics.PATH_UTIL), args=(out_name, count_files, gene_trans_map), kwargs=kwargs, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=2)
 
 
 # samtools is not currently included as a tools class instance
@@ -76,7 +90,7 @@ def sam_sort_task(opc, out_dir, bam_file, out_name, tasks):
     cmd = 'samtools sort {0!s} {1!s}/{2!s}'.format(bam_file, out_dir, out_name)
     name = 'sam_sort_' + os.path.basename(bam_file) + '_' + out_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=1, resources={statics.RESOURCE_IO: 1})
 
 
 def intersect_bed_task(opc, out_dir, bam_file, bed_reference, output_name, tasks):
@@ -87,7 +101,7 @@ def intersect_bed_task(opc, out_dir, bam_file, bed_reference, output_name, tasks
           bam_file, bed_reference, trgs[0])
     name = 'intersect_bed_' + os.path.basename(bed_reference) + '_' + output_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=2)
 
 
 def deseq2_task(opc, assembly_name, out_dir, counts_to_table_results, sample_info, basename, model, tasks):
@@ -100,7 +114,7 @@ def deseq2_task(opc, assembly_name, out_dir, counts_to_table_results, sample_inf
     # name = 'de_' + assembly_name + '_' + basename
     name = 'de_' + basename + '_' + os.path.basename(out_dir)
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=4)
 
 
 def build_salmon_task(opc, path_assembly, assembly_name, out_dir, cpu_cap, tasks):
@@ -108,10 +122,10 @@ def build_salmon_task(opc, path_assembly, assembly_name, out_dir, cpu_cap, tasks
     cmd = ('{0!s} index --transcripts {1!s} --index {2!s}/{3!s}_salmon '
            '--threads {4!s} --type quasi').format(
            tool_path_check(TOOLS_DICT['salmon'].full_exe[0]), path_assembly,
-           out_dir, assembly_name, cpu_cap)
+           out_dir, assembly_name, Task.THREADS)
     name = 'build_salmon_' + assembly_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap, min_cpu=1, mem=8, resources={statics.RESOURCE_IO: 1}, inputs=[path_assembly], scratch=10)
 
 
 def salmon_gene_map_task(opc, out_dir, assembly_name, gene_trans_map, tasks):
@@ -120,7 +134,7 @@ def salmon_gene_map_task(opc, out_dir, assembly_name, gene_trans_map, tasks):
     cmd = '''awk '{{ print $2 " " $1}}' {0!s} > {1!s}'''.format(gene_trans_map, trgs[0])
     name = 'salmon_gene_map_task_' + assembly_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=0.5)
 
 
 def salmon_task(opc, index, left, right, out_name, gene_map, out_dir, cpu_cap, tasks):
@@ -134,10 +148,10 @@ def salmon_task(opc, index, left, right, out_name, gene_map, out_dir, cpu_cap, t
     #cmd = '{0!s} quant -i {1!s} -l IU -1 {2!s} -2 {3!s} -o {4!s}/{5!s} 
     #--geneMap {6!s} -p {7!s} --extraSensitive --numBootstraps 30 --biasCorrect ; cp ' \
            tool_path_check(TOOLS_DICT['salmon'].full_exe[0]), index, left,
-           right, out_dir, out_name, trans_gene_map, cpu_cap)
+           right, out_dir, out_name, trans_gene_map, Task.THREADS)
     name = os.path.basename(index) + '_' + os.path.basename(left)
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap, min_cpu=1, mem=4)
 
 
 def salmon_unpaired_task(opc, index, unpaired, out_name, gene_map, out_dir, cpu_cap, tasks):
@@ -151,10 +165,10 @@ def salmon_unpaired_task(opc, index, unpaired, out_name, gene_map, out_dir, cpu_
            '{3!s}/{4!s}_quant.sf; cp {3!s}/{4!s}/quant.genes.sf '
            '{3!s}/{4!s}_quant.genes.sf').format(
            tool_path_check(TOOLS_DICT['salmon'].full_exe[0]), index, unpaired,
-           out_dir, out_name, trans_gene_map, cpu_cap)
+           out_dir, out_name, trans_gene_map, Task.THREADS)
     name = 'salmon_unpaired_' + os.path.basename(index) + '_' + os.path.basename(unpaired)
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, cpu=cpu_cap, min_cpu=1, mem=4)
 
 
 def build_kallisto_task(opc, assembly_path, assembly_name, out_dir, tasks):
@@ -165,7 +179,7 @@ def build_kallisto_task(opc, assembly_path, assembly_name, out_dir, tasks):
           assembly_name, assembly_path)
     name = 'build_kallisto'
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=4)
 
 
 def kallisto_task(opc, index,out_dir,out_name,left,right,tasks):
@@ -176,4 +190,4 @@ def kallisto_task(opc, index,out_dir,out_name,left,right,tasks):
           out_dir, out_name, left, right)
     name = 'kallisto'
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=2)
@@ -1,5 +1,5 @@
 import mmt_defaults as statics
-from tasks_v2 import Task
+from tasks_v2 import Task, PythonTask
 import os
 import sys
 import warnings
@@ -174,11 +174,6 @@ def manage_tools_task(install, fresh, cpu_cap, tool_list, tasks, log_flag=True,
 def filter_task(assembly_path, assembly_name, out_dir, quant_file_list, tpm_threshold, tpm_column_index, tasks, log_flag=True, opc=None):
     '''TPM column index: transrate uses older salmon; use index =2. Newer salmon: index=3'''
     trgs = ['{0!s}/{1!s}_{2!s}tpm.fasta'.format(out_dir, assembly_name, tpm_threshold)]
-    quants = ''.join(' --quant_files ' + x for x in quant_file_list)
-    cmd = ('python {0!s}/filter_contigs_by_tpm.py --assembly {1!s} --tpm {2!s} {3!s} '
-           '--out {4!s} --tpm_column_index {5!s}').format(
-           statics.PATH_UTIL, assembly_path, tpm_threshold, quants, trgs[0],
-           tpm_column_index)
     name = 'filt_{0!s}_{1!s}tpm'.format(assembly_name, tpm_threshold)
     out, err = os.devnull, os.devnull
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return PythonTask('{0!s}/filter_contigs_by_tpm.py'.format(statics.PATH_UTIL), args=(assembly_path, quant_file_list, float(tpm_threshold), trgs[0], int(tpm_column_index)), dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
@@ -1,4 +1,4 @@
-from tasks_v2 import Task
+from tasks_v2 import Task, PythonTask
 import os
 from functions_general import tool_path_check, gen_logs
 from external_tools import TOOLS_DICT
@@ -19,7 +19,7 @@ def cegma_task(opc, out_dir, assembly, cpu_cap, tasks):
           assembly, assembly_name, out_dir, cpu_cap)
     name = 'cegma'
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, cpu=cpu_cap, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, cpu=cpu_cap, stdout=out, stderr=err, mem=4)
 
 
 def busco_task(opc, dbs, assembly_path, assembly_name, out_dir, reference_name, cpu_cap, tasks):
@@ -34,11 +34,13 @@ def busco_task(opc, dbs, assembly_path, assembly_name, out_dir, reference_name,
     cmd = ('cd {0!s}; python {1!s} '
            '-o busco_{3!s}_{2!s} -i {4!s} -l {5!s}/{2!s}_odb9 -m '
            'tran -f -c {6!s}').format(
-           out_dir, tool_path_check(TOOLS_DICT['busco'].full_exe[0]),
-           reference_name, assembly_name, assembly_path, busco_db.call_path, cpu_cap)
+           Task.WORK_DIR, tool_path_check(TOOLS_DICT['busco'].full_exe[0]),
+           reference_name, assembly_name, assembly_path, busco_db.call_path, Task.THREADS)
+    # busco -r continues from the checkpoint in its run_ directory
+    resume = cmd.replace(' -f ', ' -r ')
     name = 'busco_' + reference_name + '_' + assembly_name
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, cpu=cpu_cap, stdout=out, stderr=err)
+    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, cpu=cpu_cap, min_cpu=1, stdout=out, stderr=err, mem=4, resume_command=resume, work_dir=out_dir, scratch=5)
 
 
 def transrate_dep_generator(reads_dir, transrate_task, lefts, rights, reference, assembly_path, cpu_cap, transrate_dir, other_dependencies):
@@ -94,7 +96,7 @@ def transrate_task(opc, reads_dir, assembly_path, assembly_name,lefts, rights, o
     out, err = gen_logs(opc.path_logs, name)
     temp_task = Task(
         command=cmd, dependencies=[], targets=trgs, name=name,
-        cpu=cpu_cap, stdout=out, stderr=err, max_wall_time=7200000)
+        cpu=cpu_cap, stdout=out, stderr=err, max_wall_time=7200000, mem=8)
     deps = transrate_dep_generator(
         reads_dir, temp_task, orig_lefts, orig_rights, reference,
         assembly_path, cpu_cap, transrate_dir, tasks)
@@ -108,21 +110,14 @@ def assembly_stats_task(opc, out_dir, assembly, tasks):
             tasks - a list of tasks that this task is dependant on (trinity_task)
     '''
     trgs = ['{0!s}/assembly_stats.json'.format(out_dir)]
-    cmd = 'python {0!s}/assembly_stats.py {1!s} > {2!s}'.format(
-          statics.PATH_UTIL, assembly, trgs[0])
     name = 'assembly_stats_' + os.path.basename(assembly)
     out, err = gen_logs(opc.path_logs, name)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return PythonTask('{0!s}/assembly_stats.py'.format(statics.PATH_UTIL), args=(assembly, trgs[0]), dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err, mem=1, priority=Task.PRIORITY_BACKGROUND)
 
 
 def filter_task(assembly_path, assembly_name, out_dir, quant_file_list, tpm_threshold, tpm_column_index, tasks, log_flag=True, opc=None):
     # TPM column index: transrate uses older salmon; use index =2. Newer salmon: index=3
     trgs = ['{0!s}/{1!s}_{2!s}tpm.fasta'.format(out_dir, assembly_name, tpm_threshold)]
-    quants = ''.join(' --quant_files ' + x for x in quant_file_list)
-    cmd = ('python {0!s}/filter_contigs_by_tpm.py --assembly {1!s} --tpm {2!s} {3!s} '
-           '--out {4!s} --tpm_column_index {5!s}').format(
-           statics.PATH_UTIL, assembly_path, tpm_threshold, quants,
-           trgs[0], tpm_column_index)
     name = 'filt_{0!s}_{1!s}tpm'.format(assembly_name, tpm_threshold)
     out, err = gen_logs(opc.path_logs, name) if(log_flag) else (None, None)
-    return Task(command=cmd, dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
+    return PythonTask('{0!s}/filter_contigs_by_tpm.py'.format(statics.PATH_UTIL), args=(assembly_path, quant_file_list, float(tpm_threshold), trgs[0], int(tpm_column_index)), dependencies=tasks, targets=trgs, name=name, stdout=out, stderr=err)
@@ -50,6 +50,9 @@ PATH_SWISS_ENZYME = join(PATH_DATABASES, 'swiss_enzyme.list')
 PATH_ENZYME_PATHWAY = join(PATH_DATABASES, 'enzyme_pathway.list')
 PATH_ORTHOLOGY_PATHWAY = join(PATH_DATABASES, 'orthology_pathway.list')
 
+''' resource variables: names of consumable resources declared by tasks '''
+RESOURCE_IO = 'io'  # slots for tasks that stream whole read sets or indexes through disk
+
 
 ''' url variables '''
 #URL_BUSCO_BACTERIA = 'http://busco.ezlab.org/files/bacteria_buscos.tar.gz'
@@ -108,6 +111,9 @@ class Output_Path_Vars:
             self.path_pep               : path to transdecoder pep file
             self.path_annot_table       : path to annotation table
             self.path_history           : path to history.json
+            self.path_manifest          : path to manifest.json
+            self.path_run_log           : path to run.log
+            self.path_journal           : path to run.journal
         '''
         self.assembly_name = basename
         self.path_dir = join(out_dir, basename)
@@ -124,6 +130,9 @@ class Output_Path_Vars:
         self.path_pep = join(self.path_transdecoder_dir, basename + '.fasta.transdecoder.pep')
         self.path_annot_table = join(self.path_dir, basename + '_annotation.txt')
         self.path_history = join(self.path_logs, 'history.json')
+        self.path_manifest = join(self.path_logs, 'manifest.json')
+        self.path_run_log = join(self.path_dir, 'run.log')
+        self.path_journal = join(self.path_dir, 'run.journal')
 
     def build(self):
         dirs = [self.path_dir, self.path_assembly_files, self.path_quality_files,
@@ -215,9 +215,11 @@ def get_history(history):
                     if(d_date > task_info[task_name]['date']):
                         wall_time = t['stop'] - t['start']
                         task_info[task_name] = {'wall_time': wall_time,
-                                                'date': d_date}
+                                                'date': d_date,
+                                                'usage': t.get('usage', {})}
                 else:
                     wall_time = t['stop'] - t['start']
                     task_info[task_name] = {'wall_time': wall_time,
-                                            'date': d_date}
+                                            'date': d_date,
+                                            'usage': t.get('usage', {})}
     return task_info
@@ -10,7 +10,7 @@ import time
 def gen_quality_supervisor(opc, dbs, transrate_fq1, transrate_fq2, dependency_set, busco_refs, assembly_name, assembly_path, out_dir, transrate_dir, reads_dir, filter_dir, cp_transrate=True, cpu=12, cegma_flag=False, transrate_ref=''):
     tasks = []
     for busco_ref in busco_refs:
-        tasks.append(fq.busco_task(opc, dbs, assembly_path, assembly_name, out_dir, busco_ref, int(cpu/2), []))
+        tasks.append(fq.busco_task(opc, dbs, assembly_path, assembly_name, out_dir, busco_ref, cpu, []))
     assembly_stats = fq.assembly_stats_task(opc, out_dir,assembly_path, [])
     if transrate_fq1 == None:
         transrate_fq1 = []
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import subprocess
+
+from task_manifest import hash_file
+
+
+def link_or_copy(source, target):
+    ''' Materializes the file source at target, by hardlink if possible,
+        then by reflink (cp --reflink=auto) and finally by plain copy.
+    '''
+    try:
+        os.link(source, target)
+        return
+    except OSError:
+        pass
+    try:
+        subprocess.check_call(['cp', '--reflink=auto', '-p', source, target])
+        return
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    shutil.copy2(source, target)
+
+
+def link_tree(source, target):
+    ''' link_or_copy for a file or a whole directory tree.
+    '''
+    if(os.path.isdir(source)):
+        os.makedirs(target)
+        for f in sorted(os.listdir(source)):
+            link_tree(os.path.join(source, f), os.path.join(target, f))
+    else:
+        link_or_copy(source, target)
+
+
+def tree_size(path):
+    if(os.path.isfile(path)):
+        return os.path.getsize(path)
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            total += os.path.getsize(os.path.join(root, f))
+    return total
+
+
+class TaskCache:
+    ''' A content addressable store of Task targets shared between runs and
+        output directories. An entry is keyed by the task's normalized
+        command together with the sha1 of every input it reads, so the same
+        step on the same data is only ever executed once. Targets are stored
+        and materialized by hardlink where the filesystem allows it, so tools
+        must not modify their targets in place once written. The cache is
+        trimmed back to max_size by evicting the least recently used entries.
+        Layout:
+            root/<key>/meta.json  - target names and size of the entry
+            root/<key>/<i>        - the ith target of the task
+    '''
+
+    def __init__(self, root, max_size=float('inf')):
+        ''' root -
+                the directory holding the cache. It is created if needed.
+            max_size -
+                the size, in bytes, the cache is trimmed back to after
+                every store. Default = float('inf')
+        '''
+        self.root = root
+        self.max_size = max_size
+        self.hashes = {}
+        if(not os.path.isdir(root)):
+            os.makedirs(root)
+
+    def __hashInput__(self, path):
+        ''' Helper that returns the content hash of an input, memoized on
+            its size and modification time so shared inputs are read once.
+        '''
+        if(os.path.isdir(path)):
+            h = hashlib.sha1()
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for f in sorted(files):
+                    full = os.path.join(root, f)
+                    h.update(os.path.relpath(full, path).encode('utf-8'))
+                    h.update(self.__hashInput__(full).encode('utf-8'))
+            return h.hexdigest()
+        if(not os.path.isfile(path)):
+            return 'missing'
+        st = os.stat(path)
+        memo = (path, st.st_size, st.st_mtime)
+        if(memo not in self.hashes):
+            self.hashes[memo] = hash_file(path)
+        return self.hashes[memo]
+
+    def normalize(self, task, inputs):
+        ''' Returns task.command_template with the input paths, target
+            paths and target directories replaced by placeholders, so the
+            same step run from another output directory produces the same
+            string.
+        '''
+        subs = []
+        for i, p in enumerate(inputs):
+            subs.append((p, '<input_{0!s}>'.format(i)))
+        for i, p in enumerate(task.targets):
+            subs.append((p, '<target_{0!s}>'.format(i)))
+        for i, p in enumerate(task.targets):
+            d = os.path.dirname(p)
+            if(d not in ('', '/')):
+                subs.append((d, '<target_dir_{0!s}>'.format(i)))
+        subs.sort(key=lambda s: -len(s[0]))
+        command = task.command_template
+        for path, placeholder in subs:
+            command = command.replace(path, placeholder)
+        return command
+
+    def key(self, task, inputs):
+        ''' Returns the cache key of task given the paths it reads.
+        '''
+        h = hashlib.sha1()
+        h.update(self.normalize(task, inputs).encode('utf-8'))
+        for p in inputs:
+            h.update(self.__hashInput__(p).encode('utf-8'))
+        h.update(str(len(task.targets)).encode('utf-8'))
+        return h.hexdigest()
+
+    def fetch(self, key, targets):
+        ''' Materializes the entry key at the paths in targets. Returns True
+            on a hit, False if there is no complete entry for key.
+        '''
+        entry = os.path.join(self.root, key)
+        meta = os.path.join(entry, 'meta.json')
+        if(not os.path.isfile(meta)):
+            return False
+        with open(meta) as f:
+            if(json.load(f)['count'] != len(targets)):
+                return False
+        for i, t in enumerate(targets):
+            if(os.path.isdir(t)):
+                shutil.rmtree(t)
+            elif(os.path.exists(t)):
+                os.remove(t)
+            if(os.path.dirname(t) != '' and not os.path.isdir(os.path.dirname(t))):
+                os.makedirs(os.path.dirname(t))
+            link_tree(os.path.join(entry, str(i)), t)
+        now = time.time()
+        os.utime(entry, (now, now))
+        return True
+
+    def store(self, key, targets):
+        ''' Adds the targets of a finished task under key, then evicts least
+            recently used entries until the cache fits in max_size. The entry
+            is built in a temporary directory and renamed into place, so
+            concurrent runs never see half written entries.
+        '''
+        entry = os.path.join(self.root, key)
+        if(os.path.isdir(entry)):
+            return
+        temp = '{0!s}.{1!s}.tmp'.format(entry, os.getpid())
+        if(os.path.exists(temp)):
+            shutil.rmtree(temp)
+        os.makedirs(temp)
+        for i, t in enumerate(targets):
+            link_tree(t, os.path.join(temp, str(i)))
+        size = sum(tree_size(t) for t in targets)
+        with open(os.path.join(temp, 'meta.json'), 'w') as f:
+            json.dump({'count': len(targets), 'size': size, 'targets': targets}, f)
+        try:
+            os.rename(temp, entry)
+        except OSError:
+            # another run stored the same entry first
+            shutil.rmtree(temp)
+        self.evict()
+
+    def evict(self):
+        ''' Removes least recently used entries until the cache fits in
+            max_size.
+        '''
+        entries = []
+        total = 0
+        for key in os.listdir(self.root):
+            meta = os.path.join(self.root, key, 'meta.json')
+            if(key.endswith('.tmp') or not os.path.isfile(meta)):
+                continue
+            with open(meta) as f:
+                size = json.load(f)['size']
+            entries.append((os.path.getmtime(os.path.join(self.root, key)), size, key))
+            total += size
+        entries.sort()
+        for used, size, key in entries:
+            if(total <= self.max_size):
+                break
+            shutil.rmtree(os.path.join(self.root, key))
+            total -= size
@@ -0,0 +1,635 @@
+import os
+import sys
+import json
+import errno
+import time
+import atexit
+import binascii
+import signal
+import socket
+import platform
+import traceback
+import subprocess
+import multiprocessing
+try:
+    import ctypes
+except ImportError:
+    ctypes = None
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+
+# priority classes, a nice increment and an ionice class and level. The
+# best effort class has levels 0 (highest) to 7, the idle class only gets
+# the disk when nothing else wants it.
+IOPRIO_CLASS_BE = 2
+IOPRIO_CLASS_IDLE = 3
+PRIORITIES = {'normal': (0, None, None),
+              'background': (10, IOPRIO_CLASS_BE, 7),
+              'idle': (19, IOPRIO_CLASS_IDLE, 0)}
+
+# ioprio_set has no libc wrapper, it is called by syscall number
+IOPRIO_SYSCALLS = {'x86_64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'armv7l': 314,
+                   'ppc64': 273, 'ppc64le': 273, 's390x': 282}
+LIBC = None
+if(ctypes is not None and platform.system() == 'Linux' and platform.machine() in IOPRIO_SYSCALLS):
+    try:
+        LIBC = ctypes.CDLL(None, use_errno=True)
+    except OSError:
+        LIBC = None
+
+
+class Executor:
+    ''' Interface between a Task and the machine that runs its command.
+        Task.start() hands itself to Executor.submit(), which must return a
+        handle behaving like the subset of subprocess.Popen used by Task:
+            poll() -
+                returns the exit code once the command has exited, else None.
+            returncode -
+                the exit code, or None while the command is running.
+            kill() -
+                stops the command.
+            pid -
+                the local process id, or None if the command doesn't run as
+                a child of this process.
+        A handle may also have a fileno() that becomes readable when the
+        command exits, which lets a ChildWatcher wake up for it, a usage
+        dict (see tasks_v2.rusage_delta) filled in once it has exited, a
+        terminate() that asks the command to stop without waiting for it,
+        and a members() listing the processes it still has running.
+        Targets, logs and inputs are expected to be on paths shared by every
+        host, so a Supervisor behaves the same whatever runs its tasks.
+    '''
+
+    def submit(self, task):
+        raise NotImplementedError()
+
+
+def group_members(pgid):
+    ''' Returns the pids of the live processes in the process group pgid,
+        read from /proc. Where /proc is unavailable, returns [pgid] if any
+        process is left in the group and [] otherwise.
+    '''
+    if(not os.path.isdir('/proc')):
+        try:
+            os.killpg(pgid, 0)
+        except OSError as inst:
+            if(inst.errno == errno.ESRCH):
+                return []
+        return [pgid]
+    members = []
+    for p in os.listdir('/proc'):
+        if(not p.isdigit()):
+            continue
+        try:
+            with open('/proc/{0!s}/stat'.format(p)) as f:
+                stat = f.read()
+        except (IOError, OSError):
+            continue
+        # the command name may contain spaces, fields after it are fixed
+        fields = stat[stat.rfind(')') + 2:].split()
+        if(int(fields[2]) == pgid and fields[0] != 'Z'):
+            members.append(int(p))
+    return sorted(members)
+
+
+def set_priority(priority):
+    ''' Lowers the cpu and io priority of this process to the class
+        priority, a key of PRIORITIES. The nice value is an increment on the
+        current one. The io class is only set on linux, and is ignored by io
+        schedulers without priorities (none, mq-deadline). Processes started
+        afterwards inherit both.
+    '''
+    nice, io_class, io_level = PRIORITIES[priority]
+    if(nice > 0):
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+    if(io_class is not None and LIBC is not None):
+        # IOPRIO_WHO_PROCESS, 0 for the calling process
+        LIBC.syscall(IOPRIO_SYSCALLS[platform.machine()], 1, 0, (io_class << 13) | io_level)
+
+
+def which(name):
+    ''' Returns the path of the executable name on PATH, or None.
+    '''
+    for d in os.environ.get('PATH', os.defpath).split(os.pathsep):
+        path = os.path.join(d, name)
+        if(os.path.isfile(path) and os.access(path, os.X_OK)):
+            return path
+    return None
+
+
+def confine(command, cores=None, cgroup=None, priority=None):
+    ''' Returns the shell command command wrapped so that its shell moves
+        itself into the cgroup directory cgroup, then execs a shell pinned
+        to the list of core ids cores (taskset) at the priority class
+        priority (nice, ionice, see PRIORITIES) to run command. Each is
+        skipped if it isn't given or its tool isn't installed. exec keeps
+        the pid Popen returned and children inherit all three, so the whole
+        command stays inside them. Nothing runs in the child between fork
+        and exec, which isn't safe in a process with threads.
+    '''
+    wrap = []
+    if(priority is not None):
+        nice, io_class, io_level = PRIORITIES[priority]
+        if(nice > 0 and which('nice') is not None):
+            wrap.append('nice -n {0!s}'.format(nice))
+        if(io_class is not None and which('ionice') is not None):
+            level = '' if(io_class == IOPRIO_CLASS_IDLE) else ' -n {0!s}'.format(io_level)
+            wrap.append('ionice -t -c {0!s}{1!s}'.format(io_class, level))
+    if(cores is not None and which('taskset') is not None):
+        wrap.append('taskset -c {0!s}'.format(','.join(str(c) for c in sorted(cores))))
+    if(wrap != []):
+        command = 'exec {0!s} /bin/sh -c {1!s}'.format(' '.join(wrap), quote(command))
+    if(cgroup is not None):
+        command = 'echo $$ 2>/dev/null > {0!s}; {1!s}'.format(
+            quote(os.path.join(cgroup, 'cgroup.procs')), command)
+    return command
+
+
+class GroupProcess(subprocess.Popen):
+    ''' subprocess.Popen for a shell command that starts it in a session of
+        its own, so the shell and every process it starts (pipelines, java,
+        tools that fork workers) form one process group that can be
+        signalled and accounted for as a whole. The cores, cgroup and
+        priority keyword arguments confine the group to a set of cores, a
+        cgroup and a priority class (see confine).
+    '''
+
+    # seconds given to the group to exit on SIGTERM before it is SIGKILLed
+    GRACE = 5
+
+    def __init__(self, command, cores=None, cgroup=None, priority=None, **kwargs):
+        if(sys.version_info[0] >= 3):
+            kwargs['start_new_session'] = True
+        elif(hasattr(os, 'setsid')):
+            # python 2 has no start_new_session, setsid is a single syscall
+            kwargs['preexec_fn'] = os.setsid
+        kwargs['shell'] = True
+        subprocess.Popen.__init__(self, confine(command, cores, cgroup, priority), **kwargs)
+
+    def signal(self, sig):
+        ''' Sends sig to every process in the group.
+        '''
+        try:
+            os.killpg(self.pid, sig)
+        except OSError:
+            pass
+
+    def members(self):
+        ''' Returns the pids of the processes of the group still alive. Once
+            the command has exited these are orphans it left behind.
+        '''
+        self.poll()
+        return group_members(self.pid)
+
+    def terminate(self):
+        self.signal(signal.SIGTERM)
+
+    def kill(self, grace=None):
+        ''' Stops the whole group: SIGTERM first, then SIGKILL for whatever
+            is still running after grace seconds. Default = GroupProcess.GRACE
+        '''
+        grace = GroupProcess.GRACE if(grace is None) else grace
+        self.signal(signal.SIGTERM)
+        end = time.time() + grace
+        while(self.members() != [] and time.time() < end):
+            time.sleep(0.05)
+        if(self.members() != []):
+            self.signal(signal.SIGKILL)
+            end = time.time() + 1
+            while(self.poll() is None and time.time() < end):
+                time.sleep(0.01)
+
+
+class LocalExecutor(Executor):
+    ''' Runs commands as children of this process with
+        subprocess.Popen(shell=True), each in a process group of its own
+        (see GroupProcess). This is the default executor.
+    '''
+
+    def submit(self, task):
+        out, err = task.open_logs()
+        return GroupProcess(task.command, stdout=out, stderr=err,
+                            env=task.environment(), cores=task.cores, cgroup=task.cgroup,
+                            priority=task.priority)
+
+
+class BatchJob:
+    ''' Handle for a command submitted to a batch scheduler by BatchExecutor.
+        The job script writes the exit code of the command to exit_path, so
+        polling only needs the shared filesystem.
+    '''
+
+    def __init__(self, job_id, exit_path, cancel):
+        self.job_id = job_id
+        self.exit_path = exit_path
+        self.cancel = cancel
+        self.returncode = None
+        self.pid = None
+        self.usage = {}
+
+    def poll(self):
+        if(self.returncode is None and os.path.isfile(self.exit_path)):
+            with open(self.exit_path) as f:
+                self.returncode = int(f.read().strip() or 1)
+        return self.returncode
+
+    def kill(self):
+        if(self.returncode is None):
+            subprocess.call(self.cancel.format(job_id=self.job_id), shell=True)
+            self.returncode = -9
+
+
+class BatchExecutor(Executor):
+    ''' Submits every command as a job script to an sbatch/qsub style batch
+        scheduler. The submit and cancel command templates are formatted
+        with the keys script, name, cpu, mem (gigabytes, at least 1) and
+        job_id; the job id is taken to be the last word printed by the submit
+        command. Presets are kept in BatchExecutor.SLURM, BatchExecutor.SGE
+        and BatchExecutor.PBS. A job that dies without running its script to
+        the end (killed by the scheduler, node failure) never reports an exit
+        code, so tasks run this way should set max_wall_time.
+    '''
+
+    SLURM = {'submit': 'sbatch --parsable -J {name} -c {cpu} --mem={mem}G -o /dev/null {script}',
+             'cancel': 'scancel {job_id}'}
+    SGE = {'submit': 'qsub -terse -cwd -N {name} -pe smp {cpu} -l h_vmem={mem}G -o /dev/null '
+                     '-j y {script}',
+           'cancel': 'qdel {job_id}'}
+    PBS = {'submit': 'qsub -N {name} -l nodes=1:ppn={cpu},mem={mem}gb -o /dev/null -j oe '
+                     '{script}',
+           'cancel': 'qdel {job_id}'}
+
+    def __init__(self, job_dir, submit=SLURM['submit'], cancel=SLURM['cancel']):
+        ''' job_dir -
+                a directory on a shared path where job scripts and exit code
+                files are written.
+            submit -
+                the submit command template. Default = BatchExecutor.SLURM
+            cancel -
+                the cancel command template. Default = BatchExecutor.SLURM
+        '''
+        self.job_dir = job_dir
+        self.submit_cmd = submit
+        self.cancel_cmd = cancel
+        if(not os.path.isdir(job_dir)):
+            os.makedirs(job_dir)
+
+    def submit(self, task):
+        task.open_logs()
+        task.close_files()
+        script = os.path.join(self.job_dir, '{0!s}.{1!s}.sh'.format(task.name, int(time.time())))
+        exit_path = script + '.exit'
+        redirect = ''
+        if(task.stdout is not None):
+            redirect += ' >> ' + task.stdout
+        if(task.stderr is not None):
+            redirect += ' 2>> ' + task.stderr
+        with open(script, 'w') as f:
+            f.write('#!/bin/sh\n')
+            f.write('cd {0!s}\n'.format(os.getcwd()))
+            f.write('(\n{0!s}\n){1!s}\n'.format(task.command, redirect))
+            f.write('echo $? > {0!s}.tmp; mv {0!s}.tmp {0!s}\n'.format(exit_path))
+        os.chmod(script, 0o755)
+        cmd = self.submit_cmd.format(script=script, name=task.name, cpu=task.cpu,
+                                     mem=max(1, int(task.mem + 0.999)))
+        output = subprocess.check_output(cmd, shell=True).decode('utf-8').split()
+        if(output == []):
+            raise Exception('Unable to submit {0!s}, "{1!s}" printed no job id.'.format(
+                task.name, cmd))
+        return BatchJob(output[-1].split(';')[0], exit_path, self.cancel_cmd)
+
+
+class WorkerJob:
+    ''' Handle for a command running on a task_worker.py process. The
+        connection stays open while the command runs, the worker sends one
+        json line with the exit code and usage once it exits, and closing or
+        writing "kill" to the connection stops the command.
+    '''
+
+    def __init__(self, sock, release):
+        self.sock = sock
+        self.release = release
+        self.buffer = b''
+        self.returncode = None
+        self.pid = None
+        self.usage = {}
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def poll(self):
+        if(self.returncode is not None):
+            return self.returncode
+        self.sock.setblocking(False)
+        try:
+            data = self.sock.recv(65536)
+        except socket.error:
+            return None
+        if(data):
+            self.buffer += data
+            if(not self.buffer.endswith(b'\n')):
+                return None
+            result = json.loads(self.buffer.decode('utf-8'))
+            self.returncode = result['returncode']
+            self.usage = result.get('usage', {})
+        else:
+            # the worker went away before reporting an exit code
+            self.returncode = -1
+        self.__close__()
+        return self.returncode
+
+    def kill(self):
+        if(self.returncode is None):
+            try:
+                self.sock.sendall(b'kill\n')
+            except socket.error:
+                pass
+            self.returncode = -9
+            self.__close__()
+
+    def __close__(self):
+        self.sock.close()
+        self.release()
+
+
+# environment variable holding the secret shared by a SocketExecutor and
+# its workers, which run whatever command comes with it
+SECRET_ENV = 'MMT_WORKER_SECRET'
+
+
+def worker_secret(path=None):
+    ''' Returns the secret shared with task_worker.py processes, read from
+        the file path if it is given, else from the MMT_WORKER_SECRET
+        environment variable. None if neither is set.
+    '''
+    if(path is not None):
+        with open(path) as f:
+            secret = f.read().strip()
+    else:
+        secret = os.environ.get(SECRET_ENV, '').strip()
+    return secret if(secret != '') else None
+
+
+class SocketExecutor(Executor):
+    ''' Runs commands on task_worker.py processes reached over TCP. Each
+        command is sent to the worker with the least cpu in use, along with
+        the secret the workers were started with. Workers on the same host
+        can stand in for a cluster, see spawn_local_workers().
+    '''
+
+    def __init__(self, workers, secret=None):
+        ''' workers -
+                a list of (host, port) pairs, one for each running worker.
+            secret -
+                the secret shared with the workers. Default = worker_secret()
+        '''
+        self.workers = [tuple(w) for w in workers]
+        self.load = {w: 0 for w in self.workers}
+        self.secret = worker_secret() if(secret is None) else secret
+        if(self.secret is None):
+            raise Exception('Workers only run commands sent with their secret, set {0!s}.'.format(SECRET_ENV))
+
+    def submit(self, task):
+        task.open_logs()
+        task.close_files()
+        worker = min(self.workers, key=lambda w: self.load[w])
+        sock = socket.create_connection(worker)
+        request = {'secret': self.secret, 'command': task.command, 'cwd': os.getcwd(), 'name': task.name,
+                   'stdout': task.stdout, 'stderr': task.stderr, 'priority': task.priority}
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        self.load[worker] += task.cpu
+
+        def release():
+            self.load[worker] -= task.cpu
+        return WorkerJob(sock, release)
+
+
+def spawn_local_workers(count, host='127.0.0.1', secret=None):
+    ''' Starts count task_worker.py processes on this host, each listening on
+        a free port. Returns (processes, addresses, secret), addresses and
+        secret being ready to pass to SocketExecutor. The secret defaults to
+        worker_secret(), or a random one if that isn't set. The caller
+        should kill the processes when done with them.
+    '''
+    worker = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'task_worker.py')
+    if(secret is None):
+        secret = worker_secret()
+    if(secret is None):
+        secret = binascii.hexlify(os.urandom(16)).decode('ascii')
+    env = dict(os.environ)
+    env[SECRET_ENV] = secret
+    processes = []
+    addresses = []
+    for i in range(count):
+        p = subprocess.Popen([sys.executable, worker, '--host', host, '--port', '0'],
+                             stdout=subprocess.PIPE, env=env)
+        port = int(p.stdout.readline().decode('utf-8').split()[-1])
+        processes.append(p)
+        addresses.append((host, port))
+    return processes, addresses, secret
+
+
+def run_call(request):
+    ''' Runs one PythonTask call inside a PythonExecutor worker and returns
+        (returncode, usage). The task's logs take over file descriptors 1
+        and 2, and the working directory is changed, only for the length of
+        the call. The module is imported from the directory of its path, and
+        stays imported for the calls that follow. The call's return value is
+        its exit code if it is an int, 0 otherwise. sys.exit() is honoured,
+        and any other exception is printed to stderr and exits with 1.
+    '''
+    from tasks_v2 import rusage_delta
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    saved = []
+    for fd, path in ((1, request['stdout']), (2, request['stderr'])):
+        if(path is not None):
+            (sys.stdout if(fd == 1) else sys.stderr).flush()
+            saved.append((fd, os.dup(fd)))
+            log = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+            os.dup2(log, fd)
+            os.close(log)
+    cwd = os.getcwd()
+    before = resource.getrusage(resource.RUSAGE_SELF) if(resource is not None) else None
+    try:
+        if(not os.path.isdir(request['cwd'])):
+            os.makedirs(request['cwd'])
+        os.chdir(request['cwd'])
+        directory, module = os.path.split(os.path.splitext(os.path.abspath(request['path']))[0])
+        if(directory not in sys.path):
+            sys.path.insert(0, directory)
+        function = getattr(__import__(module), request['function'])
+        result = function(*request['args'], **request['kwargs'])
+        returncode = result if(isinstance(result, int) and not isinstance(result, bool)) else 0
+    except SystemExit as inst:
+        if(inst.code is None or isinstance(inst.code, int)):
+            returncode = inst.code or 0
+        else:
+            sys.stderr.write('{0!s}\n'.format(inst.code))
+            returncode = 1
+    except BaseException:
+        traceback.print_exc()
+        returncode = 1
+    after = resource.getrusage(resource.RUSAGE_SELF) if(resource is not None) else None
+    os.chdir(cwd)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    for fd, copy in saved:
+        os.dup2(copy, fd)
+        os.close(copy)
+    return returncode, rusage_delta(before, after)
+
+
+def python_worker(conn, priority=None):
+    ''' Main loop of a PythonExecutor worker. Runs the calls received on
+        conn one at a time, at the priority class priority, until it
+        receives None.
+    '''
+    # forked from a Supervisor or its forkserver, undo their signal handling
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if(hasattr(signal, 'SIGCHLD')):
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    try:
+        signal.set_wakeup_fd(-1)
+    except (AttributeError, ValueError):
+        pass
+    if(priority is not None):
+        set_priority(priority)
+    while(True):
+        try:
+            request = conn.recv()
+        except (EOFError, IOError, OSError):
+            break
+        if(request is None):
+            break
+        conn.send(run_call(request))
+    conn.close()
+
+
+class PythonJob:
+    ''' Handle for a PythonTask call running on a PythonExecutor worker.
+        The worker sends back (returncode, usage) once the call returns, and
+        is given back to the executor. Killing the job terminates the worker.
+    '''
+
+    def __init__(self, worker, conn, release):
+        self.worker = worker
+        self.conn = conn
+        self.release = release
+        self.returncode = None
+        self.pid = worker.pid
+        self.usage = {}
+
+    def fileno(self):
+        return self.conn.fileno()
+
+    def poll(self):
+        if(self.returncode is not None or not self.conn.poll()):
+            return self.returncode
+        try:
+            self.returncode, self.usage = self.conn.recv()
+            self.release(self.worker, self.conn)
+        except (EOFError, IOError, OSError):
+            # the worker died before reporting an exit code
+            self.returncode = -1
+            self.__discard__()
+        return self.returncode
+
+    def kill(self):
+        if(self.returncode is None):
+            self.worker.terminate()
+            self.returncode = -9
+            self.__discard__()
+
+    def __discard__(self):
+        self.worker.join()
+        self.conn.close()
+
+
+# a worker runs python, not an exec'd tool, so forking one from a
+# Supervisor whose StatusServer thread may hold a lock would leave it
+# holding that lock forever. On python 3 workers are forked from a
+# forkserver instead, a process started before there were any threads.
+# Python 2 has no contexts and still forks them from the Supervisor.
+if(hasattr(multiprocessing, 'get_context')):
+    try:
+        WORKER_CONTEXT = multiprocessing.get_context('forkserver')
+    except ValueError:
+        WORKER_CONTEXT = multiprocessing.get_context('spawn')
+else:
+    WORKER_CONTEXT = multiprocessing
+
+
+class PythonExecutor(Executor):
+    ''' Runs PythonTask calls in long lived worker processes, so steps
+        written in python pay for the interpreter start up and their imports
+        once per run rather than once per task. A worker runs one call at a
+        time; idle workers are reused and new ones are started when all are
+        busy, so the Supervisor's cpu accounting bounds how many exist.
+        A priority can't be raised back once lowered, so calls with a
+        priority class run on workers of their own, kept idle per class.
+        Workers are stopped by close(), or when this process exits.
+    '''
+
+    def __init__(self):
+        self.idle = {}
+        self.workers = []
+        self.registered = False
+
+    def __spawn__(self, priority):
+        self.workers = [w for w in self.workers if(w.is_alive())]
+        conn, child_conn = WORKER_CONTEXT.Pipe()
+        worker = WORKER_CONTEXT.Process(target=python_worker, args=(child_conn, priority))
+        worker.start()
+        child_conn.close()
+        if(not self.registered):
+            # after multiprocessing's own exit handler, which joins workers,
+            # has been registered, so this one runs first
+            atexit.register(self.close)
+            self.registered = True
+        self.workers.append(worker)
+        return worker, conn
+
+    def submit(self, task):
+        task.open_logs()
+        task.close_files()
+        idle = self.idle.setdefault(task.priority, [])
+        worker, conn = idle.pop() if(idle) else self.__spawn__(task.priority)
+        path, function, args, kwargs = task.call
+        request = {'path': path, 'function': function, 'args': args, 'kwargs': kwargs,
+                   'cwd': task.cwd if(task.cwd is not None) else os.getcwd(),
+                   'stdout': task.stdout, 'stderr': task.stderr}
+        conn.send(request)
+
+        def release(worker, conn):
+            idle.append((worker, conn))
+        return PythonJob(worker, conn, release)
+
+    def close(self):
+        ''' Stops the idle workers and terminates those still running a call.
+        '''
+        idle = []
+        for worker, conn in [w for workers in self.idle.values() for w in workers]:
+            idle.append(worker)
+            try:
+                conn.send(None)
+            except (IOError, OSError):
+                pass
+            conn.close()
+        self.idle = {}
+        for worker in self.workers:
+            if(worker in idle):
+                worker.join(5)
+            if(worker.is_alive()):
+                worker.terminate()
+            worker.join()
+        self.workers = []
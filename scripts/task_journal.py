@@ -0,0 +1,96 @@
+import os
+import json
+import time
+
+from task_manifest import fingerprint
+
+
+class TaskJournal:
+    ''' Append-only log of the state transitions of the tasks run by a
+        Supervisor, kept next to its run log. Every transition is written as
+        one json line and synced to disk before the Supervisor moves on, so a
+        crash or a kill loses at most the line being written. Lines of
+        finished tasks carry the fingerprints of their targets. Reading the
+        journal back replays it in a single pass, keeping the last line of
+        every task, and rewrites it with only those lines so it doesn't grow
+        from run to run. Lines that can't be parsed, a torn final line for
+        instance, are ignored.
+    '''
+
+    def __init__(self, path):
+        ''' path -
+                the path to the journal. It is created if it doesn't exist.
+        '''
+        self.path = path
+        self.records = {}
+        if(os.path.isfile(path)):
+            self.replay()
+            self.compact()
+        self.journal = open(path, 'a')
+
+    def replay(self):
+        ''' Reads the journal, keeping the last record of every task.
+        '''
+        self.records = {}
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self.records[record['task']] = record
+                except (ValueError, KeyError, TypeError):
+                    continue
+
+    def compact(self):
+        ''' Rewrites the journal with one line per task, through a temporary
+            file renamed over self.path.
+        '''
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as f:
+            for name in sorted(self.records):
+                f.write(json.dumps(self.records[name], sort_keys=True) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(temp, self.path)
+
+    def last(self, task):
+        ''' Returns the last record of task, or None.
+        '''
+        return self.records.get(task.name)
+
+    def state(self, task):
+        ''' Returns the last state recorded for task, or None.
+        '''
+        record = self.records.get(task.name)
+        return record['state'] if(record is not None) else None
+
+    def append(self, task, status, targets=False):
+        ''' Appends the transition of task to status, a Supervisor
+            task_status entry. If targets is True the fingerprints of the
+            task's targets are recorded as well.
+        '''
+        record = {'task': task.name, 'time': time.time()}
+        for key in ('state', 'start', 'stop', 'exit_code', 'message', 'usage', 'scratch'):
+            record[key] = status.get(key)
+        if(targets):
+            record['targets'] = {p: fingerprint(p) for p in task.targets}
+        self.records[task.name] = record
+        self.journal.write(json.dumps(record, sort_keys=True) + '\n')
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+    def targetsMatch(self, task):
+        ''' Returns True if the last record of task fingerprints exactly its
+            current targets, and every one of them is unchanged.
+        '''
+        record = self.records.get(task.name)
+        if(record is None or 'targets' not in record or task.targets == []):
+            return False
+        if(sorted(record['targets']) != sorted(task.targets)):
+            return False
+        for p in task.targets:
+            if(record['targets'][p] is None or record['targets'][p] != fingerprint(p)):
+                return False
+        return True
+
+    def close(self):
+        self.journal.close()
@@ -0,0 +1,197 @@
+import os
+import re
+import math
+
+from task_executors import which
+
+
+def find_cgroup2():
+    ''' Returns the directory of the cgroup v2 group this process belongs
+        to, or None if cgroup v2 isn't mounted or this isn't linux.
+    '''
+    try:
+        with open('/proc/self/cgroup') as f:
+            lines = f.read().splitlines()
+        with open('/proc/self/mountinfo') as f:
+            mounts = f.read().splitlines()
+    except (IOError, OSError):
+        return None
+    own = [l[3:] for l in lines if(l.startswith('0::'))]
+    if(own == []):
+        return None
+    for m in mounts:
+        # the filesystem type follows the " - " separator
+        fields = m.split(' - ')
+        if(len(fields) == 2 and fields[1].split()[0] == 'cgroup2'):
+            mount_point = m.split()[4]
+            return os.path.join(mount_point, own[0].lstrip('/'))
+    return None
+
+
+def write_value(path, value):
+    with open(path, 'w') as f:
+        f.write(value)
+
+
+def read_keyed(path):
+    ''' Reads a flat keyed cgroup file ("key value" per line) into a dict.
+        Empty if it doesn't exist.
+    '''
+    values = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if(len(fields) == 2):
+                    values[fields[0]] = int(fields[1])
+    except (IOError, OSError, ValueError):
+        pass
+    return values
+
+
+def format_cores(cores):
+    ''' Formats a list of core ids the way taskset and cpuset do, 0-3,6.
+    '''
+    ranges = []
+    for c in sorted(cores):
+        if(ranges != [] and ranges[-1][1] == c - 1):
+            ranges[-1][1] = c
+        else:
+            ranges.append([c, c])
+    return ','.join(str(a) if(a == b) else '{0!s}-{1!s}'.format(a, b) for a, b in ranges)
+
+
+class TaskLimits:
+    ''' Object used by a Supervisor to hold the tasks it runs locally to the
+        cpu and mem they declare, rather than trusting thread flags. Every
+        task is pinned to its own set of cpu cores (with taskset, see
+        task_executors.confine), sized to its thread count, so BLAS pools,
+        the JVM and everything else that sizes itself on the visible cores
+        stay inside it. Without taskset cores are only assigned, not pinned.
+        Cores are only shared when more threads are running than there are
+        cores. The usual thread count variables (OMP_NUM_THREADS, ...) are
+        set to match. Where a cgroup v2 hierarchy with the cpu and memory
+        controllers can be written to, every task also runs in a cgroup of
+        its own with cpu.max and memory.max set from its cpu and mem.
+    '''
+
+    THREAD_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                   'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+    CPU_PERIOD = 100000
+
+    def __init__(self, cores=None, cgroups=True, cgroup_root=None):
+        ''' cores -
+                the list of core ids tasks are pinned to. Default = None (the
+                cores this process may run on)
+            cgroups -
+                If False, cgroups are never used. Default = True
+            cgroup_root -
+                a cgroup v2 directory, with the cpu and memory controllers,
+                that this user may create groups in. Default = None (the
+                cgroup of this process, which is only usable at the root of
+                a cgroup namespace, as in most containers)
+        '''
+        if(cores is None):
+            if(hasattr(os, 'sched_getaffinity')):
+                cores = sorted(os.sched_getaffinity(0))
+            else:
+                cores = list(range(os.sysconf('SC_NPROCESSORS_ONLN')))
+        self.cores = list(cores)
+        self.load = {c: 0 for c in self.cores}
+        self.pinned = {}
+        self.pin = which('taskset') is not None
+        self.use_cgroups = cgroups
+        self.cgroup_root = cgroup_root
+        self.cgroup = None
+        self.cgroups = {}
+
+    def setup(self):
+        ''' Creates the cgroup of the run, if cgroups can be used. Returns a
+            line describing the enforcement in place, for the run log.
+        '''
+        message = 'pinning tasks to cores {0!s}'.format(format_cores(self.cores))
+        if(not self.pin):
+            message = 'cores are not pinned, taskset not found'
+        if(not self.use_cgroups):
+            return message + ', cgroups disabled'
+        root = self.cgroup_root if(self.cgroup_root is not None) else find_cgroup2()
+        if(root is None):
+            return message + ', no cgroup v2 hierarchy found'
+        try:
+            with open(os.path.join(root, 'cgroup.controllers')) as f:
+                controllers = f.read().split()
+            if('cpu' not in controllers or 'memory' not in controllers):
+                return message + ', the cpu and memory controllers are unavailable in ' + root
+            write_value(os.path.join(root, 'cgroup.subtree_control'), '+cpu +memory')
+            cgroup = os.path.join(root, 'mmt_{0!s}'.format(os.getpid()))
+            if(not os.path.isdir(cgroup)):
+                os.mkdir(cgroup)
+            write_value(os.path.join(cgroup, 'cgroup.subtree_control'), '+cpu +memory')
+        except (IOError, OSError) as inst:
+            return message + ', unable to use cgroups in {0!s}: {1!s}'.format(root, inst)
+        self.cgroup = cgroup
+        return message + ', limiting cpu and memory with cgroups in ' + cgroup
+
+    def acquire(self, task):
+        ''' Chooses the cores of task, the least loaded ones, and creates its
+            cgroup. Sets task.cores and task.cgroup, and returns the number
+            of tasks already pinned to the busiest core chosen, 0 when the
+            task has its cores to itself.
+        '''
+        count = min(len(self.cores), max(1, int(math.ceil(task.cpu))))
+        chosen = sorted(self.cores, key=lambda c: (self.load[c], c))[:count]
+        shared = max(self.load[c] for c in chosen)
+        for c in chosen:
+            self.load[c] += 1
+        self.pinned[task] = chosen
+        task.cores = sorted(chosen)
+        if(self.cgroup is not None):
+            name = re.sub('[^A-Za-z0-9_.-]', '_', task.name)
+            path = os.path.join(self.cgroup, name)
+            try:
+                if(not os.path.isdir(path)):
+                    os.mkdir(path)
+                quota = int(math.ceil(task.cpu * self.CPU_PERIOD))
+                write_value(os.path.join(path, 'cpu.max'), '{0!s} {1!s}'.format(quota, self.CPU_PERIOD))
+                memory = 'max' if(task.mem <= 0) else str(int(task.mem * 2**30))
+                write_value(os.path.join(path, 'memory.max'), memory)
+                self.cgroups[task] = path
+                task.cgroup = path
+            except (IOError, OSError):
+                task.cgroup = None
+        return shared
+
+    def release(self, task):
+        ''' Frees the cores of task and removes its cgroup. Returns a dict
+            with the seconds the task was throttled by cpu.max and the number
+            of times memory.max killed one of its processes, empty if it had
+            no cgroup.
+        '''
+        for c in self.pinned.pop(task, []):
+            self.load[c] -= 1
+        task.cores = None
+        path = self.cgroups.pop(task, None)
+        task.cgroup = None
+        if(path is None):
+            return {}
+        stats = {'throttled': round(read_keyed(os.path.join(path, 'cpu.stat')).get(
+                     'throttled_usec', 0) / 1e6, 2),
+                 'oom_kills': read_keyed(os.path.join(path, 'memory.events')).get('oom_kill', 0)}
+        self.__remove__(path)
+        return stats
+
+    def __remove__(self, path):
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
+
+    def close(self):
+        ''' Removes the cgroup of the run.
+        '''
+        if(self.cgroup is not None):
+            for path in list(self.cgroups.values()):
+                self.__remove__(path)
+            self.cgroups = {}
+            self.__remove__(self.cgroup)
+            self.cgroup = None
@@ -0,0 +1,137 @@
+import os
+import json
+import stat
+import hashlib
+
+
+def fingerprint(path, content_hash=False):
+    ''' Returns a json friendly fingerprint of the file or directory at path,
+        or None if it doesn't exist. By default a file is fingerprinted by
+        its size and modification time. If content_hash is True, the sha1 of
+        its contents is used instead. A directory is fingerprinted by the
+        relative paths and fingerprints of every file below it. A named pipe,
+        the target of a stream edge, is fingerprinted as 'fifo' so it is
+        never read.
+    '''
+    if(os.path.exists(path) and stat.S_ISFIFO(os.stat(path).st_mode)):
+        return 'fifo'
+    if(os.path.isfile(path)):
+        if(content_hash):
+            return hash_file(path)
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime]
+    if(os.path.isdir(path)):
+        h = hashlib.sha1()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for f in sorted(files):
+                full = os.path.join(root, f)
+                h.update(os.path.relpath(full, path).encode('utf-8'))
+                h.update(json.dumps(fingerprint(full, content_hash)).encode('utf-8'))
+        return h.hexdigest()
+    return None
+
+
+def hash_file(path, block_size=1 << 20):
+    ''' Returns the sha1 hex digest of the contents of the file at path.
+    '''
+    h = hashlib.sha1()
+    f = open(path, 'rb')
+    block = f.read(block_size)
+    while(block):
+        h.update(block)
+        block = f.read(block_size)
+    f.close()
+    return h.hexdigest()
+
+
+def hash_command(command):
+    return hashlib.sha1(command.encode('utf-8')).hexdigest()
+
+
+class TaskManifest:
+    ''' Object that records, per task name, what each executed task looked
+        like when it finished: a hash of its command string (the template,
+        for elastic tasks, so the thread count they ran with doesn't matter)
+        and the fingerprints of its inputs and targets. A Supervisor given a
+        TaskManifest only skips a task when all three still match, so
+        swapping reads, changing parameters or touching an upstream output
+        reruns exactly the tasks it invalidates. The manifest is a json file
+        kept in the output directory and rewritten after every change.
+    '''
+
+    def __init__(self, path, content_hash=False):
+        ''' path -
+                the path to the json manifest. It is created if it doesn't
+                exist.
+            content_hash -
+                If True, files are fingerprinted by a sha1 of their contents
+                rather than their size and modification time. Slower, but
+                survives copies and touches. Default = False
+        '''
+        self.path = path
+        self.content_hash = content_hash
+        self.entries = {}
+        if(os.path.isfile(path)):
+            try:
+                with open(path) as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                self.entries = {}
+
+    def __describe__(self, task, inputs):
+        return {'command': hash_command(task.command_template),
+                'inputs': {p: fingerprint(p, self.content_hash) for p in inputs},
+                'targets': {p: fingerprint(p, self.content_hash) for p in task.targets},
+                'content_hash': self.content_hash}
+
+    def known(self, task):
+        ''' Returns True if the manifest has a record of task.
+        '''
+        return task.name in self.entries
+
+    def matches(self, task, inputs):
+        ''' Returns True if task was recorded with the same command, the same
+            input fingerprints and the same target fingerprints it has now.
+            inputs is the list of paths the task reads.
+        '''
+        entry = self.entries.get(task.name)
+        if(entry is None or entry.get('content_hash') != self.content_hash):
+            return False
+        if(entry['command'] != hash_command(task.command_template)):
+            return False
+        if(sorted(entry['inputs']) != sorted(inputs)):
+            return False
+        if(sorted(entry['targets']) != sorted(task.targets)):
+            return False
+        for p in inputs:
+            if(entry['inputs'][p] != fingerprint(p, self.content_hash)):
+                return False
+        for p in task.targets:
+            if(entry['targets'][p] is None or
+               entry['targets'][p] != fingerprint(p, self.content_hash)):
+                return False
+        return True
+
+    def record(self, task, inputs):
+        ''' Records the current command, input and target fingerprints of
+            task, then saves the manifest.
+        '''
+        self.entries[task.name] = self.__describe__(task, inputs)
+        self.save()
+
+    def forget(self, task):
+        ''' Drops the record of task, then saves the manifest.
+        '''
+        if(self.entries.pop(task.name, None) is not None):
+            self.save()
+
+    def save(self):
+        ''' Writes the manifest to a temporary file and renames it over
+            self.path, so an interrupted write never leaves a truncated
+            manifest behind.
+        '''
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self.entries, f, sort_keys=True, indent=2)
+        os.rename(temp, self.path)
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import threading
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn, UnixStreamServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn, UnixStreamServer
+
+
+def finite(value):
+    ''' json has no infinity, uncapped values are written as null.
+    '''
+    return None if(value == float('inf')) else value
+
+
+def render_json(snapshot, now=None):
+    ''' Returns the json status document of snapshot, a Supervisor.status()
+        dict, with the elapsed times of running tasks and the queue waits of
+        ready tasks computed at now.
+    '''
+    now = time.time() if(now is None) else now
+    doc = dict(snapshot)
+    doc['time'] = now
+    doc['cpu'] = {k: finite(v) for k, v in snapshot['cpu'].items()}
+    doc['mem'] = {k: finite(v) for k, v in snapshot['mem'].items()}
+    doc['tasks'] = []
+    for t in snapshot['tasks']:
+        t = dict(t)
+        if(t['state'] == 'started'):
+            t['elapsed'] = round(now - t['start'], 1)
+        elif(t['start'] is not None and t['stop'] is not None):
+            t['elapsed'] = t['stop'] - t['start']
+        if(t['ready'] is not None):
+            t['wait'] = round(now - t['ready'], 1)
+        doc['tasks'].append(t)
+    doc['since_progress'] = round(now - snapshot['last_progress'], 1)
+    return json.dumps(doc, sort_keys=True, indent=2)
+
+
+def label(value):
+    return '"{0!s}"'.format(str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+
+
+def number(value):
+    return '+Inf' if(value == float('inf')) else repr(float(value))
+
+
+def render_prometheus(snapshot, now=None):
+    ''' Returns the metrics of snapshot in the Prometheus text exposition
+        format. Alerting on time() - mmt_last_progress_timestamp_seconds
+        catches stalls, and mmt_cpu_in_use / mmt_cpu_cap under-utilisation.
+    '''
+    now = time.time() if(now is None) else now
+    lines = []
+
+    def metric(name, kind, doc, samples):
+        lines.append('# HELP {0!s} {1!s}'.format(name, doc))
+        lines.append('# TYPE {0!s} {1!s}'.format(name, kind))
+        for labels, value in samples:
+            tags = ','.join('{0!s}={1!s}'.format(k, label(v)) for k, v in labels)
+            lines.append('{0!s}{1!s} {2!s}'.format(name, '{' + tags + '}' if(tags) else '', number(value)))
+
+    metric('mmt_tasks', 'gauge', 'Number of tasks in each state.',
+           [((('state', s),), c) for s, c in sorted(snapshot['counts'].items())])
+    metric('mmt_cpu_in_use', 'gauge', 'Cpus held by running tasks.', [((), snapshot['cpu']['in_use'])])
+    metric('mmt_cpu_cap', 'gauge', 'Cpu cap of the run.', [((), snapshot['cpu']['cap'])])
+    metric('mmt_mem_in_use_gigabytes', 'gauge', 'Memory held by running tasks.',
+           [((), snapshot['mem']['in_use'])])
+    metric('mmt_mem_cap_gigabytes', 'gauge', 'Memory cap of the run.', [((), snapshot['mem']['cap'])])
+    running = [t for t in snapshot['tasks'] if(t['state'] == 'started')]
+    metric('mmt_task_elapsed_seconds', 'gauge', 'Time each running task has been running.',
+           [((('task', t['name']),), now - t['start']) for t in running])
+    ready = [t for t in snapshot['tasks'] if(t['ready'] is not None)]
+    metric('mmt_task_queue_wait_seconds', 'gauge', 'Time each ready task has been waiting for cpus, memory or resources.',
+           [((('task', t['name']),), now - t['ready']) for t in ready])
+    waits = [t['wait'] for t in snapshot['tasks'] if(t['ready'] is None and t['wait'] is not None)]
+    metric('mmt_queue_wait_seconds', 'summary', 'Time started tasks waited in the ready queue.', [])
+    lines.append('mmt_queue_wait_seconds_sum ' + number(sum(waits)))
+    lines.append('mmt_queue_wait_seconds_count ' + number(len(waits)))
+    metric('mmt_failures_total', 'counter', 'Number of tasks that failed.', [((), snapshot['failed'])])
+    metric('mmt_last_progress_timestamp_seconds', 'gauge', 'When a task last started, finished or failed.',
+           [((), snapshot['last_progress'])])
+    metric('mmt_run_start_timestamp_seconds', 'gauge', 'When the run started.', [((), snapshot['started'])])
+    return '\n'.join(lines) + '\n'
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    ''' Serves the latest snapshot of the server's StatusServer, as json at
+        / and /status, and in the Prometheus text format at /metrics.
+    '''
+
+    def do_GET(self):
+        snapshot = self.server.monitor.snapshot
+        path = self.path.split('?')[0].rstrip('/')
+        if(snapshot is None):
+            self.__reply__(503, 'text/plain', 'no run in progress\n')
+        elif(path in ('', '/status', '/status.json')):
+            self.__reply__(200, 'application/json', render_json(snapshot) + '\n')
+        elif(path == '/metrics'):
+            self.__reply__(200, 'text/plain; version=0.0.4', render_prometheus(snapshot))
+        else:
+            self.__reply__(404, 'text/plain', 'not found, try /status or /metrics\n')
+
+    def __reply__(self, code, content_type, body):
+        body = body.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # the run log is for the pipeline, not for dashboards polling it
+        pass
+
+
+class TCPStatusServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class UnixStatusServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+class StatusServer:
+    ''' Object that lets a Supervisor serve the live state of its run over
+        http, from a thread of its own, so a long run can be watched and
+        alerted on while it is backgrounded. The Supervisor publishes a
+        snapshot (see Supervisor.status) every cycle, requests are answered
+        from the latest one, so serving never touches the Supervisor itself.
+        Tasks are still started while the thread runs. Tools are safe as
+        nothing runs in their child between fork and exec (see
+        task_executors.GroupProcess), PythonTask workers are safe on python
+        3 only, where they come from a forkserver (see
+        task_executors.WORKER_CONTEXT). address is either host:port, port 0
+        picking a free one, or the path of a unix socket.
+            curl http://localhost:8765/status
+            curl --unix-socket out_dir/status.sock http://localhost/metrics
+    '''
+
+    def __init__(self, address):
+        ''' address -
+                host:port to listen on, or the path of a unix socket.
+        '''
+        self.address = address
+        self.snapshot = None
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        ''' Starts serving. Returns a line saying where, for the run log.
+        '''
+        host, sep, port = self.address.rpartition(':')
+        if(sep and port.isdigit() and '/' not in self.address):
+            self.server = TCPStatusServer((host, int(port)), StatusHandler)
+            where = 'http://{0!s}:{1!s}'.format(host, self.server.server_address[1])
+        else:
+            if(os.path.exists(self.address)):
+                # left behind by a run that was killed
+                os.remove(self.address)
+            self.server = UnixStatusServer(self.address, StatusHandler)
+            where = 'unix socket ' + self.address
+        if(fcntl is not None):
+            # tools started while serving must not inherit the socket
+            fd = self.server.fileno()
+            fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+        self.server.monitor = self
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return 'serving run status at {0!s} (/status, /metrics)'.format(where)
+
+    def publish(self, snapshot):
+        self.snapshot = snapshot
+
+    def close(self):
+        ''' Stops serving, and removes the unix socket.
+        '''
+        if(self.server is None):
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        if(isinstance(self.server, UnixStatusServer) and os.path.exists(self.address)):
+            os.remove(self.address)
+        self.server = None
@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import hmac
+import time
+import select
+import signal
+import socket
+import argparse
+import threading
+
+from tasks_v2 import rusage_delta
+from task_executors import GroupProcess, worker_secret, SECRET_ENV
+
+
+class NoUsage:
+    ru_utime = ru_stime = ru_maxrss = ru_inblock = ru_oublock = ru_nvcsw = ru_nivcsw = 0
+
+
+def open_log(path):
+    if(path is None):
+        return None
+    return open(path, 'a', 1)
+
+
+# seconds a connection gets to send its request, and the longest request
+REQUEST_TIMEOUT = 30
+REQUEST_SIZE = 2**20
+
+
+def authorized(request, secret):
+    ''' Returns True if request, a decoded json request, carries secret.
+    '''
+    if(not isinstance(request, dict)):
+        return False
+    sent = request.get('secret')
+    if(not isinstance(sent, type(u''))):
+        return False
+    return hmac.compare_digest(sent.encode('utf-8'), secret.encode('utf-8'))
+
+
+def run_job(conn, secret):
+    ''' Serves one connection from a SocketExecutor: reads the json request,
+        runs the command, then reports its exit code and usage. Requests
+        that don't carry secret are dropped before anything runs. The
+        command is killed if the connection sends "kill" or is closed.
+    '''
+    conn.settimeout(REQUEST_TIMEOUT)
+    f = conn.makefile('rb')
+    try:
+        request = json.loads(f.readline(REQUEST_SIZE).decode('utf-8'))
+    except (socket.error, ValueError):
+        request = None
+    f.close()
+    if(not authorized(request, secret)):
+        conn.close()
+        return
+    conn.settimeout(None)
+    out = open_log(request['stdout'])
+    err = open_log(request['stderr'])
+    # the job gets its own process group so kill reaches the whole tree
+    proc = GroupProcess(request['command'], stdout=out, stderr=err, cwd=request['cwd'],
+                        priority=request.get('priority'))
+    status = None
+    ru = None
+    killed = False
+    while(status is None):
+        ready = select.select([conn], [], [], 0.2)[0]
+        if(ready and not killed):
+            try:
+                data = conn.recv(1024)
+            except socket.error:
+                data = b''
+            if(not data or b'kill' in data):
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                killed = True
+        elif(killed):
+            time.sleep(0.05)
+        # wait4 gives the usage of this child alone, which getrusage can't
+        # do while other jobs are being reaped by other threads
+        pid, s, r = os.wait4(proc.pid, os.WNOHANG)
+        if(pid != 0):
+            status, ru = s, r
+    for log in (out, err):
+        if(log is not None):
+            log.close()
+    if(os.WIFSIGNALED(status)):
+        returncode = -os.WTERMSIG(status)
+    else:
+        returncode = os.WEXITSTATUS(status)
+    result = {'returncode': returncode, 'usage': rusage_delta(NoUsage, ru)}
+    try:
+        conn.sendall((json.dumps(result) + '\n').encode('utf-8'))
+    except socket.error:
+        pass
+    conn.close()
+
+
+def serve(host, port, secret):
+    ''' Accepts SocketExecutor connections forever, one thread per job, and
+        runs the requests that carry secret. The port actually bound is
+        printed first so port 0 can be used.
+    '''
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen(64)
+    sys.stdout.write('listening on {0!s} {1!s}\n'.format(host, server.getsockname()[1]))
+    sys.stdout.flush()
+    while(True):
+        conn, addr = server.accept()
+        t = threading.Thread(target=run_job, args=(conn, secret))
+        t.daemon = True
+        t.start()
+
+
+if(__name__ == '__main__'):
+    parser = argparse.ArgumentParser(description=(
+        'Description: A worker that runs Task commands sent by a Supervisor '
+        'using a task_executors.SocketExecutor. Outputs are written to the '
+        'paths given by the Supervisor, so they must be shared with it. '
+        'Only requests carrying the secret shared with the Supervisor are '
+        'run, it is read from $' + SECRET_ENV + ' or --secret_file.'))
+    parser.add_argument('--host', default='127.0.0.1', help=(
+        'The address to listen on. Default = 127.0.0.1, use the address of '
+        'an interface reachable by the Supervisor to take remote jobs.'))
+    parser.add_argument('--port', type=int, default=9123, help=(
+        'The port to listen on. Use 0 to pick a free port.'))
+    parser.add_argument('--secret_file', default=None, help=(
+        'A file holding the shared secret, instead of $' + SECRET_ENV + '.'))
+    args = parser.parse_args()
+    secret = worker_secret(args.secret_file)
+    if(secret is None):
+        parser.error('a shared secret is required, set {0!s} or use --secret_file'.format(SECRET_ENV))
+    serve(args.host, args.port, secret)
@@ -1,10 +1,22 @@
 import os
 import sys
 import time
+import math
+import errno
+import select
 import signal
+import shutil
+import tempfile
 import subprocess
 import warnings
 import platform
+from task_executors import LocalExecutor, PythonExecutor, PRIORITIES
+from task_limits import TaskLimits, format_cores
+try:
+    import resource
+except ImportError:
+    # not available on windows, no accounting is done there
+    resource = None
 
 
 def time_to_hms(delta):
@@ -30,6 +42,119 @@ def check_foreground():
     return False
 
 
+def children_rusage():
+    ''' Returns resource.getrusage(RUSAGE_CHILDREN), or None if the resource
+        module is unavailable.
+    '''
+    if(resource is None):
+        return None
+    return resource.getrusage(resource.RUSAGE_CHILDREN)
+
+
+def rusage_delta(before, after):
+    ''' Returns the usage dict of the children reaped between two calls to
+        children_rusage(). ru_maxrss is a maximum over every child ever
+        reaped rather than a total, so peak_rss_mb is only known when the
+        reaped children set a new maximum, and is None otherwise.
+    '''
+    if(before is None or after is None):
+        return {}
+    # ru_maxrss is in kilobytes on linux and bytes on mac
+    rss_unit = 1024.0 if(sys.platform != 'darwin') else 1.0
+    peak = None
+    if(after.ru_maxrss > before.ru_maxrss):
+        peak = round(after.ru_maxrss * rss_unit / 2**20, 1)
+    return {'user_cpu': round(after.ru_utime - before.ru_utime, 2),
+            'sys_cpu': round(after.ru_stime - before.ru_stime, 2),
+            'peak_rss_mb': peak,
+            'read_bytes': (after.ru_inblock - before.ru_inblock) * 512,
+            'write_bytes': (after.ru_oublock - before.ru_oublock) * 512,
+            'voluntary_ctx_switches': after.ru_nvcsw - before.ru_nvcsw,
+            'involuntary_ctx_switches': after.ru_nivcsw - before.ru_nivcsw}
+
+
+def proc_children():
+    ''' Returns a dict mapping each pid to the list of its child pids, read
+        from the stat file of every process in /proc. Empty where /proc is
+        unavailable. Only used where the kernel has no children files (see
+        pid_children), since it reads every process on the host.
+    '''
+    children = {}
+    if(not os.path.isdir('/proc')):
+        return children
+    for p in os.listdir('/proc'):
+        if(not p.isdigit()):
+            continue
+        try:
+            with open('/proc/{0!s}/stat'.format(p)) as f:
+                stat = f.read()
+        except (IOError, OSError):
+            continue
+        # the command name may contain spaces, fields after it are fixed
+        ppid = int(stat[stat.rfind(')') + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(p))
+    return children
+
+
+def pid_children(pid):
+    ''' Returns the child pids of pid, read from /proc/<pid>/task/*/children,
+        so only the process tree being walked is read. Empty if pid is gone.
+    '''
+    try:
+        tids = os.listdir('/proc/{0!s}/task'.format(pid))
+    except OSError:
+        return []
+    children = []
+    for tid in tids:
+        try:
+            with open('/proc/{0!s}/task/{1!s}/children'.format(pid, tid)) as f:
+                children.extend(int(c) for c in f.read().split())
+        except (IOError, OSError, ValueError):
+            continue
+    return children
+
+
+# /proc/<pid>/task/<tid>/children needs CONFIG_PROC_CHILDREN
+CHILDREN_FILES = os.path.exists('/proc/{0!s}/task/{0!s}/children'.format(os.getpid()))
+
+
+def process_tree_rss(pid, children=None):
+    ''' Returns the summed resident set size, in megabytes, of pid and all
+        of its descendants, read from /proc/<pid>/statm. children is the
+        result of proc_children(), or None to follow each process's
+        children files instead.
+    '''
+    page_mb = os.sysconf('SC_PAGE_SIZE') / float(2**20)
+    total = 0
+    stack = [pid]
+    while(stack):
+        p = stack.pop()
+        stack.extend(children.get(p, []) if(children is not None) else pid_children(p))
+        try:
+            with open('/proc/{0!s}/statm'.format(p)) as f:
+                total += int(f.read().split()[1])
+        except (IOError, OSError, IndexError, ValueError):
+            continue
+    return round(total * page_mb, 1)
+
+
+def format_usage(usage):
+    ''' Formats a Task.usage dict for a log file.
+    '''
+    if(usage == {}):
+        return 'no usage recorded'
+    rss = usage['peak_rss_mb']
+    return ('user {0!s}s, sys {1!s}s, peak rss {2!s}MB, read {3:.1f}MB, write {4:.1f}MB, '
+            'ctx switches {5!s}/{6!s}').format(
+            usage['user_cpu'], usage['sys_cpu'], rss if(rss is not None) else '?',
+            usage['read_bytes'] / float(2**20), usage['write_bytes'] / float(2**20),
+            usage['voluntary_ctx_switches'], usage['involuntary_ctx_switches'])
+
+
+LOCAL_EXECUTOR = LocalExecutor()
+PYTHON_EXECUTOR = PythonExecutor()
+
+
 def not_zero(i):
     ''' function that returns True if i is not zero. the funciton is equivalent
         to lambda i: i!=0
@@ -42,6 +167,15 @@ class Task:
         can be defined and exucted using a Task object
     '''
 
+    # placeholder for the thread count in the command of an elastic task
+    THREADS = '__THREADS__'
+    # placeholder for the directory a command keeps intermediate files in
+    WORK_DIR = '__WORK_DIR__'
+    # priority classes, see task_executors.PRIORITIES
+    PRIORITY_NORMAL = 'normal'
+    PRIORITY_BACKGROUND = 'background'
+    PRIORITY_IDLE = 'idle'
+
     class ExitCodeException(Exception):
         ''' An exception raised by a call to self.finished() if the subprocess
             exits with a bad exit code.
@@ -56,8 +190,11 @@ class Task:
 
     def __init__(
       self, command, dependencies=[], targets=[], cpu=1, name='Anonymous_Task',
-      stderr=None, stdout=None, error_check=not_zero, max_wall_time=float('inf')):
-        ''' The __init__ for the Task object has nine parameters described below:
+      stderr=None, stdout=None, error_check=not_zero, max_wall_time=float('inf'),
+      mem=0, resources=None, inputs=None, executor=None, min_cpu=None,
+      resume_command=None, streams=None, work_dir=None, scratch=0, stage_inputs=False,
+      priority='normal', group=None):
+        ''' The __init__ for the Task object has twenty-one parameters described below:
             command -
                 a string representation of the cmd line command to be executed.
             dependencies -
@@ -71,7 +208,8 @@ class Task:
                 generated by running the task.
             cpu -
                 the number of threads or cpu intensivity of the command. This
-                value is used by Supervisor objects. Default=1
+                value is used by Supervisor objects. For an elastic task, the
+                most threads it can use. Default=1
             name -
                 A string that will be used for representing the task for more
                 convienient logging
@@ -90,20 +228,99 @@ class Task:
                 the amount of time, in minutes, that the command should be
                 allowed to run before being stopped by a call to
                 self.finished(). Default = float('inf')
+            mem -
+                the amount of memory, in gigabytes, the command is expected to
+                use at its peak. Used by Supervisor objects in the same way as
+                cpu. Default=0
+            resources -
+                a dict mapping the names of other consumable resources (io
+                slots, scratch disk, licence tokens, ...) to the amount of
+                each the command holds while running. Default = {}
+            inputs -
+                a list of strings that are the paths to the files read by
+                the command. Used by Supervisor objects to estimate the run
+                time of a task that has no history, and to fingerprint it for
+                manifests and caches. When empty, the targets of the task's
+                dependencies are used instead. Default = []
+            executor -
+                the task_executors.Executor that runs the command. If None,
+                the executor of the Supervisor running the task is used, or
+                the local one when run on its own. Default = None
+            min_cpu -
+                If given, the task is elastic: it can run with anywhere from
+                min_cpu to cpu threads, and every Task.THREADS in command is
+                replaced by the thread count chosen when it starts (see
+                self.setThreads). Until then self.cpu is min_cpu.
+                Default = None (the task always uses cpu threads)
+            resume_command -
+                For tools that checkpoint their own progress, the command
+                that picks a run up where an interrupted one stopped. A
+                Supervisor with a journal runs it instead of command when the
+                previous run of this task was interrupted. Such tasks keep
+                their targets in place when killed. Default = None
+            streams -
+                a list of targets of this task's dependencies that the
+                command reads once from start to end and that nothing else
+                reads. A Supervisor turns each into a named pipe, and starts
+                this task together with the dependency writing it, so the
+                data never goes through the disk. Default = []
+            work_dir -
+                the directory the command keeps its intermediate files in,
+                substituted for every Task.WORK_DIR in command.
+                Default = None
+            scratch -
+                the node-local space, in gigabytes, the command needs to run
+                staged (see self.stage). A Supervisor with a scratch
+                directory stages the task when that much space is free
+                there. 0 means the task is never staged. Default = 0
+            stage_inputs -
+                If True, inputs are copied into the scratch directory too
+                when the task is staged. Default = False
+            priority -
+                the priority class the command runs at: Task.PRIORITY_NORMAL,
+                Task.PRIORITY_BACKGROUND (nice 10, lowest best effort io) or
+                Task.PRIORITY_IDLE (nice 19, idle io, only gets the disk when
+                nothing else wants it). Reports, plots and qc, which nothing
+                downstream waits on, should not compete with the critical
+                path for disk and cpu. Default = Task.PRIORITY_NORMAL
+            group -
+                the name of the project the task belongs to, when a
+                Supervisor shares its cpus between projects (see
+                Supervisor shares). Default = None (shared by every project)
         '''
+        if(priority not in PRIORITIES):
+            raise Exception('Task {0!s} has an unknown priority class {1!s}, expected one of {2!s}.'.format(
+                name, priority, ', '.join(sorted(PRIORITIES))))
         if(stderr is not None):
             f = open(stderr, 'a')
             f.close()
         if(stdout is not None):
             f = open(stdout, 'a')
             f.close()
+        self.command_template = command
         self.command = command
+        self.resume_command = resume_command
+        self.resuming = False
+        self.work_dir = work_dir
+        self.scratch = scratch
+        self.stage_inputs = stage_inputs
+        self.staged_dir = None
+        self.staged_paths = {}
         self.dependencies = dependencies
-        self.cpu = cpu
+        self.max_cpu = cpu
+        self.min_cpu = min_cpu if(min_cpu is not None) else cpu
+        self.setThreads(self.min_cpu)
+        self.mem = mem
+        self.resources = resources if(resources is not None) else {}
         self.name = name
         self.stdout = stdout
         self.stderr = stderr
         self.targets = targets
+        self.inputs = inputs if(inputs is not None) else []
+        self.streams = streams if(streams is not None) else []
+        self.executor = executor
+        self.priority = priority
+        self.group = group
         self.error_check = error_check
         self.opened_files = []
         self.process = None
@@ -111,6 +328,125 @@ class Task:
         self.soft_finished_status = False
         self.start_time = time.time()
         self.max_wall_time = max_wall_time
+        self.usage = {}
+        self.sampled_rss = 0
+        self.orphans = []
+        self.cores = None
+        self.cgroup = None
+
+    def setThreads(self, cpu):
+        ''' Sets the number of threads this task will be started with, and
+            fills it into the command. cpu is clamped to [min_cpu, max_cpu].
+        '''
+        self.cpu = max(self.min_cpu, min(self.max_cpu, cpu))
+        template = self.resume_command if(self.resuming) else self.command_template
+        self.command = self.__localize__(template.replace(Task.THREADS, str(self.cpu)))
+
+    def __localize__(self, command):
+        ''' Fills the work directory into command. When staged, the staged
+            targets, inputs and work directory replace the real ones.
+        '''
+        if(self.staged_dir is None):
+            if(self.work_dir is not None):
+                command = command.replace(Task.WORK_DIR, self.work_dir)
+            return command
+        subs = sorted(self.staged_paths.items(), key=lambda s: -len(s[0]))
+        for path, staged in subs:
+            command = command.replace(path, staged)
+        return command.replace(Task.WORK_DIR, self.staged_dir)
+
+    def stage(self, root):
+        ''' Moves this task into a new directory under root, usually on a
+            node-local disk: the work directory and TMPDIR point there, the
+            targets are written there and, with stage_inputs, the inputs are
+            copied there first. Only the targets are moved back, by
+            self.unstage(), once the command succeeds. Returns False, and
+            changes nothing, if two targets share a basename.
+        '''
+        names = [os.path.basename(t.rstrip('/')) for t in self.targets]
+        if(len(set(names)) != len(names)):
+            return False
+        self.staged_dir = tempfile.mkdtemp(prefix='mmt_{0!s}_'.format(self.name), dir=root)
+        self.staged_paths = {}
+        for t, n in zip(self.targets, names):
+            self.staged_paths[t] = os.path.join(self.staged_dir, n)
+        if(self.stage_inputs):
+            input_dir = os.path.join(self.staged_dir, 'inputs')
+            os.mkdir(input_dir)
+            for i, p in enumerate(self.inputs):
+                staged = os.path.join(input_dir, '{0!s}_{1!s}'.format(i, os.path.basename(p)))
+                if(os.path.isdir(p)):
+                    shutil.copytree(p, staged)
+                elif(os.path.isfile(p)):
+                    shutil.copy2(p, staged)
+                else:
+                    # missing or a named pipe, left where it is
+                    continue
+                self.staged_paths[p] = staged
+        self.setThreads(self.cpu)
+        return True
+
+    def unstage(self, success):
+        ''' Ends staging. If success, every staged target is moved back to
+            its real path: it is copied next to it under a temporary name
+            then renamed into place, so it appears whole or not at all. The
+            scratch directory is then removed.
+        '''
+        if(self.staged_dir is None):
+            return
+        try:
+            for t in (self.targets if(success) else []):
+                staged = self.staged_paths[t]
+                if(not os.path.lexists(staged)):
+                    continue
+                temp = t + '.staging'
+                for path in (temp, t):
+                    if(os.path.isdir(path) and not os.path.islink(path)):
+                        shutil.rmtree(path)
+                    elif(os.path.lexists(path)):
+                        os.remove(path)
+                shutil.move(staged, temp)
+                os.rename(temp, t)
+        finally:
+            shutil.rmtree(self.staged_dir, ignore_errors=True)
+            self.staged_dir = None
+            self.staged_paths = {}
+            self.setThreads(self.cpu)
+
+    def environment(self):
+        ''' Returns the environment the command runs with, or None to
+            inherit this process's. Staged tasks get TMPDIR set to their
+            scratch directory, and tasks given cores by a TaskLimits get the
+            usual thread count variables set to their cpu.
+        '''
+        if(self.staged_dir is None and self.cores is None):
+            return None
+        env = dict(os.environ)
+        if(self.staged_dir is not None):
+            env['TMPDIR'] = self.staged_dir
+        if(self.cores is not None):
+            for var in TaskLimits.THREAD_VARS:
+                env[var] = str(int(math.ceil(self.cpu)))
+        return env
+
+    def resume(self):
+        ''' Switches this task to its resume_command and moves back any
+            target a previous run left as t+".partial". Returns False, and
+            changes nothing, if the task has no resume_command.
+        '''
+        if(self.resume_command is None):
+            return False
+        for t in self.targets:
+            if(not os.path.exists(t) and os.path.exists(t + '.partial')):
+                os.rename(t + '.partial', t)
+        self.resuming = True
+        self.setThreads(self.cpu)
+        return True
+
+    def elastic(self):
+        ''' Returns True if the Supervisor can choose this task's threads.
+        '''
+        return self.min_cpu < self.max_cpu
 
     def checkDependencies(self):
         ''' Method will check all dependencies of this object.
@@ -138,9 +474,22 @@ class Task:
                 raise self.TaskException(error_message)
         return True
 
-    def start(self):
-        ''' Method used to start the execution of this Task. self.command will
-            be executed using the subprocess.Popen constructor with shell=True.
+    def start(self, executor=None):
+        ''' Method used to start the execution of this Task. self.command is
+            submitted to self.executor, else to executor, else it is executed
+            locally using the subprocess.Popen constructor with shell=True.
+        '''
+        if(self.executor is not None):
+            executor = self.executor
+        elif(executor is None):
+            executor = LOCAL_EXECUTOR
+        self.start_time = time.time()
+        self.process = executor.submit(self)
+
+    def open_logs(self):
+        ''' Opens the stdout and stderr logs of this task, writes the command
+            at the top of each and returns them as (out, err). Either is None
+            if the task has no such log. Used by executors.
         '''
         if(self.stderr is not None):
             err = open(self.stderr, 'w', 1)
@@ -154,9 +503,7 @@ class Task:
             self.opened_files.append(out)
         else:
             out = None
-        self.start_time = time.time()
-        temp = subprocess.Popen(self.command, shell=True, stdout=out, stderr=err)
-        self.process = temp
+        return out, err
 
     def finished(self):
         ''' A method that will check if this Task has finished executing,
@@ -176,7 +523,20 @@ class Task:
             return True
         if(self.process is None):
             return False
-        self.process.poll()
+        if(self.exit_code is None and isinstance(self.process, subprocess.Popen)):
+            # the process is reaped by poll(), so the growth of the children
+            # rusage across it belongs to this task's process tree
+            before = children_rusage()
+            self.process.poll()
+            if(self.process.returncode is not None):
+                self.__recordUsage__(before, children_rusage())
+        elif(self.exit_code is None):
+            # other executors report the usage of the command themselves
+            self.process.poll()
+            if(self.process.returncode is not None):
+                self.usage = dict(getattr(self.process, 'usage', {}))
+                if(self.usage != {} and self.usage['peak_rss_mb'] is None and self.sampled_rss > 0):
+                    self.usage['peak_rss_mb'] = self.sampled_rss
         exit_code = self.process.returncode
         if(exit_code is None):
             cur_run_time = float(time.time() - self.start_time) / 60
@@ -191,6 +551,12 @@ class Task:
         else:
             self.exit_code = exit_code
             self.close_files()
+            self.__killOrphans__()
+            try:
+                self.unstage(not self.error_check(exit_code))
+            except (OSError, IOError) as inst:
+                raise self.TaskException('Unable to move the targets of task {0!s} out of '
+                                         'scratch: {1!s}'.format(self.name, inst))
             if(self.error_check(exit_code)):
                 error_message = ('The task {0!s} seems to have failed with exit_code {1!s}.'
                                  ).format(self.name, exit_code)
@@ -209,6 +575,37 @@ class Task:
                     raise self.TaskException(error_message)
             return True
 
+    def __killOrphans__(self):
+        ''' Stops any process the command left running after it exited,
+            recording their pids in self.orphans. Only possible for handles
+            that track their process group (see task_executors.GroupProcess).
+        '''
+        if(not hasattr(self.process, 'members')):
+            return
+        self.orphans = self.process.members()
+        if(self.orphans != []):
+            self.process.kill()
+
+    def __recordUsage__(self, before, after):
+        self.usage = rusage_delta(before, after)
+        if(self.usage != {}):
+            peak = self.usage['peak_rss_mb']
+            if(self.sampled_rss > 0 and (peak is None or self.sampled_rss > peak)):
+                self.usage['peak_rss_mb'] = self.sampled_rss
+
+    def sample(self, children=None):
+        ''' Samples the resident set size of this task's whole process tree
+            and keeps the largest value seen. children is the result of
+            proc_children(), or None where the kernel has children files.
+            Peak RSS can't be read back from rusage for every task, so
+            Supervisors call this once per heartbeat.
+        '''
+        if(self.process is None or self.process.returncode is not None):
+            return
+        if(getattr(self.process, 'pid', None) is None):
+            return
+        self.sampled_rss = max(self.sampled_rss, process_tree_rss(self.process.pid, children))
+
     def run(self, delay=1):
         ''' A convenience method that alllows for the execution of a task
             serially. This task will be started by a call to self.start(),
@@ -222,13 +619,19 @@ class Task:
 
     def killRun(self):
         ''' Calling this method will safely stop the execution of this task.
+            With the local executor every process started by the command is
+            stopped, SIGTERM first and SIGKILL if it doesn't exit in time.
+            Targets are renamed to t+".partial" unless the task has a
+            resume_command, in which case they may hold its checkpoints.
         '''
         try:
             self.process.kill()
         except:
             pass
         self.close_files()
-        self.rename_targets()
+        self.unstage(False)
+        if(self.resume_command is None):
+            self.rename_targets()
 
     def close_files(self):
         ''' This method is responsible for closing all log files opened by a call to self.start.
@@ -276,6 +679,438 @@ class Task:
         return self.__str__()
 
 
+class PythonTask(Task):
+    ''' A Task that calls a python function instead of running a command
+        line. The function is imported from a module given by path and runs
+        in a worker of a task_executors.PythonExecutor, which stays up for
+        the whole run, so a step written in python doesn't start a new
+        interpreter or redo its imports. Supervisors treat it like any other
+        Task: its cpu, mem, targets and dependencies work the same way, and
+        self.command is a readable rendering of the call, used in logs and
+        to fingerprint the task for manifests and caches.
+    '''
+
+    def __init__(self, path, function='main', args=(), kwargs=None, cwd=None, **task_args):
+        ''' The __init__ for the PythonTask object has five parameters of its
+            own, every other keyword parameter is passed on to Task:
+            path -
+                the path to the python file that defines function. Its
+                directory is put on sys.path of the worker, so it can import
+                its siblings.
+            function -
+                the name of the function to call. Its return value is the
+                exit code if it is an int, 0 otherwise. Default = 'main'
+            args -
+                a tuple of positional arguments for function. Default = ()
+            kwargs -
+                a dict of keyword arguments for function. Default = {}
+            cwd -
+                the directory function is called from, created if needed.
+                Default = None (the working directory of the Supervisor when
+                the task starts)
+        '''
+        kwargs = kwargs if(kwargs is not None) else {}
+        self.call = (path, function, tuple(args), kwargs)
+        self.cwd = cwd
+        params = [repr(a) for a in args] + ['{0!s}={1!r}'.format(k, kwargs[k]) for k in sorted(kwargs)]
+        command = '{0!s}:{1!s}({2!s})'.format(path, function, ', '.join(params))
+        if(cwd is not None):
+            command = 'cd {0!s}; {1!s}'.format(cwd, command)
+        if(task_args.get('executor') is None):
+            task_args['executor'] = PYTHON_EXECUTOR
+        Task.__init__(self, command, **task_args)
+
+
+class ChildWatcher:
+    ''' Object used by a Supervisor to sleep until one of its running Tasks
+        exits rather than waking up every delay seconds. Three modes are
+        supported, and the best one available is chosen at construction:
+            MODE_PIDFD -
+                a pidfd is opened for every registered process and the
+                watcher blocks in poll() on all of them (Linux >= 5.3,
+                python >= 3.9).
+            MODE_SIGCHLD -
+                a SIGCHLD handler writes to a self-pipe through
+                signal.set_wakeup_fd and the watcher blocks in select() on
+                the read end. Only usable from the main thread.
+            MODE_POLL -
+                the original behaviour, wait() simply sleeps.
+        In every mode wait(timeout) returns after at most timeout seconds,
+        so callers can keep checking wall times and callable dependencies.
+        Tasks run by another executor are watched through the fileno() of
+        their handle, if it has one, in the pidfd and sigchld modes.
+    '''
+
+    MODE_PIDFD = 'pidfd'
+    MODE_SIGCHLD = 'sigchld'
+    MODE_POLL = 'poll'
+
+    def __init__(self, mode=None):
+        ''' mode -
+                force one of MODE_PIDFD, MODE_SIGCHLD or MODE_POLL. If the
+                requested mode is unavailable, the next best mode is used.
+                Default = None (choose automatically)
+        '''
+        self.mode = None
+        self.pidfds = {}
+        self.handle_fds = {}
+        self.poller = None
+        self.pipe = None
+        self.old_wakeup_fd = None
+        self.old_handler = None
+        modes = [ChildWatcher.MODE_PIDFD, ChildWatcher.MODE_SIGCHLD, ChildWatcher.MODE_POLL]
+        if(mode is not None):
+            modes = modes[modes.index(mode):]
+        for m in modes:
+            if(m == ChildWatcher.MODE_PIDFD and self.__setupPidfd__()):
+                self.mode = m
+            elif(m == ChildWatcher.MODE_SIGCHLD and self.__setupSigchld__()):
+                self.mode = m
+            elif(m == ChildWatcher.MODE_POLL):
+                self.mode = m
+            if(self.mode is not None):
+                break
+
+    def __setupPidfd__(self):
+        if(not hasattr(os, 'pidfd_open') or not hasattr(select, 'poll')):
+            return False
+        try:
+            os.close(os.pidfd_open(os.getpid()))
+        except OSError:
+            return False
+        self.poller = select.poll()
+        return True
+
+    def __setupSigchld__(self):
+        if(not hasattr(signal, 'SIGCHLD') or not hasattr(signal, 'set_wakeup_fd')):
+            return False
+        r, w = os.pipe()
+        for fd in (r, w):
+            try:
+                os.set_blocking(fd, False)
+            except AttributeError:
+                import fcntl
+                flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+                fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        try:
+            self.old_wakeup_fd = signal.set_wakeup_fd(w)
+        except ValueError:
+            # not in the main thread
+            os.close(r)
+            os.close(w)
+            return False
+        self.old_handler = signal.signal(signal.SIGCHLD, lambda *x: None)
+        signal.siginterrupt(signal.SIGCHLD, False)
+        self.pipe = (r, w)
+        return True
+
+    def register(self, task):
+        ''' Start watching the process of a Task that has just been started.
+        '''
+        if(self.mode == ChildWatcher.MODE_POLL):
+            return
+        if(hasattr(task.process, 'fileno')):
+            fd = task.process.fileno()
+            self.handle_fds[task] = fd
+            if(self.mode == ChildWatcher.MODE_PIDFD):
+                self.poller.register(fd, select.POLLIN)
+            return
+        if(self.mode != ChildWatcher.MODE_PIDFD):
+            return
+        pid = getattr(task.process, 'pid', None)
+        if(pid is None):
+            return
+        try:
+            fd = os.pidfd_open(pid)
+        except OSError:
+            return
+        self.pidfds[task] = fd
+        self.poller.register(fd, select.POLLIN)
+
+    def unregister(self, task):
+        ''' Stop watching the process of a Task that has finished or failed.
+        '''
+        fd = self.handle_fds.pop(task, None)
+        if(fd is not None and self.mode == ChildWatcher.MODE_PIDFD):
+            self.poller.unregister(fd)
+        fd = self.pidfds.pop(task, None)
+        if(fd is not None):
+            self.poller.unregister(fd)
+            os.close(fd)
+
+    def wait(self, timeout):
+        ''' Block until a watched child exits or timeout seconds have passed.
+        '''
+        if(timeout <= 0):
+            return
+        if(self.mode == ChildWatcher.MODE_PIDFD):
+            try:
+                self.poller.poll(int(timeout * 1000))
+            except (OSError, select.error) as inst:
+                if(inst.args[0] != errno.EINTR):
+                    raise
+        elif(self.mode == ChildWatcher.MODE_SIGCHLD):
+            try:
+                fds = [self.pipe[0]] + list(self.handle_fds.values())
+                ready = select.select(fds, [], [], timeout)[0]
+            except (OSError, select.error) as inst:
+                if(inst.args[0] != errno.EINTR):
+                    raise
+                ready = []
+            if(self.pipe[0] in ready):
+                try:
+                    while(os.read(self.pipe[0], 512)):
+                        pass
+                except OSError:
+                    pass
+        else:
+            time.sleep(timeout)
+
+    def close(self):
+        ''' Release pidfds and restore the previous SIGCHLD handling.
+        '''
+        for t in list(self.pidfds) + list(self.handle_fds):
+            self.unregister(t)
+        if(self.pipe is not None):
+            signal.signal(signal.SIGCHLD, self.old_handler)
+            signal.set_wakeup_fd(self.old_wakeup_fd)
+            os.close(self.pipe[0])
+            os.close(self.pipe[1])
+            self.pipe = None
+
+
+class Barrier:
+    ''' Node of a TaskGraph standing for a Supervisor that tasks depend on.
+        Every managed task of the Supervisor is a predecessor of the
+        barrier and every task depending on the Supervisor a successor, so
+        a dependency between two supervisors costs one edge per task rather
+        than one per pair of tasks. A barrier is done when all of its
+        members are.
+    '''
+
+    def __init__(self, supervisor, members):
+        self.supervisor = supervisor
+        self.members = members
+        self.member_set = set(members)
+        self.name = supervisor.name
+        self.targets = [p for m in members for p in m.targets]
+        # whether every member was skipped, set by the Supervisor once known
+        self.skipped = None
+
+    def __str__(self):
+        return 'barrier:' + self.name
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class TaskGraph:
+    ''' Dependency index built by a Supervisor over the Tasks it manages.
+        Task and Supervisor dependencies are resolved into deduplicated
+        forward (successors) and reverse (predecessors) edges between managed
+        tasks, and each task keeps an in-degree count of unfinished
+        predecessors. A Supervisor dependency goes through a single Barrier
+        node, which the methods below look through, so they only ever
+        return tasks. Stream edges (see self.stream) join tasks that run at
+        the same time and are left out of the in-degree. Dependencies that
+        can't be expressed as edges are kept per task and must be checked by
+        polling:
+            guards -
+                unit functions from Task.dependencies.
+            external -
+                Task objects that are not managed by the Supervisor.
+    '''
+
+    def __init__(self, tasks):
+        ''' tasks -
+                an iterable of the Task objects managed by a Supervisor. The
+                order of tasks is kept by self.roots().
+        '''
+        self.tasks = list(tasks)
+        self.task_set = set(self.tasks)
+        self.successors = {t: set() for t in self.tasks}
+        self.predecessors = {t: set() for t in self.tasks}
+        self.guards = {t: [] for t in self.tasks}
+        self.external = {t: [] for t in self.tasks}
+        self.streamed = {t: set() for t in self.tasks}
+        self.barriers = {}
+        for t in self.tasks:
+            for d in t.dependencies:
+                self.__addDependency__(t, d)
+        self.in_degree = {n: len(self.predecessors[n]) for n in self.predecessors}
+
+    def __barrier__(self, supervisor):
+        ''' Returns the Barrier of supervisor, made on first use, or None if
+            none of its tasks are managed here.
+        '''
+        if(supervisor not in self.barriers):
+            members = [t for t in supervisor.task_order if(t in self.task_set)]
+            b = Barrier(supervisor, members) if(members) else None
+            if(b is not None):
+                self.successors[b] = set()
+                self.predecessors[b] = set(members)
+                self.streamed[b] = set()
+                for m in members:
+                    self.successors[m].add(b)
+            self.barriers[supervisor] = b
+        return self.barriers[supervisor]
+
+    def __addDependency__(self, task, d):
+        if(isinstance(d, Supervisor)):
+            b = self.__barrier__(d)
+            if(b is not None and task not in b.member_set):
+                self.predecessors[task].add(b)
+                self.successors[b].add(task)
+            for sub in d.task_order:
+                if(sub not in self.task_set or (b is not None and task in b.member_set)):
+                    # tasks of d run elsewhere, or task is one of them and
+                    # can't wait for itself
+                    self.__addDependency__(task, sub)
+        elif(isinstance(d, Task)):
+            if(d in self.task_set):
+                if(d is not task):
+                    self.predecessors[task].add(d)
+                    self.successors[d].add(task)
+            elif(d not in self.external[task]):
+                self.external[task].append(d)
+        elif(callable(d)):
+            if(not any(d is g for g in self.guards[task])):
+                self.guards[task].append(d)
+        else:
+            error_message = (
+                'Unable to check depencies of task {0!s}. \nTask '
+                'dependencies must not conatin anything that is not '
+                'a function or a Task. ').format(task.name)
+            raise Task.TaskException(error_message)
+
+    def roots(self):
+        ''' Returns the tasks that have no in-graph dependencies.
+        '''
+        return [t for t in self.tasks if(self.in_degree[t] == 0)]
+
+    def complete(self, task):
+        ''' Marks task as done (finished or skipped) and returns the list of
+            dependents whose last in-graph dependency was task. A barrier
+            whose last member was task is done as well.
+        '''
+        ret = []
+        for s in self.successors[task]:
+            if(s in self.streamed[task]):
+                continue
+            self.in_degree[s] -= 1
+            if(self.in_degree[s] == 0):
+                if(isinstance(s, Barrier)):
+                    ret.extend(self.complete(s))
+                else:
+                    ret.append(s)
+        return ret
+
+    def dependsOn(self, task, d):
+        ''' Returns True if task depends on the task d, directly or through
+            a barrier.
+        '''
+        if(d in self.predecessors[task]):
+            return True
+        return any(isinstance(b, Barrier) and d in b.member_set for b in self.predecessors[task])
+
+    def stream(self, producer, consumer):
+        ''' Turns the edge from producer to consumer into a stream edge.
+            consumer no longer waits for producer to finish, they are meant
+            to be started together. A consumer depending on producer through
+            a barrier is taken off the barrier and given edges from its
+            other members instead.
+        '''
+        if(producer not in self.predecessors[consumer]):
+            for b in [b for b in self.predecessors[consumer] if(isinstance(b, Barrier))]:
+                if(producer in b.member_set):
+                    self.successors[b].discard(consumer)
+                    self.predecessors[consumer].discard(b)
+                    self.in_degree[consumer] -= 1
+                    for m in b.members:
+                        if(m is not consumer and m not in self.predecessors[consumer]):
+                            self.predecessors[consumer].add(m)
+                            self.successors[m].add(consumer)
+                            self.in_degree[consumer] += 1
+        if(consumer in self.successors[producer] and consumer not in self.streamed[producer]):
+            self.streamed[producer].add(consumer)
+            self.in_degree[consumer] -= 1
+
+    def dependencies(self, task):
+        ''' Returns the in-graph tasks task depends on, with the members of
+            its barriers.
+        '''
+        ret = []
+        for d in self.predecessors[task]:
+            ret.extend(d.members if(isinstance(d, Barrier)) else [d])
+        return ret
+
+    def dependenciesMet(self, task):
+        ''' Checks the guards and external dependencies of task. Mirrors
+            Task.checkDependencies for everything that isn't an edge.
+        '''
+        for d in self.external[task]:
+            try:
+                if(not d.finished()):
+                    return False
+            except (Task.ExitCodeException, Task.TaskException):
+                return False
+        for g in self.guards[task]:
+            if(not g()):
+                return False
+        return True
+
+    def topologicalOrder(self, barriers=False):
+        ''' Returns the tasks ordered so every task comes after all of its
+            in-graph dependencies, with the barriers between them if
+            barriers is True. Tasks caught in a dependency cycle are left
+            out.
+        '''
+        in_degree = {n: len(self.predecessors[n]) for n in self.predecessors}
+        order = [t for t in self.tasks if(in_degree[t] == 0)]
+        i = 0
+        while(i < len(order)):
+            for s in self.successors[order[i]]:
+                in_degree[s] -= 1
+                if(in_degree[s] == 0):
+                    order.append(s)
+            i += 1
+        if(barriers):
+            return order
+        return [n for n in order if(not isinstance(n, Barrier))]
+
+    def criticalPaths(self, weights):
+        ''' Returns a dict mapping each task to the length of the longest
+            path from it to the end of the graph, where weights maps each
+            task to its own length. Computed in a single pass over the tasks
+            in reverse topological order. Tasks caught in a dependency cycle
+            are given their own weight.
+        '''
+        paths = {t: weights[t] for t in self.tasks}
+        for t in reversed(self.topologicalOrder(True)):
+            longest = 0
+            for s in self.successors[t]:
+                longest = max(longest, paths[s])
+            paths[t] = weights.get(t, 0) + longest
+        return paths
+
+    def downstream(self, task):
+        ''' Returns every task reachable from task by following successor
+            edges, found with a single breadth first walk.
+        '''
+        seen = set([task])
+        queue = [task]
+        ret = []
+        while(queue):
+            t = queue.pop()
+            for s in self.successors[t]:
+                if(s not in seen):
+                    seen.add(s)
+                    if(not isinstance(s, Barrier)):
+                        ret.append(s)
+                    queue.append(s)
+        return ret
+
+
 class Supervisor:
     ''' Object that will intelligently run Task objects or other Supervisor
         objects.
@@ -287,11 +1122,25 @@ class Supervisor:
     STATE_FINISHED = 'executed'
     STATE_RUNNING = 'started'
     STATE_REMOVED = 'removed'
+    STATE_CACHED = 'cached'
+    STATE_INTERRUPTED = 'interrupted'
+
+    # tasks keeping more than this times their cpu busy are reported
+    OVERCOMMIT = 1.1
+    # failures listed by self.status()
+    RECENT_FAILURES = 10
+
+    # run time estimate, in seconds, for tasks without history
+    DEFAULT_RUNTIME = 60
+    RUNTIME_PER_GB = 600
 
     def __init__(
       self, tasks=[], dependencies=[], cpu=float('inf'), name='Supervisor',
-      delay=1, force_run=False, email=None, email_interval=30, log=None):
-        ''' the __init__ for the Superviosr object has nine paramters
+      delay=1, force_run=False, email=None, email_interval=30, log=None,
+      event_driven=True, heartbeat=10, mem=float('inf'), resources=None,
+      history=None, backfill=False, manifest=None, cache=None, executor=None,
+      journal=None, scratch=None, limits=None, monitor=None, shares=None):
+        ''' the __init__ for the Superviosr object has twenty-three paramters
             described below.
             tasks -
                 A list of Task or Supervisor objects that this Supervisor will
@@ -310,7 +1159,9 @@ class Supervisor:
                 when printing the supervisor. Default = 'Supervisor'
             delay -
                 While running tasks, this superrvisor will weight delay seconds
-                in between each execution cycle. Default = 1
+                in between each execution cycle. Only used when event_driven
+                is False or no child exit notification is available.
+                Default = 1
             force_run -
                 A flag that determines whether the Supervisor will attempt to
                 skip execution of tasks that it thinks are skippable. A task is
@@ -328,8 +1179,110 @@ class Supervisor:
                 The path to the log file that the Supervisor will generate. The
                 log file is plain text and details the execution of each task.
                 Default = name+'.run_log'
+            event_driven -
+                If True, the supervisor blocks on child exit notifications
+                (see ChildWatcher) and reacts as soon as a running task
+                finishes instead of polling every delay seconds. Falls back
+                to polling when notifications are unavailable. Default = True
+            heartbeat -
+                In event driven mode, the longest time in seconds the
+                supervisor will block before re-checking wall times, callable
+                dependencies and emails. Default = 10
+            mem -
+                The memory cap, in gigabytes, for this supervisor. Works like
+                cpu using Task.mem. Default = float('inf')
+            resources -
+                A dict of caps for named consumable resources. A task is only
+                started when, for every resource it declares, the sum held by
+                running tasks stays within the cap. Resources without a cap
+                are unlimited. Default = {}
+            history -
+                A dict mapping task names to their wall time, in seconds, in
+                previous runs (see parse_qual_metrics.get_history). Ready
+                tasks are started in order of their longest remaining
+                downstream path, weighted by these wall times. Tasks without
+                history are estimated from the size of their inputs.
+                Default = {}
+            backfill -
+                If True, the supervisor schedules with EASY backfilling. When
+                the highest priority ready task doesn't fit, cpu, memory and
+                resources are reserved for it at the earliest time the
+                running tasks are expected to free enough of them, and a
+                smaller task is only started ahead of it if it is expected
+                to finish before that time or fits in what the reserved task
+                leaves over. If False, every ready task that fits is started.
+                Default = False
+            manifest -
+                A task_manifest.TaskManifest. When given, a task is only
+                skipped if the manifest holds a record of it with the same
+                command, input fingerprints and target fingerprints. Tasks
+                are recorded when they finish and forgotten when they start
+                or fail. A task with no record at all falls back to the
+                targets exist check and is recorded when skipped, so output
+                directories from before the manifest keep their results.
+                Default = None
+            cache -
+                A task_cache.TaskCache shared between runs. Before a task
+                with targets is started, its targets are looked up by its
+                normalized command and the content of its inputs, and a hit
+                is materialized instead of running the command. Targets of
+                executed tasks are added to the cache. Default = None
+            executor -
+                The task_executors.Executor used to run tasks that don't set
+                their own. None runs them locally. Default = None
+            journal -
+                A task_journal.TaskJournal. Every state transition is
+                appended to it as it happens, and tasks being run when the
+                supervisor is killed are recorded as interrupted. Before a
+                run the journal is replayed in one pass over the graph: a
+                task whose last run finished, whose targets are unchanged
+                since and whose dependencies were all restored is restored
+                as skipped, with the times and usage of that run. An
+                interrupted task with a resume_command is resumed rather
+                than restarted, unless it was staged. Default = None
+            scratch -
+                A node-local directory, such as $TMPDIR or /dev/shm, that
+                tasks declaring Task.scratch are staged in (see Task.stage)
+                when they run on this host and the space they need is free.
+                None disables staging. Default = None
+            limits -
+                A task_limits.TaskLimits. Tasks run on this host are pinned to
+                cores of their own and, where cgroups can be used, held to
+                their cpu and mem. The cpus each task really used are
+                recorded in task_status[task]['cpu_used'], and tasks that
+                used more than they declared are reported in the log.
+                Default = None
+            monitor -
+                A task_monitor.StatusServer. It is started with the run and
+                given a new snapshot of it (see self.status) every cycle, to
+                serve over http while the run goes on. Default = None
+            shares -
+                A dict mapping the Task.group of tasks, one per project, to
+                the weight of that project. When given, the ready queue is
+                ordered by the cpus each project holds over its weight
+                first, and by critical path only within a project, so
+                projects run side by side in proportion to their weights
+                instead of the one with the longest path taking the whole
+                host. Tasks without a group, shared set up, come first.
+                Default = None (critical path order only)
         '''
         self.cpu = cpu
+        self.mem = mem
+        self.resources = resources if(resources is not None) else {}
+        self.history = history if(history is not None) else {}
+        self.backfill = backfill
+        self.manifest = manifest
+        self.cache = cache
+        self.cache_keys = {}
+        self.executor = executor
+        self.journal = journal
+        self.scratch = scratch
+        self.limits = limits
+        self.monitor = monitor
+        self.shares = shares
+        self.group_cpu = {}
+        self.event_driven = event_driven
+        self.heartbeat = heartbeat
         self.name = name
         self.delay = delay
         self.dependencies = dependencies
@@ -344,82 +1297,103 @@ class Supervisor:
         self.errors = []
         self.targets = []
         self.tasks = set()
+        self.task_order = []
         for t in tasks:
             self.add_task(t)
 
     def run(self):
         ''' Use this funciton to get a Supervisor to run all tasks that it is
-            managing. Execution occurs inside of a large loop with multiple
+            managing. Before execution a TaskGraph is built over all managed
+            tasks. Execution then occurs inside of a large loop with multiple
             steps. First, this supervisor checks all running tasks to see if
-            they are finished. Those tasks that are finished are handled and
-            removed from processing Next the Supervisor checks to see if any
-            tasks can be started by checking their dependencies and making
-            sure executing the task won't result in the SUpervisor exceeding
-            the cpu_cap. Then, if force_run is False, the supervisor will
-            check to see if the task can be skipped. If the task can be
-            skipped, it will be, otherwise the task will be started. The loop
-            breaks when their are no tasks left that can be executed and no
-            tasks currently being executed.
+            they are finished. When a task finishes, the in-degree of each of
+            its dependents is decremented and those that reach zero become
+            available. When a task fails, everything downstream of it is
+            removed in a single walk of the graph. Next, available tasks whose
+            callable or external dependencies are satisfied are moved onto the
+            ready queue, and ready tasks are started in order as long as
+            executing them won't result in the Supervisor exceeding its
+            cpu_cap. If force_run is False, a ready task whose dependencies
+            were all skipped and whose targets exist is skipped instead of
+            being started. The ready queue is ordered by critical path, so
+            the tasks heading the longest remaining chains of work get the
+            cpus first, tasks joined by stream edges start together, and
+            with backfill a wide task at the head of the queue can't be
+            starved by narrower ones. The loop breaks when their are no tasks
+            left that can be executed and no tasks currently being executed.
+            Between cycles the supervisor either blocks until a running task
+            exits (event_driven) or sleeps for delay seconds. A cycle that
+            finished or skipped tasks is followed immediately by another one.
+            Once per heartbeat the memory of every running process tree is
+            sampled, and the cpu time, peak memory, io and context switches
+            of each task are recorded in task_status[task]['usage'] when it
+            exits. With a journal, tasks finished by an earlier run are
+            restored before the first cycle and every transition is appended
+            to it.
         '''
         self.log_file = open(self.log_path, 'w', 1)
         self.last_email = time.time()
-        self.tasks_to_run = set([t for t in self.tasks])
+        self.graph = TaskGraph(self.task_order)
+        self.__prioritize__()
+        self.tasks_to_run = set(self.task_order)
         self.tasks_running = set()
-        cur_cpu = 0
-        signal.signal(signal.SIGTERM, lambda *x: self.killRun())
+        self.available = []
+        self.ready = []
+        self.cur_cpu = 0
+        self.cur_mem = 0
+        self.cur_resources = {}
+        self.cur_scratch = 0
+        self.scratch_held = {}
+        self.ready_since = {}
+        self.run_start = self.last_progress = time.time()
+        self.__buildStreams__()
+        self.__makeAvailable__(self.__replayJournal__())
+        if(self.limits is not None):
+            self.log(self.limits.setup()+'\n\n')
+        if(self.monitor is not None):
+            self.monitor.publish(self.status())
+            self.log(self.monitor.start()+'\n\n')
+        watcher = ChildWatcher() if(self.event_driven) else ChildWatcher(ChildWatcher.MODE_POLL)
+        self.watcher = watcher
+        next_sample = 0
+        try:
+            old_term = signal.signal(signal.SIGTERM, self.__terminate__)
+            own_term = True
+        except ValueError:
+            # not in the main thread, leave SIGTERM to the caller
+            own_term = False
         try:
             # execute run
             while(len(self.tasks_to_run) > 0 or len(self.tasks_running) > 0):
-                size_tasks_to_run = len(self.tasks_to_run)
+                progressed = False
+                if(len(self.tasks_running) > 0 and time.time() >= next_sample):
+                    # memory sampling reads /proc, once per heartbeat is
+                    # plenty and keeps it out of busy cycles
+                    children = None if(CHILDREN_FILES) else proc_children()
+                    for t in self.tasks_running:
+                        t.sample(children)
+                    next_sample = time.time() + self.heartbeat
                 # handling finished tasks
                 for t in [task for task in self.tasks_running]:
-                    temp = self.task_status[t]
                     try:
                         if(t.finished()):
-                            self.tasks_running.remove(t)
-                            cur_cpu -= t.cpu
-                            temp['stop'] = int(time.time())
-                            temp['state'] = Supervisor.STATE_FINISHED
-                            temp['exit_code'] = t.exit_code
-                            h, m, s = time_to_hms(temp['stop'] - temp['start'])
-                            temp['message'] = 'Completed in {0!s}h {1!s}m {2!s}s'.format(h, m, s)
-                            self.log(t.name+':'+self.task_status[t]['state']+':'+time.asctime()+'\n\n')
+                            self.__taskFinished__(t)
+                            progressed = True
                     except (Task.ExitCodeException, Task.TaskException) as inst:
-                        cur_cpu -= t.cpu
-                        self.tasks_running.remove(t)
-                        self.errors.append(inst)
-                        temp['stop'] = int(time.time())
-                        temp['state'] = Supervisor.STATE_ERR
-                        temp['exit_code'] = t.exit_code
-                        h, m, s = time_to_hms(temp['stop'] - temp['start'])
-                        temp['message'] = 'Failed in {0!s}h {1!s}m {2!s}s'.format(h, m, s)
-                        self.log(t.name+':'+self.task_status[t]['state']+':'+time.asctime()+'\n\n')
-                        self.__removeTaskPath__(t)
+                        self.__taskFailed__(t, inst)
+                        progressed = True
                 # starting execution of tasks
-                for t in [task for task in self.tasks_to_run]:
-                    temp = self.task_status[t]
-                    if(t.cpu+cur_cpu > self.cpu):
-                        continue
-                    elif(not t.checkDependencies()):
-                        continue
-                    elif(not self.force_run and t.skipable()):
-                        temp['state'] = Supervisor.STATE_SKIPPED
-                        self.log(t.name+':'+temp['state']+'\n')
-                        self.tasks_to_run.remove(t)
-                        continue
-                    else:
-                        cur_cpu += t.cpu
-                        self.tasks_running.add(t)
-                        self.tasks_to_run.remove(t)
-                        t.start()
-                        temp['state'] = Supervisor.STATE_RUNNING
-                        temp['start'] = int(time.time())
-                        self.log(t.name+':'+self.task_status[t]['state']+':'+time.asctime()+'\n\n')
-                        self.log_file.write(t.command+'\n\n')
-                tasks_to_run_delta = size_tasks_to_run - len(self.tasks_to_run)
-                if(len(self.tasks_running) == 0 and tasks_to_run_delta == 0):
+                self.__checkAvailable__()
+                if(self.__startReady__()):
+                    progressed = True
+                if(self.monitor is not None):
+                    self.monitor.publish(self.status())
+                if(len(self.tasks_running) == 0 and not progressed):
                     break
-                time.sleep(self.delay)
+                if(watcher.mode == ChildWatcher.MODE_POLL):
+                    watcher.wait(self.delay)
+                elif(not progressed):
+                    watcher.wait(self.heartbeat)
             # handle all errors
             if(self.errors != [] or (len(self.tasks_running) == 0 and len(self.tasks_to_run) != 0)):
                 err_str = '\n\n'
@@ -450,28 +1424,652 @@ class Supervisor:
             self.log_file.write(str(inst))
             raise
         finally:
+            if(own_term):
+                # None means the old handler wasn't set from python
+                signal.signal(signal.SIGTERM, old_term if(old_term is not None) else signal.SIG_DFL)
+            watcher.close()
+            if(self.limits is not None):
+                self.limits.close()
+            if(self.monitor is not None):
+                self.monitor.close()
             self.send_email('', subject='MMT Finished')
 
+    def __taskFinished__(self, task):
+        ''' Helper function that records a successful task and releases its
+            dependents.
+        '''
+        self.watcher.unregister(task)
+        self.tasks_running.remove(task)
+        self.__release__(task)
+        temp = self.task_status[task]
+        temp['stop'] = int(time.time())
+        temp['state'] = Supervisor.STATE_FINISHED
+        temp['exit_code'] = task.exit_code
+        h, m, s = time_to_hms(temp['stop'] - temp['start'])
+        temp['message'] = 'Completed in {0!s}h {1!s}m {2!s}s'.format(h, m, s)
+        temp['usage'] = task.usage
+        self.log(task.name+':'+temp['state']+':'+time.asctime()+'\n\n')
+        self.log_file.write(task.name+':usage:'+format_usage(task.usage)+'\n\n')
+        self.__reportOrphans__(task)
+        self.__reportCpuUsed__(task)
+        self.__journal__(task, True)
+        if(self.manifest is not None):
+            self.manifest.record(task, self.__inputsOf__(task))
+        if(task in self.cache_keys):
+            try:
+                self.cache.store(self.cache_keys.pop(task), task.targets)
+            except (OSError, IOError) as inst:
+                self.log('Unable to cache {0!s}: {1!s}\n'.format(task.name, inst))
+        self.__makeAvailable__(self.graph.complete(task))
+
+    def __reportOrphans__(self, task):
+        ''' Helper function that logs the processes a task left running
+            after its command exited. The task has already stopped them, so
+            the cpus it held are really free again.
+        '''
+        self.task_status[task]['orphans'] = task.orphans
+        if(task.orphans != []):
+            self.log('{0!s}:orphans:stopped {1!s} process(es) left running: {2!s}\n\n'.format(
+                task.name, len(task.orphans), ' '.join(str(p) for p in task.orphans)))
+
+    def __reportCpuUsed__(self, task):
+        ''' Helper function that records the average number of cpus a task
+            kept busy over its run, and logs it if that is more than the
+            task declared, since an overcommitting task slows down every
+            other task on the host.
+        '''
+        temp = self.task_status[task]
+        wall = time.time() - task.start_time
+        if(task.usage == {} or wall <= 0):
+            temp['cpu_used'] = None
+            return
+        temp['cpu_used'] = round((task.usage['user_cpu'] + task.usage['sys_cpu']) / wall, 2)
+        if(temp['cpu_used'] > task.cpu * Supervisor.OVERCOMMIT and wall >= 1):
+            self.log('{0!s}:overcommit:used {1!s} cpus of the {2!s} allocated\n\n'.format(
+                task.name, temp['cpu_used'], task.cpu))
+
+    def __fetchCached__(self, task):
+        ''' Helper function that looks task up in the cache. On a hit the
+            targets are materialized and True is returned. On a miss the key
+            is kept so the targets can be stored once the task finishes.
+            With force_run the cache is never read, only refreshed.
+        '''
+        if(self.cache is None or task.targets == []):
+            return False
+        try:
+            key = self.cache.key(task, self.__inputsOf__(task))
+            if(not self.force_run and self.cache.fetch(key, task.targets)):
+                return True
+        except (OSError, IOError) as inst:
+            self.log('Unable to use the cache for {0!s}: {1!s}\n'.format(task.name, inst))
+            return False
+        self.cache_keys[task] = key
+        return False
+
+    def __taskFailed__(self, task, inst):
+        ''' Helper function that records a failed task and removes everything
+            downstream of it.
+        '''
+        self.watcher.unregister(task)
+        self.tasks_running.remove(task)
+        self.__release__(task)
+        self.cache_keys.pop(task, None)
+        self.errors.append(inst)
+        temp = self.task_status[task]
+        temp['stop'] = int(time.time())
+        temp['state'] = Supervisor.STATE_ERR
+        temp['exit_code'] = task.exit_code
+        h, m, s = time_to_hms(temp['stop'] - temp['start'])
+        temp['message'] = 'Failed in {0!s}h {1!s}m {2!s}s'.format(h, m, s)
+        temp['usage'] = task.usage
+        self.log(task.name+':'+temp['state']+':'+time.asctime()+'\n\n')
+        self.log_file.write(task.name+':usage:'+format_usage(task.usage)+'\n\n')
+        self.__reportOrphans__(task)
+        self.__reportCpuUsed__(task)
+        self.__journal__(task)
+        if(self.manifest is not None):
+            self.manifest.forget(task)
+        # the other end of a stream can't finish without this task
+        for m in self.gangs.get(task, []):
+            if(m in self.tasks_running):
+                m.killRun()
+        self.__removeTaskPath__(task)
+
+    def __makeAvailable__(self, tasks):
+        ''' Helper function for tasks whose in-graph dependencies are all
+            done. Tasks without callable or external dependencies go straight
+            onto the ready queue, the others are re-checked every cycle.
+        '''
+        for t in tasks:
+            if(self.graph.guards[t] or self.graph.external[t]):
+                self.available.append(t)
+            else:
+                self.ready.append(t)
+                self.ready_since[t] = time.time()
+
+    def __checkAvailable__(self):
+        ''' Helper function that moves available tasks whose callable and
+            external dependencies are satisfied onto the ready queue.
+        '''
+        still_waiting = []
+        for t in self.available:
+            if(self.graph.dependenciesMet(t)):
+                self.ready.append(t)
+                self.ready_since[t] = time.time()
+            else:
+                still_waiting.append(t)
+        self.available = still_waiting
+
+    def __estimateRuntime__(self, task):
+        ''' Helper function that returns the expected wall time of task in
+            seconds. The last recorded wall time is used when there is one,
+            otherwise the time is estimated from the size of the files the
+            task reads.
+        '''
+        if(task.name in self.history):
+            return max(self.history[task.name], 1)
+        size = 0
+        for p in self.__inputsOf__(task):
+            if(os.path.isfile(p)):
+                size += os.path.getsize(p)
+        per_cpu = Supervisor.RUNTIME_PER_GB * float(size) / 1e9 / max(task.cpu, 1)
+        return Supervisor.DEFAULT_RUNTIME + per_cpu
+
+    def __inputsOf__(self, task):
+        ''' Helper function that returns the paths task reads: task.inputs
+            if it declares them, otherwise the targets of its dependencies.
+        '''
+        if(task.inputs != []):
+            return task.inputs
+        return [p for d in self.graph.predecessors[task] for p in d.targets]
+
+    def __wasSkipped__(self, d):
+        ''' Helper function that returns True if the done dependency d, a
+            task or a barrier, was skipped. A barrier is checked once.
+        '''
+        if(isinstance(d, Barrier)):
+            if(d.skipped is None):
+                d.skipped = all(self.task_status[m]['state'] == Supervisor.STATE_SKIPPED for m in d.members)
+            return d.skipped
+        return self.task_status[d]['state'] == Supervisor.STATE_SKIPPED
+
+    def __prioritize__(self):
+        ''' Helper function that ranks every task by the length of the
+            longest path from it to the end of the pipeline.
+        '''
+        self.runtime = {t: self.__estimateRuntime__(t) for t in self.task_order}
+        self.priority = self.graph.criticalPaths(self.runtime)
+        self.order_index = {t: i for i, t in enumerate(self.task_order)}
+
+    def __priorityKey__(self, task):
+        if(self.shares is None):
+            return (-self.priority[task], self.order_index[task])
+        return (self.__groupLoad__(task.group), -self.priority[task], self.order_index[task])
+
+    def __groupLoad__(self, group):
+        ''' Helper function that returns the cpus held by the tasks of group
+            over its share.
+        '''
+        if(group is None):
+            return 0
+        return self.group_cpu.get(group, 0) / float(self.shares.get(group, 1))
+
+    def __fits__(self, task):
+        ''' Helper function that returns True if task can be started without
+            exceeding the cpu cap, the memory cap or the cap of any resource
+            it declares.
+        '''
+        return self.__fitsIn__(task, self.__free__())
+
+    def __free__(self):
+        ''' Helper function that returns the unused [cpu, mem, {resource: amount}]
+            of this supervisor. Resources without a cap are left out.
+        '''
+        resources = {r: self.resources[r] - self.cur_resources.get(r, 0) for r in self.resources}
+        return [self.cpu - self.cur_cpu, self.mem - self.cur_mem, resources]
+
+    def __fitsIn__(self, task, free):
+        if(task.cpu > free[0] or task.mem > free[1]):
+            return False
+        for r in task.resources:
+            if(r in free[2] and task.resources[r] > free[2][r]):
+                return False
+        return True
+
+    def __adjust__(self, free, task, sign):
+        free[0] += sign * task.cpu
+        free[1] += sign * task.mem
+        for r in task.resources:
+            if(r in free[2]):
+                free[2][r] += sign * task.resources[r]
+
+    def __reserve__(self, task):
+        ''' Helper function that builds the EASY backfill reservation for a
+            ready task that doesn't fit. Running tasks are released in the
+            order they are expected to end until task fits. Returns
+            [shadow, extra] where shadow is the time task is expected to
+            start and extra is what will still be free once it has.
+        '''
+        free = self.__free__()
+        shadow = time.time()
+        running = sorted(self.tasks_running, key=self.__expectedEnd__)
+        for r in running:
+            if(self.__fitsIn__(task, free)):
+                break
+            self.__adjust__(free, r, 1)
+            shadow = max(shadow, self.__expectedEnd__(r))
+        self.__adjust__(free, task, -1)
+        return [shadow, free]
+
+    def __expectedEnd__(self, task):
+        return self.task_status[task]['start'] + self.runtime[task]
+
+    def __backfillable__(self, task, reservation):
+        ''' Helper function that returns True if task can start ahead of the
+            reserved task without delaying it. A task that fits in the
+            leftover of the reservation uses it up.
+        '''
+        if(time.time() + self.runtime[task] <= reservation[0]):
+            return True
+        if(self.__fitsIn__(task, reservation[1])):
+            self.__adjust__(reservation[1], task, -1)
+            return True
+        return False
+
+    def __acquire__(self, task):
+        self.cur_cpu += task.cpu
+        self.group_cpu[task.group] = self.group_cpu.get(task.group, 0) + task.cpu
+        self.cur_mem += task.mem
+        for r in task.resources:
+            self.cur_resources[r] = self.cur_resources.get(r, 0) + task.resources[r]
+
+    def __release__(self, task):
+        self.cur_cpu -= task.cpu
+        self.group_cpu[task.group] -= task.cpu
+        self.cur_mem -= task.mem
+        for r in task.resources:
+            self.cur_resources[r] -= task.resources[r]
+        self.cur_scratch -= self.scratch_held.pop(task, 0)
+        if(self.limits is not None):
+            stats = self.limits.release(task)
+            if(stats.get('throttled', 0) > 0 or stats.get('oom_kills', 0) > 0):
+                self.log('{0!s}:limits:throttled for {1!s}s, {2!s} process(es) killed at memory.max\n\n'.format(
+                    task.name, stats['throttled'], stats['oom_kills']))
+
+    def __confine__(self, task, executor):
+        ''' Helper function that has self.limits choose the cores, and the
+            cgroup, of a task that runs on this host.
+        '''
+        if(self.limits is None):
+            return
+        if(task.executor is not None):
+            executor = task.executor
+        if(executor is not None and not isinstance(executor, LocalExecutor)):
+            return
+        shared = self.limits.acquire(task)
+        message = '{0!s}:cpus:{1!s} {2!s}'.format(
+            task.name, 'pinned to' if(self.limits.pin) else 'assigned', format_cores(task.cores))
+        if(shared > 0):
+            message += ', shared with {0!s} other task(s)'.format(shared)
+        self.log(message+'\n\n')
+
+    def __stage__(self, task, executor):
+        ''' Helper function that stages task in the scratch directory if it
+            asks for scratch space, runs on this host and the space it needs
+            isn't already promised to other staged tasks. Otherwise the task
+            runs in place.
+        '''
+        if(self.scratch is None or task.scratch <= 0 or task in self.gangs):
+            # the named pipes of a stream group are at the real paths
+            return
+        if(task.executor is not None):
+            executor = task.executor
+        if(executor is not None and not isinstance(executor, LocalExecutor)):
+            return
+        need = task.scratch * 2**30
+        if(task.stage_inputs):
+            need += sum(os.path.getsize(p) for p in task.inputs if(os.path.isfile(p)))
+        try:
+            st = os.statvfs(self.scratch)
+            if(st.f_bavail * st.f_frsize - self.cur_scratch < need):
+                return
+            staged = task.stage(self.scratch)
+        except (OSError, IOError) as inst:
+            self.log('Unable to stage {0!s} in {1!s}: {2!s}\n'.format(task.name, self.scratch, inst))
+            task.unstage(False)
+            return
+        if(staged):
+            self.cur_scratch += need
+            self.scratch_held[task] = need
+            self.task_status[task]['scratch'] = task.staged_dir
+            self.log(task.name+':staged in '+task.staged_dir+'\n')
+
+    def __chooseThreads__(self, task, waiting):
+        ''' Helper function that picks the thread count of an elastic task
+            about to start. The free cpus are shared evenly between the task
+            and the ready tasks queued behind it, without eating into the
+            minimum those tasks need, and clamped to the task's own
+            [min_cpu, max_cpu] range. A task alone in the queue gets every
+            free cpu. Backfilled tasks keep their minimum so they can't delay
+            a reservation.
+        '''
+        if(self.cpu == float('inf')):
+            task.setThreads(task.max_cpu)
+            return
+        free = self.cpu - self.cur_cpu
+        demand = sum(t.cpu for t in waiting)
+        share = int(free / (1 + len(waiting)))
+        task.setThreads(int(min(max(share, task.min_cpu), free - demand)))
+
+    def __startReady__(self):
+        ''' Helper function that walks the ready queue in priority order,
+            skipping or starting every task that fits under the cpu, memory
+            and resource caps. Elastic tasks are given their thread count as
+            they start. Tasks made ready by a skip are appended to the
+            queue and handled in the same walk. With backfill, the first task
+            that doesn't fit gets a reservation and later tasks must not
+            delay it. Tasks joined by stream edges wait until all of them
+            are ready, then are skipped or started together. With shares,
+            the rest of the queue is re-sorted after every start. Returns
+            True if any task was skipped or restored from the cache.
+        '''
+        self.ready.sort(key=self.__priorityKey__)
+        skipped = False
+        deferred = []
+        reservation = None
+        i = 0
+        while(i < len(self.ready)):
+            t = self.ready[i]
+            i += 1
+            if(t not in self.tasks_to_run):
+                # started or skipped along with its stream group
+                continue
+            if(t in self.gangs):
+                gang = self.gangs[t]
+                if(any(m not in self.ready for m in gang)):
+                    deferred.append(t)
+                elif(not self.force_run and all(self.__skipable__(m, gang) for m in gang)):
+                    for m in gang:
+                        self.__skip__(m)
+                    skipped = True
+                elif(not self.__gangFits__(gang)):
+                    deferred.append(t)
+                    if(self.backfill and reservation is None):
+                        reservation = self.__reserve__(t)
+                elif(reservation is not None and
+                     not all(self.__backfillable__(m, reservation) for m in gang)):
+                    deferred.append(t)
+                else:
+                    self.__startGang__(gang, self.ready[i:], reservation is None)
+                    self.__reorder__(i)
+                continue
+            temp = self.task_status[t]
+            if(not self.force_run and self.__skipable__(t)):
+                self.__skip__(t)
+                skipped = True
+            elif(self.__fetchCached__(t)):
+                t.soft_finished_status = True
+                temp['state'] = Supervisor.STATE_CACHED
+                temp['start'] = temp['stop'] = int(time.time())
+                temp['message'] = 'Restored from cache'
+                self.log(t.name+':'+temp['state']+'\n')
+                self.__journal__(t, True)
+                self.tasks_to_run.remove(t)
+                if(self.manifest is not None):
+                    self.manifest.record(t, self.__inputsOf__(t))
+                self.__makeAvailable__(self.graph.complete(t))
+                skipped = True
+            elif(not self.__fits__(t)):
+                deferred.append(t)
+                if(self.backfill and reservation is None):
+                    reservation = self.__reserve__(t)
+            elif(reservation is not None and not self.__backfillable__(t, reservation)):
+                deferred.append(t)
+            else:
+                self.__launch__(t, self.ready[i:], self.executor, reservation is None)
+                self.__reorder__(i)
+        self.ready = [t for t in deferred if(t in self.tasks_to_run)]
+        return skipped
+
+    def __reorder__(self, i):
+        ''' Helper function that re-sorts the part of the ready queue not
+            yet walked after a start, since with shares the order depends on
+            the cpus each project holds.
+        '''
+        if(self.shares is not None):
+            self.ready[i:] = sorted(self.ready[i:], key=self.__priorityKey__)
+
+    def __skip__(self, task):
+        ''' Helper function that marks a ready task as skipped and releases
+            its dependents.
+        '''
+        temp = self.task_status[task]
+        task.soft_finished_status = True
+        if(self.manifest is not None and not self.manifest.known(task)):
+            self.manifest.record(task, self.__inputsOf__(task))
+        temp['state'] = Supervisor.STATE_SKIPPED
+        self.log(task.name+':'+temp['state']+'\n')
+        self.__journal__(task, True)
+        self.tasks_to_run.remove(task)
+        self.__makeAvailable__(self.graph.complete(task))
+
+    def __launch__(self, task, waiting, executor, elastic=True):
+        ''' Helper function that starts a ready task with executor. An
+            elastic task gets its thread count first, unless elastic is
+            False, and an interrupted task with a resume_command is resumed.
+        '''
+        temp = self.task_status[task]
+        if(self.journal is not None and task.resume_command is not None and
+           self.journal.state(task) in (Supervisor.STATE_RUNNING, Supervisor.STATE_INTERRUPTED) and
+           not self.journal.last(task).get('scratch')):
+            # a staged run left its checkpoints in scratch, they are gone
+            task.resume()
+            self.log(task.name+':resuming interrupted run\n')
+        temp['scratch'] = None
+        if(not task.resuming):
+            self.__stage__(task, executor)
+        if(task.elastic() and elastic):
+            self.__chooseThreads__(task, waiting)
+        self.__acquire__(task)
+        self.__confine__(task, executor)
+        temp['wait'] = round(time.time() - self.ready_since.pop(task, time.time()), 1)
+        self.tasks_running.add(task)
+        self.tasks_to_run.remove(task)
+        if(self.manifest is not None):
+            self.manifest.forget(task)
+        task.start(executor)
+        self.watcher.register(task)
+        temp['state'] = Supervisor.STATE_RUNNING
+        temp['start'] = int(time.time())
+        self.__journal__(task)
+        self.log(task.name+':'+temp['state']+':'+time.asctime()+'\n\n')
+        if(task.priority != Task.PRIORITY_NORMAL):
+            self.log(task.name+':priority:'+task.priority+'\n\n')
+        self.log_file.write(task.command+'\n\n')
+
+    def __buildStreams__(self):
+        ''' Helper function that turns the paths named in Task.streams into
+            stream edges of the graph, and groups the tasks they join into
+            gangs that are started together. self.gangs maps each such task
+            to its gang, in topological order.
+        '''
+        self.gangs = {}
+        producers = {}
+        readers = {}
+        for t in self.task_order:
+            for p in t.targets:
+                producers[p] = t
+            for p in set(t.inputs + t.streams):
+                readers.setdefault(p, []).append(t)
+        for c in self.task_order:
+            for p in c.streams:
+                prod = producers.get(p)
+                if(prod is None or not self.graph.dependsOn(c, prod)):
+                    err_mess = ('Task {0!s} streams {1!s}, which is not a target of any of its '
+                                'dependencies.').format(c.name, p)
+                    raise Exception(err_mess)
+                if(len(readers[p]) > 1):
+                    err_mess = ('Task {0!s} streams {1!s}, so it can\'t also be read by {2!s}.'
+                                ).format(c.name, p, ', '.join(r.name for r in readers[p] if(r is not c)))
+                    raise Exception(err_mess)
+                self.graph.stream(prod, c)
+                gang = self.gangs.get(prod, [prod])
+                for m in self.gangs.get(c, [c]):
+                    if(m not in gang):
+                        gang.append(m)
+                for m in gang:
+                    self.gangs[m] = gang
+        order = {t: i for i, t in enumerate(self.graph.topologicalOrder())}
+        for gang in self.gangs.values():
+            gang.sort(key=lambda t: order.get(t, 0))
+
+    def __gangFits__(self, gang):
+        ''' Helper function that returns True if every task of gang can be
+            started at once.
+        '''
+        free = self.__free__()
+        for m in gang:
+            if(not self.__fitsIn__(m, free)):
+                return False
+            self.__adjust__(free, m, -1)
+        return True
+
+    def __startGang__(self, gang, waiting, elastic):
+        ''' Helper function that creates a named pipe at every streamed path
+            of gang, then starts all of its tasks. Stream groups run on this
+            host, whatever the supervisor's executor, since a pipe can't be
+            shared with another machine.
+        '''
+        for m in gang:
+            for p in m.streams:
+                if(os.path.isdir(p)):
+                    shutil.rmtree(p)
+                elif(os.path.lexists(p)):
+                    os.remove(p)
+                os.mkfifo(p)
+        for j, m in enumerate(gang):
+            self.__launch__(m, gang[j + 1:] + waiting, LOCAL_EXECUTOR, elastic)
+
+    def __skipable__(self, task, gang=()):
+        ''' Graph based equivalent of task.skipable(). A ready task is
+            skippable if it has not been executed, every in-graph dependency
+            was skipped, every external dependency is skipable and all of its
+            targets exist. With a manifest, its command, inputs and targets
+            must also match the manifest's record of it. Dependencies in
+            gang, the stream group being skipped with task, are ignored.
+        '''
+        if(task.exit_code is not None):
+            return False
+        if(task.soft_finished_status):
+            return True
+        for d in self.graph.predecessors[task]:
+            if(d in gang):
+                continue
+            if(not self.__wasSkipped__(d)):
+                return False
+        for d in self.graph.external[task]:
+            if(not d.skipable()):
+                return False
+        if(task.targets == []):
+            return False
+        for t in task.targets:
+            if(not os.path.exists(t)):
+                return False
+        if(self.manifest is not None and self.manifest.known(task)):
+            return self.manifest.matches(task, self.__inputsOf__(task))
+        return True
+
+    def __replayJournal__(self):
+        ''' Helper function that restores every task the journal shows as
+            finished, in one walk of the graph in topological order, and
+            returns the tasks that are ready once they are done. A task is
+            restored if its last recorded state is executed, skipped or
+            cached, its targets have the fingerprints recorded then, all of
+            its in-graph dependencies were restored, its external
+            dependencies are skipable and, with a manifest, the manifest
+            doesn't say otherwise. Stream groups are only restored whole.
+        '''
+        roots = self.graph.roots()
+        if(self.journal is None or self.force_run):
+            return roots
+        restored = set()
+        ready = list(roots)
+        for t in self.graph.topologicalOrder(True):
+            if(any(d not in restored for d in self.graph.predecessors[t])):
+                continue
+            if(isinstance(t, Barrier)):
+                # done once its members are, see TaskGraph.complete
+                restored.add(t)
+                continue
+            if(not all(self.__journaled__(m) for m in self.gangs.get(t, [t]))):
+                continue
+            record = self.journal.last(t)
+            restored.add(t)
+            t.soft_finished_status = True
+            temp = self.task_status[t]
+            for key in ('start', 'stop', 'exit_code', 'usage'):
+                temp[key] = record.get(key)
+            temp['state'] = Supervisor.STATE_SKIPPED
+            temp['message'] = 'Restored from journal'
+            self.tasks_to_run.remove(t)
+            ready.extend(self.graph.complete(t))
+        if(restored):
+            self.log('Restored {0!s} finished tasks from the journal\n'.format(
+                len([t for t in restored if(not isinstance(t, Barrier))])))
+        return [t for t in ready if(t not in restored)]
+
+    def __journaled__(self, task):
+        ''' Helper function that returns True if the journal shows task
+            finished with the targets it has now, and nothing else says it
+            must run again.
+        '''
+        record = self.journal.last(task)
+        done = (Supervisor.STATE_FINISHED, Supervisor.STATE_SKIPPED, Supervisor.STATE_CACHED)
+        if(record is None or record['state'] not in done):
+            return False
+        if(any(not d.skipable() for d in self.graph.external[task])):
+            return False
+        if(not self.journal.targetsMatch(task)):
+            return False
+        if(self.manifest is not None and self.manifest.known(task) and
+           not self.manifest.matches(task, self.__inputsOf__(task))):
+            return False
+        return True
+
+    def __journal__(self, task, targets=False):
+        ''' Helper function called on every state transition of task. It
+            appends the current status of task to the journal, with its
+            target fingerprints if targets is True.
+        '''
+        self.last_progress = time.time()
+        if(self.journal is not None):
+            self.journal.append(task, self.task_status[task], targets)
+
+    def __terminate__(self, signum, frame):
+        ''' SIGTERM handler. Raising unwinds run(), which kills the running
+            tasks.
+        '''
+        raise SystemExit('{0!s} received signal {1!s}'.format(self.name, signum))
+
     def __removeTaskPath__(self, task):
         ''' Helper function that removes tasks that can no longer be executed
             from the sueprvisors list of tasks that need o be executed.
-            Basically, anything down stream of task is removed.
-        '''
-        flag = True
-        removed = set([task])
-        check_intersection = lambda s, l : any(e in s for e in l)
-        while(flag):
-            flag = False
-            for t in [t for t in self.tasks_to_run]:
-                sup_deps = [d for d in t.dependencies if(isinstance(d, Supervisor))]
-                sup_checks = [check_intersection(removed, s.tasks) for s in sup_deps]
-                if(check_intersection(removed, t.dependencies) or any(sup_checks)):
-                    temp = self.task_status[t]
-                    self.tasks_to_run.remove(t)
-                    removed.add(t)
-                    temp['message'] = 'Never Started'
-                    temp['state'] = Supervisor.STATE_REMOVED
-                    flag = True
+            Basically, anything down stream of task is removed, along with
+            the stream groups of the removed tasks and what is down stream
+            of them.
+        '''
+        pending = [task]
+        while(pending):
+            for t in self.graph.downstream(pending.pop()):
+                for m in self.gangs.get(t, [t]):
+                    if(m in self.tasks_to_run):
+                        temp = self.task_status[m]
+                        self.tasks_to_run.remove(m)
+                        temp['message'] = 'Never Started'
+                        temp['state'] = Supervisor.STATE_REMOVED
+                        self.__journal__(m)
+                        if(m is not t):
+                            pending.append(m)
 
     def log(self, message):
         ''' Convienvince funciton that allows for the SUpervisor to write
@@ -510,6 +2108,39 @@ class Supervisor:
                 return False
         return True
 
+    def status(self):
+        ''' Returns a json friendly snapshot of the run: the number of tasks
+            in each state (tasks yet to start are split into 'ready', queued
+            for cpus, memory or resources, and 'waiting' on dependencies),
+            the state and times of every task, the cpu and mem in use
+            against the caps, the last failures, and when a task last
+            changed state. Times are seconds since the epoch, wait is how
+            long a started task spent in the ready queue.
+        '''
+        counts = {}
+        tasks = []
+        failures = []
+        for t in self.task_order:
+            temp = self.task_status[t]
+            state = temp['state']
+            ready = None
+            if(state == Supervisor.STATE_INITIALIZED):
+                ready = self.ready_since.get(t)
+                state = 'ready' if(ready is not None) else 'waiting'
+            counts[state] = counts.get(state, 0) + 1
+            tasks.append({'name': t.name, 'state': state, 'cpu': t.cpu, 'mem': t.mem,
+                          'start': temp['start'], 'stop': temp['stop'], 'ready': ready,
+                          'wait': temp['wait'], 'exit_code': temp['exit_code']})
+            if(state == Supervisor.STATE_ERR):
+                failures.append({'name': t.name, 'message': temp['message'],
+                                 'exit_code': temp['exit_code'], 'stop': temp['stop']})
+        failures.sort(key=lambda f: f['stop'])
+        return {'name': self.name, 'started': self.run_start, 'last_progress': self.last_progress,
+                'counts': counts, 'tasks': tasks, 'failed': len(failures),
+                'failures': failures[-Supervisor.RECENT_FAILURES:],
+                'cpu': {'in_use': self.cur_cpu, 'cap': self.cpu},
+                'mem': {'in_use': self.cur_mem, 'cap': self.mem}}
+
     def send_email(self, message, subject=''):
         ''' A convienince function that allows for the sending of emails to
             the Supervisor's self.email adress. If self.email is none, the
@@ -526,9 +2157,24 @@ class Supervisor:
             subprocess.call(cmd, shell=True)
 
     def killRun(self):
-        ''' safely stops all running tasks and halts the run.
+        ''' safely stops all running tasks and halts the run. Stopped tasks
+            are recorded as interrupted.
         '''
+        # every task is asked to stop before any is waited for, so their
+        # grace periods run side by side
+        for t in self.tasks_running:
+            if(hasattr(t.process, 'terminate')):
+                try:
+                    t.process.terminate()
+                except OSError:
+                    pass
         for t in self.tasks_running:
+            temp = self.task_status[t]
+            if(temp['state'] == Supervisor.STATE_RUNNING):
+                temp['state'] = Supervisor.STATE_INTERRUPTED
+                temp['stop'] = int(time.time())
+                temp['message'] = 'Interrupted'
+                self.__journal__(t)
             t.killRun()
         self.running = []
 
@@ -538,21 +2184,42 @@ class Supervisor:
             that the supervisor managed.
         '''
         if(isinstance(task, Supervisor)):
-            for t in task.tasks:
-                t.dependencies.extend(task.dependencies)
+            for t in task.task_order:
+                new_deps = [d for d in task.dependencies if(d not in t.dependencies)]
+                if(new_deps):
+                    # dependency lists are often shared between tasks, so
+                    # build a new list rather than extending in place
+                    t.dependencies = t.dependencies + new_deps
                 self.add_task(t)
         if(isinstance(task, Task)):
-            if(task.cpu > self.cpu):
+            if(task.min_cpu > self.cpu):
                 err_mess = ('Task {0!s} has a higher cpu than this supervisor, {1!s}.\nYou '
                             'must increase this supervisor\'s cpu or decrease {0!s}\'s cpu.')
                 err_mess = err_mess.format(task.name, self.name)
                 raise Exception(err_mess)
+            if(task.mem > self.mem):
+                err_mess = ('Task {0!s} needs more memory ({1!s}G) than this supervisor, {2!s}, '
+                            'allows ({3!s}G).\nYou must increase this supervisor\'s mem or '
+                            'decrease {0!s}\'s mem.')
+                err_mess = err_mess.format(task.name, task.mem, self.name, self.mem)
+                raise Exception(err_mess)
+            for r in task.resources:
+                if(task.resources[r] > self.resources.get(r, float('inf'))):
+                    err_mess = ('Task {0!s} needs {1!s} of resource {2!s} but this supervisor, '
+                                '{3!s}, only has {4!s}.')
+                    err_mess = err_mess.format(task.name, task.resources[r], r, self.name,
+                                               self.resources[r])
+                    raise Exception(err_mess)
             if(task.name in self.task_map):
                 warnings.warn('A task named '+task.name+' already exists.')
             self.task_map[task.name] = task
+            if(task not in self.tasks):
+                self.task_order.append(task)
             self.tasks.add(task)
             self.task_status[task] = {'state': Supervisor.STATE_INITIALIZED, 'exit_code': None,
-                                      'message': None, 'start': None, 'stop': None}
+                                      'message': None, 'start': None, 'stop': None, 'usage': {},
+                                      'scratch': None, 'orphans': [], 'cpu_used': None,
+                                      'priority': task.priority, 'wait': None}
             self.targets.extend(task.targets)
 
     def __str__(self):
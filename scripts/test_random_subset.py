@@ -0,0 +1,84 @@
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'util'))
+import random_subset
+
+
+class RandomSubsetTest(unittest.TestCase):
+    ''' Samples two small paired libraries, of 300 and 100 pairs, with every
+        path random_subset.main can take to an exact sample.
+    '''
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='test_random_subset_')
+        rng = random.Random(11)
+        # read name: (read 1, read 2)
+        self.mates = {}
+        self.fq1 = []
+        self.fq2 = []
+        for lib, pairs in enumerate((300, 100)):
+            paths = [self.path('lib{0!s}_{1!s}.fq'.format(lib, m)) for m in (1, 2)]
+            files = [open(p, 'w') for p in paths]
+            for i in range(pairs):
+                name = 'l{0!s}_{1!s}'.format(lib, i)
+                seqs = [''.join(rng.choice('ACGT') for k in range(rng.randint(20, 40))) for m in (1, 2)]
+                self.mates[name] = tuple(seqs)
+                for m, (f, seq) in enumerate(zip(files, seqs)):
+                    f.write('@{0!s}/{1!s}\n{2!s}\n+\n{3!s}\n'.format(name, m + 1, seq, 'I' * len(seq)))
+            for f in files:
+                f.close()
+            self.fq1.append(paths[0])
+            self.fq2.append(paths[1])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def sample(self, n, seed='a seed', **kwargs):
+        ''' Returns the pairs main() keeps, as a list of (name, read 1,
+            read 2), checking the two outputs hold the mates of each other.
+        '''
+        random_subset.main(self.fq1, self.fq2, n, self.path('s_1.fq'), self.path('s_2.fq'), seed=seed, **kwargs)
+        reads = []
+        for m in (1, 2):
+            with open(self.path('s_{0!s}.fq'.format(m))) as f:
+                lines = f.read().split()
+            reads.append([(lines[i][1:].rsplit('/', 1), lines[i + 1]) for i in range(0, len(lines), 4)])
+        self.assertEqual(len(reads[0]), len(reads[1]))
+        pairs = []
+        for ((name1, m1), seq1), ((name2, m2), seq2) in zip(*reads):
+            self.assertEqual((name1, m1, m2), (name2, '1', '2'))
+            self.assertEqual((seq1, seq2), self.mates[name1])
+            pairs.append((name1, seq1, seq2))
+        self.assertEqual(len(set(pairs)), len(pairs))
+        return pairs
+
+    def test_exact_sample_size(self):
+        self.assertEqual(len(self.sample(50)), 50)
+        self.assertEqual(len(self.sample(400)), 400)
+        self.assertEqual(len(self.sample(50, cpu=2, chunk_size=500)), 50)
+        self.assertEqual(len(self.sample(400, cpu=2, chunk_size=500)), 400)
+
+    def test_same_seed_same_sample(self):
+        for kwargs in ({}, {'cpu': 2, 'chunk_size': 500}, {'per_library': True, 'chunk_size': 500}):
+            first = self.sample(50, **kwargs)
+            self.assertEqual(self.sample(50, **kwargs), first)
+            self.assertNotEqual(self.sample(50, seed='another seed', **kwargs), first)
+
+    def test_per_library_mates_stay_in_step(self):
+        pairs = self.sample(60, cpu=2, per_library=True, chunk_size=500)
+        libraries = [name.split('_')[0] for name, seq1, seq2 in pairs]
+        self.assertEqual((libraries.count('l0'), libraries.count('l1')), (30, 30))
+        # joined back in input order
+        self.assertEqual(pairs, sorted(pairs, key=lambda p: (p[0].split('_')[0], int(p[0].split('_')[1]))))
+
+
+if(__name__ == '__main__'):
+    unittest.main()
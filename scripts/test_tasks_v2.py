@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import signal
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from tasks_v2 import Task, Supervisor
+from task_journal import TaskJournal
+
+
+def journal_run(out_dir):
+    ''' Returns the Supervisor killed and then resumed by
+        test_killed_run_resumes_from_journal. b waits for the file go.
+    '''
+    path = lambda name: os.path.join(out_dir, name)
+    a = Task('echo a > {0!s}'.format(path('a')), name='a', targets=[path('a')])
+    b = Task('while [ ! -e {0!s} ]; do sleep 0.1; done; touch {1!s}'.format(path('go'), path('b')),
+             name='b', targets=[path('b')], dependencies=[a])
+    return Supervisor(tasks=[a, b], log=path('log'), journal=TaskJournal(path('journal')))
+
+
+class SupervisorRunTest(unittest.TestCase):
+    ''' Runs small Supervisors over sleep and true commands.
+    '''
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='test_tasks_v2_')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def started(self):
+        ''' Returns the names the tasks logged to the order file as they
+            started, in order.
+        '''
+        with open(self.path('order')) as f:
+            return f.read().split()
+
+    def journaled(self, name):
+        ''' Returns the last state the journal holds for the task name,
+            read without compacting it under a running Supervisor.
+        '''
+        state = None
+        if(os.path.isfile(self.path('journal'))):
+            with open(self.path('journal')) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a line still being written
+                        continue
+                    if(record['task'] == name):
+                        state = record['state']
+        return state
+
+    def logged(self, name, seconds):
+        return Task('echo {0!s} >> {1!s}; sleep {2!s}'.format(name, self.path('order'), seconds), name=name)
+
+    def test_backfill_does_not_starve_wide_task(self):
+        # once p is done, the 2 cpu task w heads the queue while n0 holds a
+        # cpu. The narrow tasks would keep that cpu busy and w waiting until
+        # they all ran, with backfill none of them can finish before n0 does
+        # so w starts next
+        p = Task('true', name='p')
+        w = self.logged('w', 0.3)
+        w.cpu = 2
+        w.dependencies = [p]
+        narrow = [self.logged('n{0!s}'.format(i), 0.3) for i in range(6)]
+        history = {t.name: 0.3 for t in narrow}
+        history.update({'p': 0.01, 'w': 10})
+        s = Supervisor(tasks=[p, w] + narrow, cpu=2, backfill=True, history=history,
+                       log=self.path('log'), force_run=True)
+        s.run()
+        order = self.started()
+        self.assertEqual(sorted(order), sorted(['w'] + [t.name for t in narrow]))
+        self.assertEqual(order[1], 'w')
+
+    def test_killed_run_resumes_from_journal(self):
+        code = 'import sys, test_tasks_v2; test_tasks_v2.journal_run(sys.argv[1]).run()'
+        proc = subprocess.Popen([sys.executable, '-c', code, self.dir],
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        end = time.time() + 30
+        while(time.time() < end):
+            if(self.journaled('b') == Supervisor.STATE_RUNNING):
+                break
+            time.sleep(0.1)
+        proc.terminate()
+        proc.wait()
+        self.assertEqual(self.journaled('b'), Supervisor.STATE_INTERRUPTED)
+        open(self.path('go'), 'w').close()
+        s = journal_run(self.dir)
+        s.run()
+        a, b = s.task_order
+        self.assertEqual(s.task_status[a]['state'], Supervisor.STATE_SKIPPED)
+        self.assertEqual(s.task_status[a]['message'], 'Restored from journal')
+        self.assertEqual(s.task_status[b]['state'], Supervisor.STATE_FINISHED)
+
+    def test_run_restores_sigterm_handler(self):
+        handler = lambda signum, frame: None
+        previous = signal.signal(signal.SIGTERM, handler)
+        try:
+            Supervisor(tasks=[Task('true', name='t')], log=self.path('log'), force_run=True).run()
+            self.assertIs(signal.getsignal(signal.SIGTERM), handler)
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+
+    def run_gang(self, producer, consumer):
+        ''' Runs producer, writing the target out, streamed into consumer.
+            Returns the pair of their states and the time the run took.
+        '''
+        out = self.path('out')
+        p = Task(producer.format(out=out), name='p', targets=[out])
+        c = Task(consumer.format(out=out, copy=self.path('copy')), name='c', dependencies=[p], streams=[out])
+        s = Supervisor(tasks=[p, c], log=self.path('log'), force_run=True)
+        start = time.time()
+        self.assertRaises(Exception, s.run)
+        return s.task_status[p]['state'], s.task_status[c]['state'], time.time() - start
+
+    def test_failing_consumer_kills_producer(self):
+        p, c, elapsed = self.run_gang('sleep 30; echo x > {out}', 'exit 3')
+        self.assertEqual((p, c), (Supervisor.STATE_ERR, Supervisor.STATE_ERR))
+        self.assertLess(elapsed, 10)
+
+    def test_failing_producer_kills_blocked_consumer(self):
+        # the consumer would wait forever for a writer to open the pipe
+        p, c, elapsed = self.run_gang('exit 3', 'cat {out} > {copy}')
+        self.assertEqual((p, c), (Supervisor.STATE_ERR, Supervisor.STATE_ERR))
+        self.assertLess(elapsed, 10)
+
+    def test_removed_consumer_removes_producer(self):
+        # c can't start once e fails, so neither can b, which only feeds it,
+        # nor what depends on b
+        out = self.path('out')
+        e = Task('exit 3', name='e')
+        b = Task('echo x > {0!s}'.format(out), name='b', targets=[out])
+        c = Task('cat {0!s}'.format(out), name='c', dependencies=[b, e], streams=[out])
+        d = Task('true', name='d', dependencies=[b])
+        s = Supervisor(tasks=[e, b, c, d], log=self.path('log'), force_run=True)
+        try:
+            s.run()
+        except Exception as inst:
+            message = str(inst)
+        self.assertEqual([s.task_status[t]['state'] for t in (b, c, d)], [Supervisor.STATE_REMOVED] * 3)
+        self.assertNotIn('Unable to resolve dependencies', message)
+
+
+if(__name__ == '__main__'):
+    unittest.main()
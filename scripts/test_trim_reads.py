@@ -0,0 +1,82 @@
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'util'))
+import trim_reads
+
+
+ADAPTER = 'AGATCGGAAGAGCACACGTCTGAACTCCAGTCAC'
+GOOD = 'I'
+BAD = '#'
+
+
+class TrimReadsTest(unittest.TestCase):
+    ''' Trims a small pair of fastq files, one pair per case, with the
+        default ILLUMINACLIP, LEADING, TRAILING, SLIDINGWINDOW and MINLEN.
+    '''
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='test_trim_reads_')
+        rng = random.Random(7)
+        bases = lambda n: ''.join(rng.choice('ACGT') for i in range(n))
+        self.seqs = {}
+        # name: (read 1, quality 1, read 2, quality 2)
+        self.cases = {
+            'clean': (bases(60), GOOD * 60, bases(60), GOOD * 60),
+            # runs 20 bases into the adapter, cut where it starts
+            'adapter': (bases(40) + ADAPTER[:20], GOOD * 60, bases(60), GOOD * 60),
+            # TRAILING cuts the tail of read 1, 45 bases are left
+            'tail': (bases(60), GOOD * 45 + BAD * 15, bases(60), GOOD * 60),
+            # read 2 is 20 bases after TRAILING, below MINLEN
+            'short': (bases(60), GOOD * 60, bases(60), GOOD * 20 + BAD * 40),
+            'dropped': (bases(60), BAD * 60, bases(60), BAD * 60),
+        }
+        self.order = ['clean', 'adapter', 'tail', 'short', 'dropped']
+        for m in (1, 2):
+            with open(self.path('in_{0!s}.fq'.format(m)), 'w') as f:
+                for name in self.order:
+                    seq, qual = self.cases[name][2 * m - 2:2 * m]
+                    f.write('@{0!s}/{1!s}\n{2!s}\n+\n{3!s}\n'.format(name, m, seq, qual))
+        with open(self.path('adapters.fa'), 'w') as f:
+            f.write('>TruSeq3_IndexedAdapter\n{0!s}\n'.format(ADAPTER))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def reads(self, name):
+        ''' Returns the (name, sequence, quality) of every read in the fastq
+            output name.
+        '''
+        with open(self.path(name)) as f:
+            lines = f.read().split()
+        return [(lines[i][1:], lines[i + 1], lines[i + 3]) for i in range(0, len(lines), 4)]
+
+    def trim(self, **kwargs):
+        trim_reads.main(self.path('in_1.fq'), self.path('p_1.fq'), self.path('in_2.fq'), self.path('p_2.fq'),
+                        self.path('u_1.fq'), self.path('u_2.fq'), adapters=self.path('adapters.fa'), **kwargs)
+        return [self.reads(n) for n in ('p_1.fq', 'p_2.fq', 'u_1.fq', 'u_2.fq')]
+
+    def test_paired_and_orphan_outputs(self):
+        p1, p2, u1, u2 = self.trim()
+        c = self.cases
+        self.assertEqual(p1, [('clean/1', c['clean'][0], c['clean'][1]),
+                              ('adapter/1', c['adapter'][0][:40], GOOD * 40),
+                              ('tail/1', c['tail'][0][:45], GOOD * 45)])
+        self.assertEqual(p2, [(n + '/2', c[n][2], c[n][3]) for n in ('clean', 'adapter', 'tail')])
+        self.assertEqual(u1, [('short/1', c['short'][0], c['short'][1])])
+        self.assertEqual(u2, [])
+
+    def test_chunks_are_joined_in_input_order(self):
+        # a chunk of about one pair each, trimmed by a pool
+        self.assertEqual(self.trim(cpu=2, chunk_size=100), self.trim())
+
+
+if(__name__ == '__main__'):
+    unittest.main()
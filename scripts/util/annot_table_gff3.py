@@ -13,6 +13,7 @@ import csv
 import os
 from itertools import count
 import re
+import seqio
 
 gff_colnames = ['seqid', 'source', 'type', 'start', 'end',
                 'score', 'strand', 'phase', 'attributes']
@@ -29,22 +30,11 @@ ID_GEN = count()
 
 
 def fasta_to_gff3(fasta):
-    with open(fasta, 'r') as f:
-        lens = []
-        keys = []
-        length = 0
-        transcriptid = None
-        for line in f:
-            if line.startswith('>'):
-                if length > 0:
-                    lens.append(length)
-                    keys.append(transcriptid)
-                    length = 0
-                transcriptid = line.split(' ')[0][1:]
-            else:
-                length += len(line.strip())
-        lens.append(length)
-        keys.append(transcriptid)
+    lens = []
+    keys = []
+    for header, seq in seqio.fasta_records(fasta):
+        lens.append(len(seq))
+        keys.append(seqio.text(header.split(b' ')[0][1:]))
     retDF = pd.DataFrame(columns=gff_colnames)
     retDF['seqid'] = keys
     retDF['source'] = ['Trinity'] * len(keys)  # should allow rnaspades as well
@@ -155,7 +145,17 @@ def file_check(f):
     return f is not None and os.path.exists(f)
 
 
-def main(args):
+def main(args=None, **options):
+    ''' Builds the gff3 annotation file. Takes either the argparse.Namespace
+        of the command line, or its options as keyword arguments, so it can
+        be called from another python process. Unset options are None.
+    '''
+    if(args is None):
+        args = arg_parser().parse_args([])
+        for k in options:
+            if(not hasattr(args, k)):
+                raise TypeError('main() got an unexpected option ' + k)
+            setattr(args, k, options[k])
     gff3_entries = []
     gff3_entries.append(pd.DataFrame(columns=gff_colnames))
     if(file_check(args.fasta)):
@@ -184,7 +184,7 @@ def main(args):
     return df
 
 
-if __name__ == '__main__':
+def arg_parser():
     psr = argparse.ArgumentParser(description=(
         'combine annotations into a table'))
     psr.add_argument('--fasta', help='fasta assembly file')
@@ -220,5 +220,9 @@ if __name__ == '__main__':
     # outfile name
     psr.add_argument('--outfile', metavar='outfile', help='output filename')
 
-    args = psr.parse_args()
+    return psr
+
+
+if __name__ == '__main__':
+    args = arg_parser().parse_args()
     main(args)
@@ -1,19 +1,11 @@
 import pandas as pd
 import argparse
+import seqio
 
 def get_transcript_length(fasta):
-    with open(fasta, 'r') as f:
-        lengths = {}
-        length = 0
-        for line in f:
-            if line.startswith('>'):
-                if length > 0:
-                    lengths[transcriptid] = length
-                    length = 0
-                transcriptid = line.split(' ')[0][1:]
-            else:
-                length += len(line.strip())
-        lengths[transcriptid] = length
+    lengths = {}
+    for header, seq in seqio.fasta_records(fasta):
+        lengths[seqio.text(header.split(b' ')[0][1:])] = len(seq)
     lenSeries = pd.Series(lengths, name="Transcript_Length")
     return(lenSeries)
 
@@ -124,7 +116,17 @@ def get_tmhmm(tmhmm_file, AA_threshold = 1):
     return(infoToAdd)
 
 
-def main(args):
+def main(args=None, **options):
+    ''' Builds the annotation table. Takes either the argparse.Namespace
+        of the command line, or its options as keyword arguments, so it can
+        be called from another python process. Unset options are None.
+    '''
+    if(args is None):
+        args = arg_parser().parse_args([])
+        for k in options:
+            if(not hasattr(args, k)):
+                raise TypeError('main() got an unexpected option ' + k)
+            setattr(args, k, options[k])
     #initial setup
     initDF = pd.read_table(args.geneTransMap, index_col=1, header=None)
     initDF.rename(columns = {0:'Gene_id'}, inplace=True)
@@ -223,7 +225,7 @@ def get_eggNOG(initDF, sp2nog, nog2function):
     return(initDF)
 
 
-if __name__ == '__main__':
+def arg_parser():
     psr = argparse.ArgumentParser(description='combine annotations into a table')
     psr.add_argument('--fasta',help='fasta assembly file')
     psr.add_argument('--geneTransMap',help='tab separated gene to transcript conversion file')
@@ -260,5 +262,9 @@ if __name__ == '__main__':
     #outfile name
     psr.add_argument('--outfile',metavar='outfile',help='output filename')
 
-    args = psr.parse_args()
+    return psr
+
+
+if __name__ == '__main__':
+    args = arg_parser().parse_args()
     main(args)
@@ -20,6 +20,7 @@ Usage Message :
 
 import argparse
 import json
+import seqio
 
 '''	Computes the mean of an iterable l.
 '''
@@ -50,25 +51,10 @@ def fasta_nx(lens,x):
 		if(count>nval):
 			return entrylen 
 
-'''	Simple iterator over fasta file entries in rf.
-	PARAMS:
-		rf : an opened readable fasta file.
-'''
-def fa_parser(rf):
-	header = rf.readline().rstrip()
-	while(header!=''):
-		templine = rf.readline().rstrip()
-		sequence = ''
-		while(templine!='' and templine[0]!='>'):
-			sequence+=templine.rstrip()
-			templine=rf.readline()
-		yield (header,sequence)
-		header = templine.rstrip()
-
-'''	FastaStats is a function that accepts an opened fasta file f and computes 
+'''	FastaStats is a function that accepts a fasta file f and computes 
 	some statistics for the file.
 	PARAMS:
-		f : a readable opened fasta file
+		f : the path to a fasta file, possibly gzipped, or an opened binary one
 	RETURN: dictionary containing
 		'median' : int (the median length of a sequence in f.)
 		'mean' : int (the mean length of a sequence in f.)
@@ -79,14 +65,10 @@ def fa_parser(rf):
 '''
 def FastaStats(f):
 	lens = []
-	line = f.readline()
-	line = f.readline()
 	gccount = 0
-	length=0
-	for header,sequence in fa_parser(f):
-		#print('test')
+	for header,sequence in seqio.fasta_records(f):
 		lens.append(len(sequence))
-		gccount+=sequence.count('G')+sequence.count('C')
+		gccount+=sequence.count(b'G')+sequence.count(b'C')
 	ret = {}
 	ret['median'] = median(lens)
 	ret['mean'] = mean(lens)
@@ -96,10 +78,20 @@ def FastaStats(f):
 	ret['num_transcripts'] = len(lens)
 	return ret
 
+'''	Writes the FastaStats of the fasta file at path fasta as json to target,
+	or to stdout if target is None.
+'''
+def main(fasta, target=None):
+	stats = FastaStats(fasta)
+	if(target is None):
+		print(json.dumps(stats))
+	else:
+		with open(target, 'w') as out:
+			out.write(json.dumps(stats) + '\n')
+
 #Acts like a main method
 if(__name__=='__main__'):
 	parser = argparse.ArgumentParser(description="Descritpion: Fasta file stats generator.")
-	parser.add_argument('f', metavar='FastaFile', type=argparse.FileType('r'), help='The fasta file that we desire stats for.')
+	parser.add_argument('f', metavar='FastaFile', help='The fasta file that we desire stats for.')
 	args = parser.parse_args()
-	stats = FastaStats(args.f)
-	print(json.dumps(stats))
+	main(args.f)
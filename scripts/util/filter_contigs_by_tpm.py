@@ -3,6 +3,7 @@ import os
 import argparse
 import sys
 import warnings
+import seqio
 
 
 def quants_to_dict(quantFiles, tpm_index):
@@ -20,24 +21,21 @@ def quants_to_dict(quantFiles, tpm_index):
     return tpmD
 
 
-def main(assembly, quant_files, tpm_threshold, out, tpm_col_index):
+def main(assembly, quant_files, tpm_threshold, out, tpm_col_index=3):
+    ''' Writes the contigs of assembly whose tpm, summed over quant_files,
+        is at least tpm_threshold to out.
+    '''
     if len(quant_files) == 0:
         warnings.warn('No quant files passed in; '+ assembly + 'cannot be filtered.')
     else:
         quantD = quants_to_dict(quant_files, tpm_col_index)
         filteredSet = set([contig for contig,tpm in quantD.items() if tpm >= tpm_threshold])
-        with open(assembly, 'r') as f:
-            with open(out, 'w') as o:
-	        for line in f:
-                    if line.startswith('>'):
-                        write_bases = False
-                        contig = line.rstrip()[1:].split(' ')[0] # salmon names = only before the first space 
-                        if contig in filteredSet:
-                            o.write(line)
-                            write_bases=True
-                    else:
-                        if write_bases:
-                            o.write(line)
+        o = seqio.open_output(out)
+        for batch in seqio.fasta_batches(assembly):
+            # salmon names = only before the first space
+            kept = [r for r in batch if seqio.text(r[0][1:].split(b' ')[0]) in filteredSet]
+            seqio.write_fasta(o, kept)
+        o.close()
 
 
 if(__name__ == '__main__'):
@@ -32,36 +32,440 @@ USAGE MESSAGE :
     optional arguments:
       -h, --help   show this help message and exit
 '''
+import io
+import os
 import argparse
 import random
+import shutil
 import sys
-from itertools import chain
+import tempfile
+import multiprocessing
+from array import array
+from bisect import bisect_left
+from itertools import chain, islice
 import time
+import seqio
+import truncate_fastq
 if(sys.version_info > (3, 0)):
     pass
 else:
     from itertools import izip as zip
 
 
-def fq_parser(fq):
-    f = open(fq)
+CHUNK_SIZE = 2**26
+# the fewest bytes a fastq entry takes ("@\n\n+\n\n"), and the most a byte of
+# gzip data can inflate to, which bound the pairs a library can hold
+MIN_ENTRY = 6
+MAX_INFLATE = 1032
+
+def paired_fq_parser(fq1, fq2):
+    iters = [zip(seqio.fastq_records(f1), seqio.fastq_records(f2)) for f1, f2 in zip(fq1, fq2)]
+    return chain(*iters)
+
+
+def record_offsets(fq):
+    ''' Yields the byte offset of every entry of the fastq file fq.
+    '''
+    pos = 0
+    for name, seq, plus, qual in seqio.fastq_records(fq):
+        yield pos
+        pos += len(name) + len(seq) + len(plus) + len(qual) + 4
+
+
+def record_indices(fq):
+    ''' Yields the index of every entry of the fastq file fq, in place of
+        offsets for gzipped files, which can't be seeked.
+    '''
+    for i, entry in enumerate(seqio.fastq_records(fq)):
+        yield i
+
+
+def write_pair(t1, t2, e1, e2):
+    ''' Writes one entry to each of t1 and t2. Mates are always written in
+        step, the targets may be named pipes read in step (see
+        truncate_fastq.py).
+    '''
+    t1.write(e1)
+    t2.write(e2)
+
+
+def read_entry(f):
+    return f.readline() + f.readline() + f.readline() + f.readline()
+
+
+def formatter(truncate, seed):
+    ''' Returns the function turning a list of kept fastq records into the
+        text written out, the records cut to truncate, a (length, cut_type)
+        pair (see truncate_fastq.py), if it is given. Random windows are
+        drawn from a generator of their own, so truncating doesn't change
+        which entries are kept.
+    '''
+    if(truncate is None):
+        return seqio.fastq_bytes
+    length, cut_type = truncate
+    rand = random.Random('{0!s}:truncate'.format(seed))
+    return lambda batch: seqio.fastq_bytes(truncate_fastq.truncate_batch(batch, length, cut_type, rand))
+
+
+def max_pairs(fq1, fq2):
+    ''' Returns an upper bound on the number of pairs in the libraries fq1
+        and fq2, from the sizes of their files alone. Unbounded if one of
+        them isn't a regular file.
+    '''
+    total = 0
+    for f1, f2 in zip(fq1, fq2):
+        if(not (os.path.isfile(f1) and os.path.isfile(f2))):
+            return float('inf')
+        total += min(os.path.getsize(f) * (MAX_INFLATE if(seqio.compressed(f)) else 1) for f in (f1, f2)) // MIN_ENTRY
+    return total
+
+
+def copy_all(fq1, fq2, t1, t2, text):
+    ''' Copies every pair of fq1 and fq2 to the open binary files t1 and t2,
+        a batch at a time. text is a function from formatter().
+    '''
+    for batch in seqio.batches(zip(seqio.fastq_records(fq1), seqio.fastq_records(fq2))):
+        t1.write(text([e1 for e1, e2 in batch]))
+        t2.write(text([e2 for e1, e2 in batch]))
+
+
+def copy_indexed(fq1, fq2, indices, t1, t2, text):
+    ''' Copies the pairs of fq1 and fq2 at indices, in increasing order, to
+        the open binary files t1 and t2, reading both files through. text is
+        a function from formatter().
+    '''
+    pending = iter(indices)
+    wanted = next(pending, None)
+    for i, (e1, e2) in enumerate(zip(seqio.fastq_records(fq1), seqio.fastq_records(fq2))):
+        if(wanted is None):
+            break
+        if(i == wanted):
+            write_pair(t1, t2, text([e1]), text([e2]))
+            wanted = next(pending, None)
+
+
+def copy_pairs(fq1, fq2, offsets1, offsets2, t1, t2, text=None):
+    ''' Copies the pairs of fq1 and fq2 starting at offsets1 and offsets2,
+        in increasing order, to the open binary files t1 and t2. Entries
+        are copied as they are, unless text, a function from formatter(),
+        is given.
+    '''
+    f1 = open(fq1, 'rb')
+    f2 = open(fq2, 'rb')
+    for pos1, pos2 in zip(offsets1, offsets2):
+        f1.seek(pos1)
+        f2.seek(pos2)
+        e1 = read_entry(f1)
+        e2 = read_entry(f2)
+        if(text is not None):
+            e1 = text([tuple(e1.split(b'\n')[:4])])
+            e2 = text([tuple(e2.split(b'\n')[:4])])
+        write_pair(t1, t2, e1, e2)
+    f1.close()
+    f2.close()
+
+
+def ReservoirSubset(fq1, fq2, samplesize, target1, target2, seed=None, truncate=None):
+    ''' Writes exactly samplesize pairs, or every pair if there are fewer,
+        chosen uniformly at random from fq1 and fq2 in a single pass over
+        them. Only the byte offsets of both mates of the chosen pairs are
+        kept, in a reservoir (Algorithm R) of 24 bytes per pair, and the
+        entries are then copied by seeking to them, in file order.
+        The same seed and inputs always give the same sample. Gzipped inputs
+        can't be seeked, their entries are numbered instead and copied in a
+        second pass. When samplesize is at least the number of pairs the
+        files could hold (see max_pairs), or turns out to be, every pair is
+        kept and the inputs are streamed to the targets instead. Kept
+        entries are cut to truncate, see formatter().
+    '''
+    samplesize = int(samplesize)
+    seed_time = seed if(seed is not None) else str(time.time())
+    print("Seed Used For RNG : "+str(seed_time))
+    text = formatter(truncate, seed_time)
+    t1 = seqio.open_output(target1)
+    t2 = seqio.open_output(target2)
+    seen = 0
+    if(samplesize < max_pairs(fq1, fq2)):
+        rand = random.Random(seed_time)
+        files = array('l')
+        offsets1 = array('l')
+        offsets2 = array('l')
+        seekable = not any(seqio.compressed(f) for f in fq1 + fq2)
+        positions = record_offsets if(seekable) else record_indices
+        for i, (f1, f2) in enumerate(zip(fq1, fq2)):
+            for pos1, pos2 in zip(positions(f1), positions(f2)):
+                if(seen < samplesize):
+                    files.append(i)
+                    offsets1.append(pos1)
+                    offsets2.append(pos2)
+                else:
+                    j = int(rand.random() * (seen + 1))
+                    if(j < samplesize):
+                        files[j] = i
+                        offsets1[j] = pos1
+                        offsets2[j] = pos2
+                seen += 1
+    if(seen <= samplesize):
+        # nothing was left out
+        for f1, f2 in zip(fq1, fq2):
+            copy_all(f1, f2, t1, t2, text)
+    else:
+        # split the reservoir between libraries in one pass over it
+        chosen1 = [array('l') for f in fq1]
+        chosen2 = [array('l') for f in fq1]
+        for i, pos1, pos2 in zip(files, offsets1, offsets2):
+            chosen1[i].append(pos1)
+            chosen2[i].append(pos2)
+        del files, offsets1, offsets2
+        for i, (f1, f2) in enumerate(zip(fq1, fq2)):
+            # both mates of an entry come from the same record index, so
+            # each array sorts into the same order
+            if(seekable):
+                copy_pairs(f1, f2, sorted(chosen1[i]), sorted(chosen2[i]), t1, t2,
+                           text if(truncate is not None) else None)
+            else:
+                copy_indexed(f1, f2, sorted(chosen1[i]), t1, t2, text)
+            chosen1[i] = chosen2[i] = None
+    t1.close()
+    t2.close()
+
+
+def count_lines(job):
+    ''' job is (path, start, stop). Returns the number of lines ending in
+        that byte range of path, and whether start is the start of a line.
+    '''
+    path, start, stop = job
+    f = open(path, 'rb')
+    at_line = True
+    if(start > 0):
+        f.seek(start - 1)
+        at_line = f.read(1) == b'\n'
     count = 0
-    ret = []
-    for line in f:
-        ret.append(line)
-        count += 1
-        if(count % 4 == 0):
-            yield ret
-            ret = []
+    pos = start
+    while(pos < stop):
+        block = f.read(min(seqio.BLOCK, stop - pos))
+        if(not block):
+            break
+        count += block.count(b'\n')
+        pos += len(block)
+    f.close()
+    return count, at_line
 
 
-def paired_fq_parser(fq1, fq2):
-    iters = [zip(fq_parser(f1), fq_parser(f2)) for f1, f2 in zip(fq1, fq2)]
-    for e1, e2 in chain(*iters):
-        yield (e1, e2)
+def count_all_lines(path):
+    return sum(len(block) for block in seqio.line_blocks(path))
+
+
+def skip_lines(f, n):
+    ''' Moves f, an open binary file, past the next n newlines.
+    '''
+    while(n > 0):
+        pos = f.tell()
+        block = f.read(seqio.BLOCK)
+        if(not block):
+            return
+        found = block.count(b'\n')
+        if(found < n):
+            n -= found
+            continue
+        end = -1
+        for i in range(n):
+            end = block.index(b'\n', end + 1)
+        f.seek(pos + end + 1)
+        return
+
+
+def locate(starts, before, line):
+    ''' Returns (byte, skip), where line starts once skip newlines have been
+        passed from byte, using the newline counts of the chunks of a file,
+        before[k] of them ending ahead of starts[k].
+    '''
+    if(line == 0):
+        return 0, 0
+    k = bisect_left(before, line) - 1
+    return starts[k], line - before[k]
+
+
+def plan_library(fq1, fq2, chunk_size, pool_map):
+    ''' Splits the pair fq1, fq2 into chunks of about chunk_size bytes of
+        fq1, aligned to entries. Returns a list of (start1, start2,
+        entries) per chunk, where startN is a (byte, skip) pair for
+        locate() and entries the number of pairs in the chunk. A gzipped
+        library can't be split, it is a single chunk.
+    '''
+    if(seqio.compressed(fq1) or seqio.compressed(fq2)):
+        total = min(pool_map(count_all_lines, [fq1, fq2])) // 4
+        return [((0, 0), (0, 0), total)] if(total > 0) else []
+    files = []
+    for path in (fq1, fq2):
+        size = os.path.getsize(path)
+        starts = list(range(0, max(size, 1), chunk_size))
+        stops = starts[1:] + [size]
+        counts = pool_map(count_lines, [(path, a, b) for a, b in zip(starts, stops)])
+        before = [0]
+        for c, at_line in counts[:-1]:
+            before.append(before[-1] + c)
+        files.append((starts, before, counts, before[-1] + counts[-1][0]))
+    (starts1, before1, counts1, lines1), (starts2, before2, counts2, lines2) = files
+    total = min(lines1, lines2) // 4
+    # the first entry starting in each chunk of fq1
+    firsts = []
+    for k in range(len(starts1)):
+        line = before1[k] + (0 if(counts1[k][1]) else 1)
+        firsts.append(min(total, (line + 3) // 4))
+    firsts.append(total)
+    chunks = []
+    for k in range(len(starts1)):
+        entries = firsts[k + 1] - firsts[k]
+        if(entries > 0):
+            line = 4 * firsts[k]
+            chunks.append((locate(starts1, before1, line), locate(starts2, before2, line), entries))
+    return chunks
+
+
+def allocate(total, sizes):
+    ''' Splits total between sizes in proportion to them, by largest
+        remainder, no share exceeding its size.
+    '''
+    whole = sum(sizes)
+    total = min(total, whole)
+    if(whole == 0):
+        return [0 for s in sizes]
+    shares = [total * s // whole for s in sizes]
+    order = sorted(range(len(sizes)), key=lambda i: -((total * sizes[i]) % whole))
+    for i in order[:total - sum(shares)]:
+        shares[i] += 1
+    return shares
+
+
+def even_split(total, sizes):
+    ''' Splits total evenly between sizes, handing what the smaller ones
+        can't take to the others.
+    '''
+    shares = [0 for s in sizes]
+    left = min(total, sum(sizes))
+    growing = [i for i in range(len(sizes)) if(sizes[i] > 0)]
+    while(left > 0 and growing):
+        each = max(1, left // len(growing))
+        for i in list(growing):
+            take = min(each, sizes[i] - shares[i], left)
+            shares[i] += take
+            left -= take
+            if(shares[i] == sizes[i]):
+                growing.remove(i)
+    return shares
+
+
+def sample_chunk(job):
+    ''' Samples one chunk, job being the dict built by ChunkedSubset, into
+        its part files, truncating the kept entries a batch at a time.
+        Returns the number of pairs kept.
+    '''
+    rand = random.Random(job['seed'])
+    entries = job['entries']
+    if(job['count'] is not None):
+        chosen = set(rand.sample(range(entries), job['count']))
+        keep = lambda i: i in chosen
+    else:
+        keep = lambda i: rand.random() < job['fraction']
+    files = []
+    for path, (byte, skip) in ((job['fq1'], job['start1']), (job['fq2'], job['start2'])):
+        f = io.open(path, 'rb')
+        f.seek(byte)
+        skip_lines(f, skip)
+        files.append(seqio.fastq_records(f))
+    if(job['truncate'] is not None):
+        length, cut_type = job['truncate']
+        cut_rand = random.Random('{0!s}:truncate'.format(job['seed']))
+        cut = lambda batch: truncate_fastq.truncate_batch(batch, length, cut_type, cut_rand)
+    else:
+        cut = lambda batch: batch
+    p1 = open(job['part1'], 'wb')
+    p2 = open(job['part2'], 'wb')
+    kept = 0
+    pairs = (pair for i, pair in enumerate(islice(zip(*files), entries)) if(keep(i)))
+    for batch in seqio.batches(pairs):
+        p1.write(seqio.fastq_bytes(cut([e1 for e1, e2 in batch])))
+        p2.write(seqio.fastq_bytes(cut([e2 for e1, e2 in batch])))
+        kept += len(batch)
+    p1.close()
+    p2.close()
+    return kept
 
 
-def GenRandomizedSubset_v2(fq1, fq2, numbins, samplesize, target1, target2, seed=None):
+def ChunkedSubset(fq1, fq2, samplesize, target1, target2, seed=None, cpu=1,
+                  per_library=False, chunk_size=CHUNK_SIZE, truncate=None):
+    ''' Samples the paired fastq files fq1 and fq2 with cpu processes. Each
+        library (pair of files) is split into chunks of about chunk_size
+        bytes aligned to entries, found by counting newlines, every chunk is
+        sampled on its own with a seed derived from seed, and the samples
+        are joined in input order. samplesize is a number of pairs, sampled
+        exactly, spread over the chunks in proportion to their size, or a
+        fraction kept from every chunk. With per_library, the pairs are
+        instead split evenly between libraries, so a deep library doesn't
+        make up most of the sample (a fraction is turned into a number of
+        pairs first). Kept entries are cut to truncate, see formatter(), by
+        the processes sampling the chunks.
+    '''
+    seed_time = seed if(seed is not None) else str(time.time())
+    print("Seed Used For RNG : "+str(seed_time))
+    pool = multiprocessing.Pool(cpu) if(cpu > 1) else None
+    pool_map = pool.map if(pool is not None) else (lambda f, jobs: list(map(f, jobs)))
+    parts = tempfile.mkdtemp(prefix='subset_', dir=os.path.dirname(os.path.abspath(target1)))
+    try:
+        libraries = [plan_library(f1, f2, chunk_size, pool_map) for f1, f2 in zip(fq1, fq2)]
+        sizes = [sum(c[2] for c in lib) for lib in libraries]
+        fraction = None
+        if(samplesize <= 0):
+            fraction = 2
+        elif(samplesize <= 1):
+            fraction = samplesize
+            if(per_library):
+                fraction = None
+                samplesize = int(round(samplesize * sum(sizes)))
+        counts = None
+        if(fraction is None and per_library):
+            per_lib = even_split(int(samplesize), sizes)
+            counts = [allocate(n, [c[2] for c in lib]) for n, lib in zip(per_lib, libraries)]
+        elif(fraction is None):
+            # in proportion to the size of every chunk of every library
+            flat = allocate(int(samplesize), [c[2] for lib in libraries for c in lib])
+            counts = []
+            for lib in libraries:
+                counts.append(flat[:len(lib)])
+                flat = flat[len(lib):]
+        jobs = []
+        for i, lib in enumerate(libraries):
+            for k, (start1, start2, entries) in enumerate(lib):
+                part = os.path.join(parts, '{0!s}_{1!s}'.format(i, k))
+                jobs.append({'library': i, 'fq1': fq1[i], 'fq2': fq2[i], 'start1': start1, 'start2': start2,
+                             'entries': entries, 'fraction': fraction,
+                             'count': counts[i][k] if(counts is not None) else None,
+                             'seed': '{0!s}:{1!s}:{2!s}'.format(seed_time, i, k), 'truncate': truncate,
+                             'part1': part + '_1.fastq', 'part2': part + '_2.fastq'})
+        kept = pool_map(sample_chunk, jobs)
+        if(pool is not None):
+            pool.close()
+            pool.join()
+            pool = None
+        # the parts are already sampled and cut, they are joined as they are
+        for target, part in ((target1, 'part1'), (target2, 'part2')):
+            out = seqio.open_output(target)
+            for job in jobs:
+                with open(job[part], 'rb') as f:
+                    shutil.copyfileobj(f, out)
+                os.remove(job[part])
+            out.close()
+        for i in range(len(libraries)):
+            kept_lib = sum(n for n, job in zip(kept, jobs) if(job['library'] == i))
+            print('{0!s} : kept {1!s} of {2!s} pairs'.format(fq1[i], kept_lib, sizes[i]))
+    finally:
+        if(pool is not None):
+            pool.terminate()
+        shutil.rmtree(parts, ignore_errors=True)
+
+
+def GenRandomizedSubset_v2(fq1, fq2, numbins, samplesize, target1, target2, seed=None, truncate=None):
     if(samplesize > 1):
         entry_count = 0
         for e in paired_fq_parser(fq1, fq2):
@@ -71,17 +475,45 @@ def GenRandomizedSubset_v2(fq1, fq2, numbins, samplesize, target1, target2, seed
         p_val = float(samplesize)
     if(samplesize <= 0):
         p_val = 2
-    t1 = open(target1, 'w')
-    t2 = open(target2, 'w')
+    t1 = seqio.open_output(target1)
+    t2 = seqio.open_output(target2)
     seed_time = seed if(seed is not None) else str(time.time())
     print("Seed Used For RNG : "+str(seed_time))
     random.seed(seed_time)
+    text = formatter(truncate, seed_time)
     for e1, e2 in paired_fq_parser(fq1, fq2):
         if(random.random() < p_val):
-            for line in e1:
-                t1.write(line)
-            for line in e2:
-                t2.write(line)
+            write_pair(t1, t2, text([e1]), text([e2]))
+    t1.close()
+    t2.close()
+
+
+def main(fastq1, fastq2, sample_size, target1, target2, seed=None, numbins=100, exact=True,
+         cpu=1, per_library=False, chunk_size=CHUNK_SIZE, truncate=-1, cut_type='left'):
+    ''' Writes a random sample of the paired fastq files fastq1 and fastq2,
+        lists of paths or comma seperated strings, to target1 and target2.
+        sample_size is either a number of entries or a fraction between 0
+        and 1. If seed is None the current time is used. A number of entries
+        is sampled exactly, in a single pass, unless exact is False. A
+        fraction keeps every entry with that probability. With more than
+        one cpu, or per_library, the inputs are sampled in chunks (see
+        ChunkedSubset). If truncate is 0 or more, the kept reads are cut to
+        that length as they are written, left, right or random windows
+        depending on cut_type (see truncate_fastq.py), so sampling and
+        truncating take a single pass.
+    '''
+    if(not isinstance(fastq1, list)):
+        fastq1 = fastq1.split(',')
+    if(not isinstance(fastq2, list)):
+        fastq2 = fastq2.split(',')
+    sample_size = float(sample_size)
+    cut = (int(truncate), cut_type) if(truncate is not None and int(truncate) >= 0) else None
+    if(exact and (cpu > 1 or per_library)):
+        ChunkedSubset(fastq1, fastq2, sample_size, target1, target2, seed, cpu, per_library, chunk_size, cut)
+    elif(exact and sample_size > 1):
+        ReservoirSubset(fastq1, fastq2, sample_size, target1, target2, seed, cut)
+    else:
+        GenRandomizedSubset_v2(fastq1, fastq2, numbins, sample_size, target1, target2, seed, cut)
 
 """
 def GenRandomizedSubset(filename1,filename2,linecount,numbins,samplesize,filename1target,filename2target):
@@ -169,10 +601,14 @@ if(__name__=='__main__'):
     parser.add_argument('-t1', '--target_file1', type=wfcheck, help='An output filename. The sample from SourceFile1 writes to TargetFile1.')
     parser.add_argument('-t2', '--target_file2', type=wfcheck, help='An output filename. The sample from SourceFile2 writes to TargetFile2.') 
     parser.add_argument('--seed', help='The seed value to be used by the random number generator.', default=str(time.time()))
+    parser.add_argument('--approximate', action='store_true', help='Sample a number of entries by counting them first and keeping each with the matching probability, rather than exactly, in one pass.')
+    parser.add_argument('--cpu', type=int, default=1, help='The number of processes sampling chunks of the inputs at once. Default = 1')
+    parser.add_argument('--per_library', action='store_true', help='Split the sample evenly between the libraries (pairs of input files), rather than in proportion to their sizes.')
+    parser.add_argument('--chunk_size', type=int, default=CHUNK_SIZE, help='The size, in bytes, of the chunks inputs are split into with --cpu or --per_library. Default = 64M')
+    parser.add_argument('--truncate', type=int, default=-1, help='Cut the kept reads down to this length as they are written. Default is no truncation.')
+    parser.add_argument('--cut_type', choices=['left', 'right', 'random'], default='left', help='Which part of the reads --truncate keeps: the first bases, the last bases or a random window. Default = left')
     args = parser.parse_args()
-    args.fastq1 = args.fastq1.split(',')
-    args.fastq2 = args.fastq2.split(',')
-    GenRandomizedSubset_v2(args.fastq1,args.fastq2,args.numbins,args.sample_size,args.target_file1,args.target_file2,args.seed)
+    main(args.fastq1,args.fastq2,args.sample_size,args.target_file1,args.target_file2,args.seed,args.numbins,not args.approximate,args.cpu,args.per_library,args.chunk_size,args.truncate,args.cut_type)
 
     '''
     if(args.Linecount==0):
@@ -0,0 +1,267 @@
+'''
+seqio.py is the fastq and fasta reading and writing shared by the util
+scripts. Files are read in blocks and split into records as bytes, rather
+than line by line, and fasta sequences are joined once per record.
+Compressed files are handled transparently: gzip and bgzip files (bgzip is
+gzip made of many members) are recognised by their magic number, and read
+through pigz when it is installed. Targets ending in .gz are written through
+pigz, or gzip when it isn't. All records are bytes, use text() for names
+that need to be compared with str.
+    for name, seq, plus, qual in seqio.fastq_records('reads_1.fq.gz'):
+        ...
+    for batch in seqio.fasta_batches('assembly.fasta', 1000):
+        ...
+'''
+import io
+import os
+import sys
+import gzip
+import subprocess
+from itertools import chain
+try:
+    from shutil import which
+except ImportError:
+    from distutils.spawn import find_executable as which
+
+
+BLOCK = 2**20
+BATCH = 10000
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class PipeFile:
+    ''' Binary file object for the end of a pipe to or from a compression
+        tool, pigz or bgzip. Closing it waits for the tool and raises an
+        IOError if it failed. A reader closed before the end stops the tool.
+    '''
+
+    def __init__(self, process, stream, name, reading):
+        self.process = process
+        self.stream = stream
+        self.name = name
+        self.reading = reading
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+    def read1(self, size=-1):
+        return self.stream.read1(size) if(hasattr(self.stream, 'read1')) else self.stream.read(size)
+
+    def write(self, data):
+        self.stream.write(data)
+
+    def close(self):
+        if(self.stream is None):
+            return
+        self.stream.close()
+        self.stream = None
+        if(self.reading and self.process.poll() is None):
+            self.process.terminate()
+            self.process.wait()
+            return
+        code = self.process.wait()
+        if(code != 0):
+            raise IOError('{0!s} failed with exit code {1!s}.'.format(self.name, code))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def text(value):
+    ''' Returns value, bytes read by this module, as str.
+    '''
+    return value if(isinstance(value, str)) else value.decode('utf-8')
+
+
+def is_gzip(f):
+    ''' Returns True if the opened binary file f starts with the gzip magic
+        number, without consuming anything.
+    '''
+    if(hasattr(f, 'peek')):
+        return f.peek(2)[:2] == GZIP_MAGIC
+    pos = f.tell()
+    magic = f.read(2)
+    f.seek(pos)
+    return magic == GZIP_MAGIC
+
+
+def compressed(path):
+    ''' Returns True if the regular file at path is gzipped.
+    '''
+    if(not os.path.isfile(path)):
+        return False
+    with io.open(path, 'rb') as f:
+        return is_gzip(f)
+
+
+def open_input(source, threads=1):
+    ''' Returns a binary file object with the uncompressed contents of
+        source, a path or an opened binary file. Opened files are read from
+        their current position.
+    '''
+    if(not hasattr(source, 'read')):
+        source = io.open(source, 'rb')
+    if(not is_gzip(source)):
+        return source
+    name = getattr(source, 'name', None)
+    pigz = which('pigz')
+    if(pigz is not None and isinstance(name, str) and os.path.isfile(name) and source.tell() == 0):
+        source.close()
+        process = subprocess.Popen([pigz, '-dc', '-p', str(max(1, threads)), name], stdout=subprocess.PIPE)
+        return PipeFile(process, process.stdout, 'pigz -dc ' + name, True)
+    return gzip.GzipFile(fileobj=source, mode='rb')
+
+
+def open_output(path, threads=1, bgzip=False):
+    ''' Returns a binary file object writing to path, or stdout if path is
+        None. Paths ending in .gz are compressed, with pigz if it is
+        installed. With bgzip, the output is compressed by bgzip, so it can
+        be indexed, whatever its name.
+    '''
+    if(path is None):
+        return getattr(sys.stdout, 'buffer', sys.stdout)
+    tool = None
+    if(bgzip):
+        tool = which('bgzip')
+        if(tool is None):
+            raise IOError('bgzip output was requested for {0!s} but bgzip is not installed.'.format(path))
+        command = [tool, '-c', '-@', str(max(1, threads))]
+    elif(path.endswith('.gz')):
+        tool = which('pigz')
+        if(tool is None):
+            return gzip.open(path, 'wb')
+        command = [tool, '-c', '-p', str(max(1, threads))]
+    else:
+        return io.open(path, 'wb')
+    target = io.open(path, 'wb')
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=target)
+    target.close()
+    return PipeFile(process, process.stdin, ' '.join(command[:2]) + ' ' + path, False)
+
+
+def blocks(f, size=BLOCK):
+    ''' Yields the contents of the opened binary file f in blocks of up to
+        size bytes. On pipes a block is whatever is available, so files read
+        in step never wait on each other.
+    '''
+    read = f.read1 if(hasattr(f, 'read1')) else f.read
+    try:
+        block = read(size)
+    except io.UnsupportedOperation:
+        # python 2 GzipFile
+        read = f.read
+        block = read(size)
+    while(block):
+        yield block
+        block = read(size)
+
+
+def line_blocks(source, threads=1):
+    ''' Yields lists of the lines, without their newlines, of source, a path
+        or an opened binary file, one list per block read.
+    '''
+    f = open_input(source, threads)
+    try:
+        rest = b''
+        for block in blocks(f):
+            lines = (rest + block).split(b'\n')
+            rest = lines.pop()
+            yield lines
+        if(rest):
+            yield [rest]
+    finally:
+        f.close()
+
+
+def lines(source, threads=1):
+    return chain.from_iterable(line_blocks(source, threads))
+
+
+def fastq_blocks(source, threads=1):
+    ''' Yields lists of the fastq records of source, (name, sequence, plus,
+        quality) tuples of bytes, one list per block read.
+    '''
+    carry = []
+    for block in line_blocks(source, threads):
+        block = carry + block if(carry) else block
+        end = len(block) - len(block) % 4
+        yield list(zip(block[0:end:4], block[1:end:4], block[2:end:4], block[3:end:4]))
+        carry = block[end:]
+    if([l for l in carry if(l)]):
+        raise ValueError('{0!s} ends with an incomplete fastq record.'.format(getattr(source, 'name', source)))
+
+
+def fastq_records(source, threads=1):
+    return chain.from_iterable(fastq_blocks(source, threads))
+
+
+def fasta_records(source, threads=1):
+    ''' Yields the fasta records of source as (header, sequence) pairs of
+        bytes. The header keeps its >, sequence lines are joined.
+    '''
+    header = None
+    parts = []
+    for line in lines(source, threads):
+        if(line.startswith(b'>')):
+            if(header is not None):
+                yield header, b''.join(parts)
+            header = line.rstrip(b'\r')
+            parts = []
+        elif(header is not None):
+            parts.append(line.rstrip(b'\r'))
+    if(header is not None):
+        yield header, b''.join(parts)
+
+
+def batches(records, size=BATCH):
+    ''' Groups the iterable records into lists of size.
+    '''
+    batch = []
+    for r in records:
+        batch.append(r)
+        if(len(batch) == size):
+            yield batch
+            batch = []
+    if(batch):
+        yield batch
+
+
+def fastq_batches(source, size=BATCH, threads=1):
+    return batches(fastq_records(source, threads), size)
+
+
+def fasta_batches(source, size=BATCH, threads=1):
+    return batches(fasta_records(source, threads), size)
+
+
+def fastq_bytes(records):
+    ''' Returns the fastq text of records, 4-tuples of bytes.
+    '''
+    return b''.join(b'\n'.join(r) + b'\n' for r in records)
+
+
+def fasta_bytes(records, width=0):
+    ''' Returns the fasta text of records, (header, sequence) pairs of bytes,
+        sequences wrapped at width, or on one line if width is 0.
+    '''
+    out = []
+    for header, seq in records:
+        out.append(header)
+        out.append(b'\n')
+        if(width > 0):
+            out.append(b'\n'.join(seq[i:i + width] for i in range(0, len(seq), width)))
+        else:
+            out.append(seq)
+        out.append(b'\n')
+    return b''.join(out)
+
+
+def write_fastq(f, records):
+    f.write(fastq_bytes(records))
+
+
+def write_fasta(f, records, width=0):
+    f.write(fasta_bytes(records, width))
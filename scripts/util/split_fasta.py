@@ -10,49 +10,34 @@ the other containing the remaining contigs in the input FASTA.
 ###################################################################
 
 import sys, re
+import seqio
 
-fastaIN = open(sys.argv[1], 'r')
 name_list = open(sys.argv[2], 'r')
-inListOUT= open(sys.argv[3], 'w')
-notInListOUT= open(sys.argv[4], 'w')
+inListOUT = seqio.open_output(sys.argv[3])
+notInListOUT = seqio.open_output(sys.argv[4])
 
-fastaLines = [ x.strip() for x in fastaIN ]
-names = [x.split('\t')[0] for x in name_list]
+names = [x.split('\t')[0].rstrip('\n') for x in name_list]
 
-bp = ''
 contig_name = re.compile('^(>\S*)')# match just to 1st whitespace. If want to match entire line, change (>\S*) --> (>.*) 
 
-nameList = []
+nameList = set()
 # parse and store the list of contigs you want to separate out.
 for contig in names:
     if not contig.startswith('>'):
-    	contig = '>' + contig
+        contig = '>' + contig
     searchName = re.match(contig_name, contig).groups()[0]
-    nameList.append(searchName)
+    nameList.add(searchName)
 
 #go through the fasta file, writing contigs to the inList file or notInList file.
-for line in fastaLines:
-    if line.startswith('>'):
-        if len(bp) > 0:
-	    if name in nameList:
-	        inListOUT.write(full_name + '\n' + bp + '\n')
-	    else:
-	    	notInListOUT.write(full_name + '\n' + bp + '\n')
-	    bp = ''
-	name = re.match(contig_name, line).groups()[0]
-	full_name = line
-    else:
-	bp = bp + line
+for batch in seqio.fasta_batches(sys.argv[1]):
+    inList = []
+    notInList = []
+    for record in batch:
+        name = re.match(contig_name, seqio.text(record[0])).groups()[0]
+        (inList if name in nameList else notInList).append(record)
+    seqio.write_fasta(inListOUT, inList)
+    seqio.write_fasta(notInListOUT, notInList)
 
-#catch the last contig
-if name in nameList:
-    inListOUT.write(full_name + '\n' + bp + '\n')
-else:
-    notInListOUT.write(full_name + '\n' + bp + '\n')
-
-fastaIN.close()
 inListOUT.close()
 notInListOUT.close()
 name_list.close()
-
-
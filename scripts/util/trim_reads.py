@@ -0,0 +1,403 @@
+'''
+trim_reads.py trims fastq reads with the steps mmt runs Trimmomatic with,
+    ILLUMINACLIP:<adapters>:2:30:10 LEADING:3 TRAILING:3 SLIDINGWINDOW:4:15 MINLEN:35
+without starting a JVM for every library. Pairs are written the way
+Trimmomatic writes them: pairs where both reads survive go to the paired
+outputs, a read whose mate was dropped goes to its unpaired (orphan) output.
+The inputs are split into chunks (see random_subset.plan_library), trimmed by
+a pool of processes and joined back in input order. Qualities are trimmed a
+batch of reads at a time, with numpy when it is installed.
+Adapters are clipped the way ILLUMINACLIP does:
+    simple -
+        every adapter, and its reverse complement, is aligned to a read
+        wherever they share an exact seed of SEED bases. Matches score
+        log10(4), mismatches -Q/10, and the read is cut where the adapter
+        starts if the score reaches the simple threshold. Seeds are exact,
+        so the seed mismatches of ILLUMINACLIP have no equivalent.
+    palindrome -
+        for pairs, the adapters named Prefix.../1 and Prefix.../2 are put in
+        front of their reads and read 1 is aligned to the reverse complement
+        of read 2. Reaching the palindrome threshold means the reads ran
+        through a short insert into the adapters, read 1 is cut to the
+        insert and, as Trimmomatic does by default, read 2 is dropped.
+Adapters whose names end in /1 are only looked for in read 1, /2 in read 2.
+Usage:
+    python trim_reads.py -1 r_1.fq -2 r_2.fq -p1 p_1.fq -p2 p_2.fq -u1 s_1.fq -u2 s_2.fq -a TruSeq3-PE.fa --cpu 4
+    python trim_reads.py -1 reads.fq -p1 trimmed.fq -a TruSeq3-SE.fa
+'''
+import io
+import os
+import sys
+import math
+import shutil
+import string
+import argparse
+import tempfile
+import multiprocessing
+from itertools import islice
+import seqio
+import random_subset
+try:
+    import numpy
+except ImportError:
+    numpy = None
+if(sys.version_info < (3, 0)):
+    from itertools import izip as zip
+
+
+CHUNK_SIZE = 2**26
+SEED = 8
+# seeds are looked up every STRIDE bases, so any exact run of
+# SEED + STRIDE - 1 bases between a read and an adapter is found
+STRIDE = 4
+LOG4 = math.log10(4)
+# the quality given to adapter bases, which weren't sequenced, so a
+# mismatch costs the quality of the read base
+ADAPTER_QUALITY = 40
+COMPLEMENT = (bytes.maketrans if(hasattr(bytes, 'maketrans')) else string.maketrans)(b'ACGTN', b'TGCAN')
+
+
+def revcomp(seq):
+    return seq.translate(COMPLEMENT)[::-1]
+
+
+def read_adapters(path):
+    ''' Returns the adapters of the fasta file path as (simple1, simple2,
+        prefix1, prefix2): the sequences looked for in read 1 and in read 2,
+        reverse complements included, and the palindrome prefixes of each
+        read, None if the file has none.
+    '''
+    simple1 = []
+    simple2 = []
+    prefix1 = None
+    prefix2 = None
+    for header, seq in seqio.fasta_records(path):
+        name = seqio.text(header[1:]).split()[0]
+        seq = seq.upper()
+        if(name.startswith('Prefix') and name.endswith('/1')):
+            prefix1 = seq
+        elif(name.startswith('Prefix') and name.endswith('/2')):
+            prefix2 = seq
+        else:
+            for s in (seq, revcomp(seq)):
+                if(not name.endswith('/2')):
+                    simple1.append(s)
+                if(not name.endswith('/1')):
+                    simple2.append(s)
+    return simple1, simple2, prefix1, prefix2
+
+
+def seed_index(seqs):
+    ''' Returns a dict from every seed of seqs to the (sequence, position)
+        pairs it is found at.
+    '''
+    index = {}
+    for a, seq in enumerate(seqs):
+        for p in range(len(seq) - SEED + 1):
+            index.setdefault(seq[p:p + SEED], []).append((a, p))
+    return index
+
+
+def seed_starts(n):
+    ''' Returns the positions seeds are taken from in a read of length n,
+        the last seed included so adapters at the very end are found.
+    '''
+    if(n < SEED):
+        return []
+    starts = list(range(0, n - SEED + 1, STRIDE))
+    if(starts[-1] != n - SEED):
+        starts.append(n - SEED)
+    return starts
+
+
+def align_score(seq, qual, other, other_qual, offset):
+    ''' Returns the ILLUMINACLIP score of other aligned to seq with its
+        first base at position offset of seq. qual and other_qual are lists
+        of phred scores, a mismatch costs the lower of the two / 10.
+    '''
+    score = 0.0
+    for i in range(max(0, offset), min(len(seq), offset + len(other))):
+        if(seq[i:i + 1] == other[i - offset:i - offset + 1]):
+            score += LOG4
+        else:
+            score -= min(qual[i], other_qual[i - offset]) / 10.0
+    return score
+
+
+def simple_clip(seq, qual, adapters, index, threshold):
+    ''' Returns the length seq is cut to by the first of adapters found in
+        it, len(seq) if none is.
+    '''
+    keep = len(seq)
+    tried = set()
+    for i in seed_starts(len(seq)):
+        for a, p in index.get(seq[i:i + SEED], ()):
+            offset = i - p
+            if(offset >= keep or (a, offset) in tried):
+                continue
+            tried.add((a, offset))
+            adapter = adapters[a]
+            if(align_score(seq, qual, adapter, [ADAPTER_QUALITY] * len(adapter), offset) >= threshold):
+                keep = max(0, offset)
+    return keep
+
+
+def palindrome_clip(seq1, qual1, seq2, qual2, prefix1, prefix2, threshold):
+    ''' Returns the insert length of a pair whose reads ran through into the
+        adapters, None if they didn't. The prefixed read 1 and the reverse
+        complement of the prefixed read 2 are two ends of the same fragment,
+        overlapping by the insert plus both prefixes.
+    '''
+    s1 = prefix1 + seq1
+    q1 = [ADAPTER_QUALITY] * len(prefix1) + qual1
+    s2 = revcomp(prefix2 + seq2)
+    q2 = qual2[::-1] + [ADAPTER_QUALITY] * len(prefix2)
+    n = max(len(seq1), len(seq2))
+    index = seed_index([s1])
+    best = None
+    tried = set()
+    for i in seed_starts(len(s2)):
+        for a, p in index.get(s2[i:i + SEED], ()):
+            offset = p - i
+            insert = offset - len(prefix1) + len(seq2)
+            if(insert >= n or offset in tried):
+                continue
+            tried.add(offset)
+            score = align_score(s1, q1, s2, q2, offset)
+            if(score >= threshold and (best is None or score > best[0])):
+                best = (score, insert)
+    return max(0, best[1]) if(best is not None) else None
+
+
+def quality_trim_python(quals, ends, phred, leading, trailing, window, required):
+    ''' Returns the (start, stop) of every read, of qualities quals, cut to
+        ends by the adapters, after LEADING, TRAILING and SLIDINGWINDOW.
+    '''
+    trimmed = []
+    need = (required + phred) * window
+    for qual, end in zip(quals, ends):
+        q = bytearray(qual)
+        start = 0
+        while(start < end and q[start] < leading + phred):
+            start += 1
+        stop = end
+        while(stop > start and q[stop - 1] < trailing + phred):
+            stop -= 1
+        if(stop - start >= window):
+            total = sum(q[start:start + window])
+            i = start
+            while(True):
+                if(total < need):
+                    stop = i
+                    break
+                if(i + window >= stop):
+                    break
+                total += q[i + window] - q[i]
+                i += 1
+        trimmed.append((start, stop))
+    return trimmed
+
+
+def quality_trim_numpy(quals, ends, phred, leading, trailing, window, required):
+    ''' quality_trim_python over the whole batch at once. The qualities are
+        laid end to end, and the first good base, last good base and first
+        failing window of every read are found by binary search in the
+        positions that pass each test.
+    '''
+    if(not quals):
+        return []
+    lengths = numpy.array([len(q) for q in quals], dtype=numpy.int64)
+    flat = numpy.frombuffer(b''.join(quals), dtype=numpy.uint8).astype(numpy.int64) - phred
+    size = len(flat)
+    offsets = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1]))
+    end = offsets + numpy.array(ends, dtype=numpy.int64)
+    good = numpy.append(numpy.flatnonzero(flat >= leading), size)
+    start = numpy.minimum(good[numpy.searchsorted(good, offsets)], end)
+    good = numpy.concatenate(([-1], numpy.flatnonzero(flat >= trailing)))
+    last = good[numpy.searchsorted(good, end) - 1]
+    stop = numpy.where(last >= start, last + 1, start)
+    sums = numpy.concatenate(([0], numpy.cumsum(flat)))
+    failing = numpy.append(numpy.flatnonzero(sums[window:] - sums[:-window] < required * window), size + window)
+    first = failing[numpy.searchsorted(failing, start)]
+    stop = numpy.where(first + window <= stop, first, stop)
+    return list(zip((start - offsets).tolist(), (stop - offsets).tolist()))
+
+
+quality_trim = quality_trim_numpy if(numpy is not None) else quality_trim_python
+
+
+def detect_phred(path):
+    ''' Returns 33 or 64, the quality encoding of the fastq file path,
+        guessed from its first reads the way Trimmomatic does.
+    '''
+    lowest = None
+    for name, seq, plus, qual in islice(seqio.fastq_records(path), 10000):
+        if(qual):
+            lowest = min(bytearray(qual)) if(lowest is None) else min(lowest, min(bytearray(qual)))
+    return 64 if(lowest is not None and lowest >= 64) else 33
+
+
+def trim_batch(batch, job, adapters, indices):
+    ''' Returns the trimmed reads of batch, a list of tuples of one or two
+        fastq records, as tuples of records or None for dropped reads.
+    '''
+    phred = job['phred']
+    simple1, simple2, prefix1, prefix2 = adapters
+    mates = len(batch[0]) if(batch) else 0
+    ends = [[len(e[m][1]) for e in batch] for m in range(mates)]
+    if(adapters != (None, None, None, None)):
+        for k, entries in enumerate(batch):
+            quals = [[q - phred for q in bytearray(e[3])] for e in entries]
+            for m, e in enumerate(entries):
+                ends[m][k] = simple_clip(e[1], quals[m], (simple1, simple2)[m], indices[m], job['simple'])
+            if(mates == 2 and prefix1 is not None and prefix2 is not None):
+                insert = palindrome_clip(entries[0][1], quals[0], entries[1][1], quals[1], prefix1, prefix2,
+                                         job['palindrome'])
+                if(insert is not None):
+                    ends[0][k] = min(ends[0][k], insert)
+                    ends[1][k] = 0
+    kept = []
+    for m in range(mates):
+        cuts = quality_trim([e[m][3] for e in batch], ends[m], phred, job['leading'], job['trailing'],
+                            job['window'], job['window_quality'])
+        kept.append([(e[m][0], e[m][1][a:b], e[m][2], e[m][3][a:b]) if(b - a >= job['minlen'] and ends[m][k] > 0)
+                     else None for k, (e, (a, b)) in enumerate(zip(batch, cuts))])
+    return list(zip(*kept))
+
+
+def trim_chunk(job):
+    ''' Trims one chunk, job being the dict built by main(), into its part
+        files. Returns the counts of pairs (or reads) in, both kept, only
+        read 1 kept, only read 2 kept and dropped.
+    '''
+    if(job['adapters'] is not None):
+        adapters = read_adapters(job['adapters'])
+        indices = [seed_index(adapters[0]), seed_index(adapters[1])]
+    else:
+        adapters = (None, None, None, None)
+        indices = [{}, {}]
+    files = []
+    for path, (byte, skip) in zip(job['inputs'], job['starts']):
+        f = io.open(path, 'rb')
+        f.seek(byte)
+        random_subset.skip_lines(f, skip)
+        files.append(seqio.fastq_records(f))
+    parts = [open(p, 'wb') for p in job['parts']]
+    counts = [0, 0, 0, 0, 0]
+    for batch in seqio.batches(islice(zip(*files), job['entries'])):
+        out = [[], [], [], []]
+        for trimmed in trim_batch(batch, job, adapters, indices):
+            counts[0] += 1
+            if(len(trimmed) == 1 or (trimmed[0] is not None and trimmed[1] is not None)):
+                # both mates survive, or the read of an unpaired library
+                if(trimmed[0] is None):
+                    counts[4] += 1
+                    continue
+                counts[1] += 1
+                for m, e in enumerate(trimmed):
+                    out[m].append(e)
+            elif(trimmed[0] is not None):
+                counts[2] += 1
+                out[2].append(trimmed[0])
+            elif(trimmed[1] is not None):
+                counts[3] += 1
+                out[3].append(trimmed[1])
+            else:
+                counts[4] += 1
+        for p, records in zip(parts, out):
+            seqio.write_fastq(p, records)
+    for p in parts:
+        p.close()
+    return counts
+
+
+def percent(count, total):
+    return '{0!s} ({1:.2f}%)'.format(count, 100.0 * count / total if(total > 0) else 0)
+
+
+def main(fastq1, target1, fastq2=None, target2=None, orphan1=None, orphan2=None, adapters=None, cpu=1,
+         palindrome=30, simple=10, leading=3, trailing=3, window=4, window_quality=15, minlen=35,
+         chunk_size=CHUNK_SIZE, phred=None):
+    ''' Trims the fastq file fastq1 to target1 or, with fastq2, the pair to
+        target1 and target2, writing reads whose mate was dropped to orphan1
+        and orphan2 (discarded if those are None). adapters is the path of
+        a Trimmomatic adapter fasta, None for no adapter clipping. The
+        other parameters are those of ILLUMINACLIP (palindrome and simple
+        thresholds), LEADING, TRAILING, SLIDINGWINDOW and MINLEN. phred is
+        guessed from the reads when it is None. Targets ending in .gz are
+        compressed (see seqio).
+    '''
+    if(adapters is not None and not os.path.isfile(adapters)):
+        raise Exception('The adapter file {0!s} does not exist. It is installed with Trimmomatic.'.format(adapters))
+    paired = fastq2 is not None
+    phred = phred if(phred is not None) else detect_phred(fastq1)
+    pool = multiprocessing.Pool(cpu) if(cpu > 1) else None
+    pool_map = pool.map if(pool is not None) else (lambda f, jobs: list(map(f, jobs)))
+    tmp = tempfile.mkdtemp(prefix='trim_', dir=os.path.dirname(os.path.abspath(target1)))
+    try:
+        # an unpaired library is planned as a pair of itself
+        chunks = random_subset.plan_library(fastq1, fastq2 if(paired) else fastq1, chunk_size, pool_map)
+        jobs = []
+        for k, (start1, start2, entries) in enumerate(chunks):
+            part = os.path.join(tmp, str(k))
+            names = ['_1', '_2', '_1s', '_2s'] if(paired) else ['']
+            jobs.append({'inputs': [fastq1, fastq2] if(paired) else [fastq1],
+                         'starts': [start1, start2] if(paired) else [start1], 'entries': entries,
+                         'parts': [part + n + '.fastq' for n in names], 'adapters': adapters, 'phred': phred,
+                         'palindrome': palindrome, 'simple': simple, 'leading': leading, 'trailing': trailing,
+                         'window': window, 'window_quality': window_quality, 'minlen': minlen})
+        counts = pool_map(trim_chunk, jobs)
+        if(pool is not None):
+            pool.close()
+            pool.join()
+            pool = None
+        targets = [target1, target2, orphan1, orphan2] if(paired) else [target1]
+        for i, target in enumerate(targets):
+            if(target is None):
+                continue
+            out = seqio.open_output(target)
+            for job in jobs:
+                with open(job['parts'][i], 'rb') as part:
+                    shutil.copyfileobj(part, out)
+            out.close()
+        total = [sum(c[i] for c in counts) for i in range(5)]
+        if(paired):
+            print('Input Read Pairs: {0!s} Both Surviving: {1!s} Forward Only Surviving: {2!s} '
+                  'Reverse Only Surviving: {3!s} Dropped: {4!s}'.format(
+                  total[0], percent(total[1], total[0]), percent(total[2], total[0]),
+                  percent(total[3], total[0]), percent(total[4], total[0])))
+        else:
+            print('Input Reads: {0!s} Surviving: {1!s} Dropped: {2!s}'.format(
+                  total[0], percent(total[1], total[0]), percent(total[4], total[0])))
+    finally:
+        if(pool is not None):
+            pool.terminate()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if(__name__ == '__main__'):
+    parser = argparse.ArgumentParser(description=(
+        'Trims fastq reads like Trimmomatic, ILLUMINACLIP:<adapters>:2:30:10 LEADING:3 TRAILING:3 '
+        'SLIDINGWINDOW:4:15 MINLEN:35 by default, with a pool of processes.'))
+    parser.add_argument('-1', '--fastq1', required=True, help='The fastq file to trim, read 1 of a pair.')
+    parser.add_argument('-2', '--fastq2', help='Read 2 of the pair, if the reads are paired.')
+    parser.add_argument('-p1', '--target1', required=True, help='The output for reads of fastq1 (whose mate survives).')
+    parser.add_argument('-p2', '--target2', help='The output for reads of fastq2 whose mate survives.')
+    parser.add_argument('-u1', '--orphan1', help='The output for reads of fastq1 whose mate was dropped.')
+    parser.add_argument('-u2', '--orphan2', help='The output for reads of fastq2 whose mate was dropped.')
+    parser.add_argument('-a', '--adapters', help='A Trimmomatic adapter fasta. Default is no adapter clipping.')
+    parser.add_argument('--cpu', type=int, default=1, help='The number of processes trimming chunks of the inputs. Default = 1')
+    parser.add_argument('--palindrome', type=float, default=30, help='The palindrome clip threshold. Default = 30')
+    parser.add_argument('--simple', type=float, default=10, help='The simple clip threshold. Default = 10')
+    parser.add_argument('--leading', type=int, default=3, help='LEADING quality. Default = 3')
+    parser.add_argument('--trailing', type=int, default=3, help='TRAILING quality. Default = 3')
+    parser.add_argument('--window', type=int, default=4, help='SLIDINGWINDOW size. Default = 4')
+    parser.add_argument('--window_quality', type=int, default=15, help='SLIDINGWINDOW average quality. Default = 15')
+    parser.add_argument('--minlen', type=int, default=35, help='MINLEN. Default = 35')
+    parser.add_argument('--phred', type=int, choices=[33, 64], help='The quality encoding. Default is to guess it.')
+    args = parser.parse_args()
+    if(args.fastq2 is not None and args.target2 is None):
+        parser.error('--target2 is required with --fastq2')
+    main(args.fastq1, args.target1, args.fastq2, args.target2, args.orphan1, args.orphan2, args.adapters,
+         args.cpu, args.palindrome, args.simple, args.leading, args.trailing, args.window,
+         args.window_quality, args.minlen, phred=args.phred)
@@ -1,46 +1,93 @@
+import io
+import os
 import argparse
 import random
 import sys
+import multiprocessing
+import seqio
+if(sys.version_info < (3, 0)):
+    from itertools import izip as zip
 
 
-def fq_parser(fastq):
-    f = open(fastq)
-    ret = []
-    count = 0
-    for line in f:
-        ret.append(line.rstrip('\n'))
-        count += 1
-        if(count % 4 == 0):
-            yield ret
-            ret = []
-    f.close()
+def truncate(entry, length, cut_type, rand=random):
+    ''' Returns entry, a fastq record, with its sequence and scores cut to
+        length. Random windows are placed with rand.
+    '''
+    name, seq, plus, scores = entry
+    if(cut_type == 'left'):
+        seq = seq[:length]
+        scores = scores[:length]
+    elif(cut_type == 'right'):
+        seq = seq[-1*length:]
+        scores = scores[-1*length:]
+    elif(cut_type == 'random' and len(seq) > length):
+        offset = rand.randint(0, len(seq)-length)
+        seq = seq[offset:offset+length]
+        scores = scores[offset:offset+length]
+    return (name, seq, plus, scores)
 
 
-def fq_writer(f, entry):
-    for line in entry:
-        f.write(line)
-        f.write('\n')
+def truncate_batch(entries, length, cut_type, rand=random):
+    ''' Returns the list of entries, fastq records, each cut to length.
+        Left and right cuts are a single slice of every sequence and score
+        string, reads already short enough are kept as they are.
+    '''
+    if(cut_type == 'left'):
+        return [e if(len(e[1]) <= length) else (e[0], e[1][:length], e[2], e[3][:length]) for e in entries]
+    if(cut_type == 'right' and length > 0):
+        return [e if(len(e[1]) <= length) else (e[0], e[1][-length:], e[2], e[3][-length:]) for e in entries]
+    return [truncate(e, length, cut_type, rand) for e in entries]
 
 
-def main(fastq, target=None, length=50, cut_type='left'):
-    outfile = sys.stdout if(target is None) else open(target, 'w')
-    for entry in fq_parser(fastq):
-        seq = entry[1]
-        scores = entry[3]
-        if(cut_type == 'left'):
-            seq = seq[:length]
-            scores = scores[:length]
-        elif(cut_type == 'right'):
-            seq = seq[-1*length:]
-            scores = scores[-1*length:]
-        elif(cut_type == 'random' and len(seq) > length):
-            offset = random.randint(0, len(seq)-length)
-            seq = seq[offset:offset+length]
-            scores = scores[offset:offset+length]
-        entry[1] = seq
-        entry[3] = scores
-        fq_writer(outfile, entry)
-    outfile.close()
+def truncate_file(fastq, target, length, cut_type):
+    ''' Truncates the reads of fastq to length and writes them to target,
+        stdout if target is None, a block at a time.
+    '''
+    outfile = seqio.open_output(target)
+    for batch in seqio.fastq_blocks(fastq):
+        seqio.write_fastq(outfile, truncate_batch(batch, length, cut_type))
+    if(target is not None):
+        outfile.close()
+    else:
+        outfile.flush()
+
+
+def main(fastq, target=None, length=50, cut_type='left', mate=None, mate_target=None):
+    ''' Truncates the reads of fastq to length and writes them to target,
+        stdout if target is None. If mate is given, its reads are truncated
+        to mate_target as well. Mates in regular files are truncated in
+        parallel, by a second process. Otherwise, when they are named pipes,
+        both are read in step, so each is read once from start to end.
+        Inputs and targets may be gzipped (see seqio).
+    '''
+    if(mate is None):
+        truncate_file(fastq, target, length, cut_type)
+    elif(os.path.isfile(fastq) and os.path.isfile(mate)):
+        other = multiprocessing.Process(target=truncate_file, args=(mate, mate_target, length, cut_type))
+        other.start()
+        try:
+            truncate_file(fastq, target, length, cut_type)
+        finally:
+            other.join()
+        if(other.exitcode != 0):
+            raise Exception('Truncating {0!s} failed with exit code {1!s}.'.format(mate, other.exitcode))
+    else:
+        # both mates are opened before either is read, in case they are
+        # named pipes written one after the other
+        infile = io.open(fastq, 'rb')
+        mate_infile = io.open(mate, 'rb')
+        outfile = seqio.open_output(target)
+        mate_outfile = seqio.open_output(mate_target)
+        for entry, mate_entry in zip(seqio.fastq_records(infile), seqio.fastq_records(mate_infile)):
+            seqio.write_fastq(outfile, [truncate(entry, length, cut_type)])
+            seqio.write_fastq(mate_outfile, [truncate(mate_entry, length, cut_type)])
+        infile.close()
+        mate_infile.close()
+        mate_outfile.close()
+        if(target is not None):
+            outfile.close()
+        else:
+            outfile.flush()
 
 
 if(__name__ == '__main__'):
@@ -53,6 +100,8 @@ if(__name__ == '__main__'):
     parser.add_argument('-l', '--length', default=50, type=int,
                         help='The length to be truncated to. Default is 50.')
     parser.add_argument('-t', '--target', help='The output file. Default is stdout.')
+    parser.add_argument('--mate', help='The path to the mate of fastq, truncated the same way.')
+    parser.add_argument('--mate_target', help='The output file for --mate.')
     parser.add_argument('-random', action='store_true', help=(
         'Use this flag to signify that truncation should occur via randomly '
         'chosen windows rather than left or right truncations'))
@@ -65,6 +114,8 @@ if(__name__ == '__main__'):
         cut_type = 'random'
     elif(args.right):
         cut_type = 'right'
-    main(args.fastq, args.target, args.length, cut_type)
+    if(args.mate is not None and args.mate_target is None):
+        parser.error('--mate_target is required with --mate')
+    main(args.fastq, args.target, args.length, cut_type, args.mate, args.mate_target)
 
 